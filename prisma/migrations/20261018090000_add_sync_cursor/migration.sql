@@ -0,0 +1,9 @@
+-- CreateTable
+CREATE TABLE "SyncCursor" (
+    "userId" INTEGER NOT NULL,
+    "platform" TEXT NOT NULL,
+    "cursor" JSONB NOT NULL,
+
+    PRIMARY KEY ("userId", "platform"),
+    CONSTRAINT "SyncCursor_userId_fkey" FOREIGN KEY ("userId") REFERENCES "User" ("id") ON DELETE CASCADE ON UPDATE CASCADE
+);
@@ -1,39 +1,15 @@
-import { spawn } from 'child_process';
-import { root } from '@config';
-import path from 'path';
 import type { Prisma, UserProblemData, VirtualSubmission } from '@prisma/client';
+import { runJob, runProblemScores, streamSubmissions, Sink } from './worker';
 
 export const ojuz = {
   async verify(cookie: string) {
-    return new Promise<{ error?: string, username?: string }>(res => {
-      const proc = spawn('python3',
-        [path.resolve(root, 'src/backend/python/ojuz/verify.py'), cookie],
-        { stdio: ['ignore', 'pipe', 'pipe'] }
-      );
-      let out = '';
-      proc.stdout.on('data', d => out += d.toString());
-      proc.on('close', () => {
-        const json = JSON.parse(out);
-        res({ username: json.username ?? null, error: json.error ?? null })
-      });
-    });
+    const json = await runJob('ojuz', 'verify', { cookie });
+    return { username: json.username ?? null, error: json.error ?? null } as { error?: string, username?: string };
   },
 
-  async fetchProblemScores(cookie: string, username: string, problems: Prisma.ProblemGetPayload<{ include: { problemLinks: true } }>[]) {
-    return new Promise<{ error?: string, scores?: UserProblemData[] }>(res => {
-      const proc = spawn('python3',
-        [path.resolve(root, 'src/backend/python/ojuz/fetchProblemScores.py')],
-        { stdio: ['pipe', 'pipe', 'pipe'] }
-      );
-      proc.stdin.write(JSON.stringify({ cookie, username, problems }));
-      proc.stdin.end();
-      let out = '';
-      proc.stdout.on('data', d => out += d.toString());
-      proc.on('close', () => {
-        const json = JSON.parse(out);
-        res({ scores: json.scores ?? null, error: json.error ?? null });
-      });
-    });
+  async fetchProblemScores(cookie: string, username: string, problems: Prisma.ProblemGetPayload<{ include: { problemLinks: true } }>[], cursor?: Prisma.JsonValue, sink?: Sink) {
+    const json = await runProblemScores('ojuz', { cookie, username, cursor, sink: sink && { ...sink, platform: 'oj.uz' } }, problems);
+    return { scores: json.scores ?? null, cursor: json.cursor ?? null, sunk: !!json.sink, error: json.error ?? null } as { error?: string, scores?: UserProblemData[], cursor?: Prisma.InputJsonValue, sunk: boolean };
   },
 
   async fetchContestScores(username: string, contest: Prisma.ActiveVirtualContestGetPayload<{
@@ -50,20 +26,28 @@ export const ojuz = {
         }
       }
     }
-  }>) {
-    return new Promise<{ error?: string, submissions?: VirtualSubmission[] }>(res => {
-      const proc = spawn('python3',
-        [path.resolve(root, 'src/backend/python/ojuz/fetchContestScores.py')],
-        { stdio: ['pipe', 'pipe', 'pipe'] }
-      );
-      proc.stdin.write(JSON.stringify({ username, contest }));
-      proc.stdin.end();
-      let out = '';
-      proc.stdout.on('data', d => out += d.toString());
-      proc.on('close', () => {
-        const json = JSON.parse(out);
-        res({ submissions: json.submissions ?? null, error: json.error ?? null });
-      });
-    });
+  }>, sink?: Sink) {
+    const json = await runJob('ojuz', 'fetchContestScores', { username, contest, sink });
+    return { submissions: json.submissions ?? null, sunk: !!json.sink, error: json.error ?? null, errors: (json.errors ?? []) as string[] } as { error?: string, submissions?: VirtualSubmission[], sunk?: boolean, errors: string[] };
+  },
+
+  // follows a running contest, handing each graded submission to
+  // onSubmission, until the contest is over or `signal` aborts
+  async watchContestScores(username: string, contest: Prisma.ActiveVirtualContestGetPayload<{
+    include: {
+      contest: {
+        include: {
+          problems: {
+            include: {
+              problem: {
+                include: { problemLinks: true }
+              }
+            }
+          }
+        }
+      }
+    }
+  }>, onSubmission: (submission: VirtualSubmission) => void, signal?: AbortSignal) {
+    return streamSubmissions('ojuz', { username, contest }, onSubmission, true, signal);
   }
-};
\ No newline at end of file
+};
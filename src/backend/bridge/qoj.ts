@@ -1,64 +1,42 @@
 import { Mutex } from 'async-mutex';
-import { spawn } from 'child_process';
-import path from 'path';
-import { root, QojUsername, QojPassword } from '@config';
+import { QojUsername, QojPassword } from '@config';
 import { Prisma, UserProblemData, VirtualSubmission } from '@prisma/client';
 import { db } from '@db';
+import { runJob, runProblemScores, streamSubmissions, Sink } from './worker';
 
 const tokenLock = new Mutex();
 
 async function getValidSession(oldSession: string): Promise<{ session?: string, error?: string }> {
   return tokenLock.runExclusive(async () => {
-    return new Promise<{ session?: string, error?: string }>((res) => {
-      const proc = spawn('python3',
-        [path.resolve(root, 'src/backend/python/qoj/refresh.py')],
-        { stdio: ['pipe', 'pipe', 'pipe'] }
-      );
-      proc.stdin.write(JSON.stringify({ oldSession, username: QojUsername, password: QojPassword }));
-      proc.stdin.end();
-      let out = '';
-      proc.stdout.on('data', d => out += d.toString());
-      proc.on('close', () => {
-        const json = JSON.parse(out);
-        res({ session: json.session ?? null, error: json.error ?? null });
-      });
-    });
+    const json = await runJob('qoj', 'refresh', { oldSession, username: QojUsername, password: QojPassword });
+    return { session: json.session ?? null, error: json.error ?? null };
   });
 }
 
+// contest listings are read with the shared scraper account
+async function contestSession() {
+  let token = await db.scraperAuthToken.findUnique({ where: { platform: 'qoj.ac' } });
+  let res = await getValidSession(token?.token ?? '');
+  if (res.error) {
+    throw new Error(res.error);
+  }
+  await db.scraperAuthToken.upsert({
+    where: { platform: 'qoj.ac' },
+    update: { token: res.session },
+    create: { platform: 'qoj.ac', token: res.session }
+  });
+  return res.session;
+}
+
 export const qoj = {
   async verify(cookie: string) {
-    return new Promise<{ error?: string, username?: string }>(res => {
-      const proc = spawn('python3',
-        [path.resolve(root, 'src/backend/python/qoj/verify.py')],
-        { stdio: ['pipe', 'pipe', 'pipe'] }
-      );
-      proc.stdin.write(JSON.stringify({ session: cookie }));
-      proc.stdin.end();
-      let out = '';
-      proc.stdout.on('data', d => out += d.toString());
-      proc.on('close', () => {
-        const json = JSON.parse(out);
-        res({ username: json.username ?? null, error: json.error ?? null })
-      });
-    });
+    const json = await runJob('qoj', 'verify', { session: cookie });
+    return { username: json.username ?? null, error: json.error ?? null } as { error?: string, username?: string };
   },
 
-  async fetchProblemScores(cookie: string, username: string, problems: Prisma.ProblemGetPayload<{ include: { problemLinks: true } }>[]) {
-    return new Promise<{ error?: string, scores?: UserProblemData[] }>(res => {
-      const proc = spawn('python3',
-        [path.resolve(root, 'src/backend/python/qoj/fetchProblemScores.py')],
-        { stdio: ['pipe', 'pipe', 'pipe'] }
-      );
-      proc.stdin.write(JSON.stringify({ cookie, username, problems }));
-      proc.stdin.end();
-      let out = '';
-      proc.stdout.on('data', d => out += d.toString());
-      proc.on('close', () => {
-        const json = JSON.parse(out);
-        res({ scores: json.scores ?? null, error: json.error ?? null });
-      });
-    });
+  async fetchProblemScores(cookie: string, username: string, problems: Prisma.ProblemGetPayload<{ include: { problemLinks: true } }>[], cursor?: Prisma.JsonValue, sink?: Sink) {
+    const json = await runProblemScores('qoj', { cookie, username, cursor, sink: sink && { ...sink, platform: 'qoj.ac' } }, problems);
+    return { scores: json.scores ?? null, cursor: json.cursor ?? null, sunk: !!json.sink, error: json.error ?? null } as { error?: string, scores?: UserProblemData[], cursor?: Prisma.InputJsonValue, sunk: boolean };
   },
 
   async fetchContestScores(username: string, contest: Prisma.ActiveVirtualContestGetPayload<{
@@ -75,31 +53,30 @@ export const qoj = {
         }
       }
     }
-  }>) {
-    let token = await db.scraperAuthToken.findUnique({ where: { platform: 'qoj.ac' } });
-    let res = await getValidSession(token?.token ?? '');
-    if (res.error) {
-      throw new Error(res.error);
+  }>, sink?: Sink) {
+    const cookie = await contestSession();
+    const json = await runJob('qoj', 'fetchContestScores', { session: cookie, username, contest, sink });
+    return { submissions: json.submissions ?? null, sunk: !!json.sink, error: json.error ?? null, errors: (json.errors ?? []) as string[] } as { error?: string, submissions?: VirtualSubmission[], sunk?: boolean, errors: string[] };
+  },
+
+  // follows a running contest, handing each graded submission to
+  // onSubmission, until the contest is over or `signal` aborts
+  async watchContestScores(username: string, contest: Prisma.ActiveVirtualContestGetPayload<{
+    include: {
+      contest: {
+        include: {
+          problems: {
+            include: {
+              problem: {
+                include: { problemLinks: true }
+              }
+            }
+          }
+        }
+      }
     }
-    await db.scraperAuthToken.upsert({
-      where: { platform: 'qoj.ac' },
-      update: { token: res.session },
-      create: { platform: 'qoj.ac', token: res.session }
-    });
-    let cookie = res.session;
-    return new Promise<{ error?: string, submissions?: VirtualSubmission[] }>(res => {
-      const proc = spawn('python3',
-        [path.resolve(root, 'src/backend/python/qoj/fetchContestScores.py')],
-        { stdio: ['pipe', 'pipe', 'pipe'] }
-      );
-      proc.stdin.write(JSON.stringify({ session: cookie, username, contest }));
-      proc.stdin.end();
-      let out = '';
-      proc.stdout.on('data', d => out += d.toString());
-      proc.on('close', () => {
-        const json = JSON.parse(out);
-        res({ submissions: json.submissions ?? null, error: json.error ?? null });
-      });
-    });
+  }>, onSubmission: (submission: VirtualSubmission) => void, signal?: AbortSignal) {
+    const cookie = await contestSession();
+    return streamSubmissions('qoj', { session: cookie, username, contest }, onSubmission, true, signal);
   }
-};
\ No newline at end of file
+};
@@ -0,0 +1,144 @@
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
+import readline from 'readline';
+import path from 'path';
+import crypto from 'crypto';
+import { root } from '@config';
+import type { Prisma, VirtualSubmission } from '@prisma/client';
+
+type Job = 'verify' | 'fetchProblemScores' | 'fetchContestScores' | 'refresh';
+type Platform = 'ojuz' | 'qoj' | 'codechef';
+type ProblemWithLinks = Prisma.ProblemGetPayload<{ include: { problemLinks: true } }>;
+
+// results of a job sent with a sink are written to the database by the
+// worker itself; see python/common/sink.py
+export type Sink = { userId: number };
+
+const LinkPlatform: Record<Platform, string> = { ojuz: 'oj.uz', qoj: 'qoj.ac', codechef: 'codechef' };
+
+let proc: ChildProcessWithoutNullStreams | null = null;
+let nextId = 1;
+const pending = new Map<number, {
+  child: ChildProcessWithoutNullStreams,
+  resolve: (result: any) => void,
+  onEvent?: (event: any) => void
+}>();
+
+function start() {
+  const child = spawn('python3',
+    [path.resolve(root, 'src/backend/python/worker.py')],
+    { stdio: ['pipe', 'pipe', 'pipe'] }
+  );
+  readline.createInterface({ input: child.stdout }).on('line', line => {
+    let msg: { id: number, result?: any, event?: any };
+    try {
+      msg = JSON.parse(line);
+    } catch {
+      return;
+    }
+    const job = pending.get(msg.id);
+    if (job && msg.event !== undefined) {
+      job.onEvent?.(msg.event);
+    } else if (job) {
+      pending.delete(msg.id);
+      job.resolve(msg.result ?? {});
+    }
+  });
+  child.stderr.on('data', d => process.stderr.write(d));
+  child.stdin.on('error', () => { });
+  child.on('close', () => {
+    // fail whatever was in flight, the next job respawns the worker
+    if (proc === child) {
+      proc = null;
+    }
+    for (const [id, job] of pending) {
+      if (job.child === child) {
+        pending.delete(id);
+        job.resolve({ error: 'Python worker exited' });
+      }
+    }
+  });
+  return child;
+}
+
+// with onEvent the job runs in streaming mode: events arrive as they are
+// produced and the promise resolves with the final summary; with watch a
+// contest fetcher keeps polling until the contest is over, or until `signal`
+// aborts, which stops it after its current poll
+export function runJob<T = any>(platform: Platform, job: Job, data: object, onEvent?: (event: any) => void, watch = false, signal?: AbortSignal) {
+  proc ??= start();
+  const id = nextId++;
+  const child = proc;
+  return new Promise<T>(resolve => {
+    pending.set(id, { child, resolve, onEvent });
+    child.stdin.write(JSON.stringify({ id, platform, job, data, stream: !!onEvent, watch }) + '\n');
+    signal?.addEventListener('abort', () => {
+      if (pending.has(id)) {
+        child.stdin.write(JSON.stringify({ id, cancel: true }) + '\n');
+      }
+    }, { once: true });
+  });
+}
+
+// runs a contest fetcher in streaming mode, handing each submission to
+// onSubmission as soon as it's parsed; a failed detail page no longer
+// discards the rest, it only shows up in `errors`. With watch it follows a
+// running contest and only resolves once the contest is over or `signal`
+// aborts.
+export async function streamSubmissions(platform: Platform, data: object, onSubmission: (submission: VirtualSubmission) => void, watch = false, signal?: AbortSignal) {
+  const submissions: VirtualSubmission[] = [];
+  const json = await runJob(platform, 'fetchContestScores', data, event => {
+    if (event.submission) {
+      submissions.push(event.submission);
+      onSubmission(event.submission);
+    }
+  }, watch, signal);
+  if (json.error) {
+    return { error: json.error as string, submissions: null, errors: [] as string[] };
+  }
+  submissions.sort((a, b) => String(a.time).localeCompare(String(b.time)));
+  const summary = json.summary ?? {};
+  return { error: summary.error ?? null, submissions, errors: (summary.errors ?? []) as string[] };
+}
+
+// the problem index each platform's scripts were last sent, and the worker
+// it went to; see python/common/problem_index.py
+const indexes = new Map<Platform, { child: ChildProcessWithoutNullStreams, version: string, urls: Map<string, number> }>();
+
+function problemIndex(platform: Platform, problems: ProblemWithLinks[], full: boolean) {
+  const urls = new Map<string, number>();
+  for (const p of problems) {
+    const link = p.problemLinks.find(l => l.platform === LinkPlatform[platform]);
+    if (link) {
+      urls.set(link.url, p.id);
+    }
+  }
+  const entries = [...urls].map(([url, id]) => [id, url] as [number, string]);
+  const version = crypto.createHash('sha1').update(JSON.stringify(entries)).digest('hex').slice(0, 16);
+  const sent = indexes.get(platform);
+  indexes.set(platform, { child: proc!, version, urls });
+  if (!full && sent && sent.child === proc) {
+    if (sent.version === version) {
+      return { version };
+    }
+    // a few problems added or relinked: send only what changed
+    const add = entries.filter(([id, url]) => sent.urls.get(url) !== id);
+    const remove = [...sent.urls.keys()].filter(url => !urls.has(url));
+    if (add.length + remove.length < entries.length / 4) {
+      return { version, base: sent.version, add, remove };
+    }
+  }
+  return { version, entries };
+}
+
+// runs fetchProblemScores with the tracked problems sent as a problem index
+// instead of the full list; the worker keeps it, so repeat syncs only send its
+// version
+export async function runProblemScores(platform: Platform, data: object, problems: ProblemWithLinks[]) {
+  proc ??= start();
+  let json = await runJob(platform, 'fetchProblemScores', { ...data, problemIndex: problemIndex(platform, problems, false) });
+  if (typeof json.error === 'string' && json.error.startsWith('Unknown problem index')) {
+    // the worker restarted or evicted it
+    json = await runJob(platform, 'fetchProblemScores', { ...data, problemIndex: problemIndex(platform, problems, true) });
+  }
+  return json;
+}
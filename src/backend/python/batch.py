@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Batch problem-score sync for many accounts in one process.
+
+Reads one JSON document from stdin:
+  {"problems": [...], "jobs": [{"id": 1, "platform": "qoj", "username": "...",
+                                "cookie": "...", "cursor": {...}}, ...]}
+and writes one JSON line per job as soon as it finishes (so not in input order):
+  {"id": 1, "platform": "qoj", "username": "...", "result": {...}}
+followed by a final {"summary": {"jobs", "errors", "seconds"}} line.
+With "sink": true at the top level and a "userId" on every job, each job's
+scores and cursor are written straight into the app database as it finishes
+(see common/sink.py).
+
+The problem set is sent once and turned into one problem index per platform
+(see common/problem_index.py) that every job shares. All jobs run on the
+shared event loop (see common/aio.py), so the per-host connection slots and
+rate limits are shared as well. At most BATCH_JOBS_PER_HOST accounts sync
+against one site at a time, started in input order, and the ones running
+take turns on that site's connection slots, so an account with a long
+history doesn't hold up everyone queued behind it.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import importlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import aio, metrics, sink
+from common.stream import stdout_emitter
+
+PLATFORMS = ("ojuz", "qoj", "codechef")
+LINK_PLATFORM = {"ojuz": "oj.uz", "qoj": "qoj.ac", "codechef": "codechef"}
+
+JOBS_PER_HOST = int(os.environ.get("BATCH_JOBS_PER_HOST", "4"))
+
+def load(platform: str):
+  if platform not in PLATFORMS:
+    raise Exception(f"Unknown platform {platform}")
+  return importlib.import_module(f"{platform}.fetchProblemScores")
+
+def problem_index(platform: str, problems) -> dict:
+  entries = []
+  for p in problems:
+    for link in p.get("problemLinks", []):
+      if link.get("platform") == LINK_PLATFORM[platform]:
+        entries.append([p.get("id"), link.get("url")])
+        break
+  version = hashlib.sha1(json.dumps(entries).encode()).hexdigest()[:16]
+  return {"version": version, "entries": entries}
+
+async def run_batch(jobs, problems, emit, to_sink: bool = False) -> dict:
+  """Sync every job, handing each finished one to emit(); returns the summary."""
+  slots = {platform: asyncio.Semaphore(JOBS_PER_HOST) for platform in PLATFORMS}
+  indexes = {}
+  started = time.monotonic()
+  errors = 0
+
+  async def one(job):
+    nonlocal errors
+    platform = job.get("platform")
+    try:
+      module = load(platform)
+      if platform not in indexes:
+        indexes[platform] = problem_index(platform, problems)
+      async with slots[platform]:
+        m = metrics.Metrics() if metrics.ENABLED else None
+        result = await metrics.bound(m, module.run_async({
+          "cookie": job.get("cookie"),
+          "username": job.get("username"),
+          "problemIndex": indexes[platform],
+          "cursor": job.get("cursor"),
+        }))
+        if m is not None:
+          m.attach(result)
+      if to_sink:
+        spec = {"userId": job.get("userId"), "platform": LINK_PLATFORM[platform]}
+        # off the event loop, the write may wait on the database lock
+        result = await asyncio.get_running_loop().run_in_executor(
+          None, sink.write, "fetchProblemScores", spec, result
+        )
+    except Exception as e:
+      result = {"error": str(e)}
+    if "error" in result:
+      errors += 1
+    emit({"id": job.get("id"), "platform": platform, "username": job.get("username"), "result": result})
+
+  await asyncio.gather(*(one(job) for job in jobs))
+  return {"jobs": len(jobs), "errors": errors, "seconds": round(time.monotonic() - started, 2)}
+
+def run(data, emit=stdout_emitter) -> dict:
+  return aio.run(run_batch(data.get("jobs") or [], data.get("problems") or [], emit, bool(data.get("sink"))))
+
+def main():
+  try:
+    summary = run(json.loads(sys.stdin.read() or "{}"))
+  except Exception as e:
+    summary = {"error": str(e)}
+  stdout_emitter({"summary": summary})
+  sys.exit(1 if "error" in summary else 0)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,155 @@
+"""
+Synthetic pages shaped like the ones the scrapers read, for benchmarks and
+offline runs. Only the markup the parsers look at is reproduced faithfully;
+the layout around it is padding of roughly the real size.
+
+Listings take either a seed (random rows) or explicit `subs`, a list of
+Sub rows, newest first, so that listings and detail pages can agree.
+"""
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+@dataclass
+class Sub:
+  sid: int
+  problem: str
+  subtasks: list
+  time: datetime
+
+  @property
+  def score(self):
+    return sum(self.subtasks)
+
+def _layout(body: str, nav_links: int = 120, server_time: datetime | None = None) -> str:
+  nav = "".join(f'<li class="nav-item"><a class="nav-link" href="/page/{i}">Link {i}</a></li>' for i in range(nav_links))
+  script = "<script>" + "var x = 1;" * 400 + "</script>"
+  server_time = (server_time or EPOCH + timedelta(hours=8)).strftime("%Y-%m-%d %H:%M:%S")
+  return (
+    '<!DOCTYPE html><html><head><title>page</title>' + script + '</head><body>'
+    f'<nav class="navbar"><ul class="nav">{nav}</ul></nav>'
+    f'<div class="container">{body}</div>'
+    f'<footer><p>Server Time: {server_time}</p></footer></body></html>'
+  )
+
+def _random_subs(first_id: int, rows: int, rnd: random.Random, problem) -> list:
+  subs = []
+  for k in range(rows):
+    sid = first_id - k
+    subs.append(Sub(sid, problem(rnd), [rnd.choice([0, 10, 35, 60, 100])], EPOCH - timedelta(minutes=sid)))
+  return subs
+
+def qoj_listing(first_id: int, rows: int = 20, page: int = 1, pages: int = 50, seed: int = 0,
+                subs: list | None = None, server_time: datetime | None = None) -> str:
+  if subs is None:
+    subs = _random_subs(first_id, rows, random.Random(seed + page), lambda rnd: str(rnd.randint(1, 9000)))
+  trs = []
+  for s in subs:
+    t = s.time.strftime("%Y-%m-%d %H:%M:%S")
+    trs.append(
+      f'<tr><td><a href="/submission/{s.sid}">#{s.sid}</a></td>'
+      f'<td><a href="/problem/{s.problem}">#{s.problem}. Problem {s.problem}</a></td>'
+      f'<td><a href="/user/profile/u">u</a></td>'
+      f'<td><a class="uoj-score" data-score="{s.score}" data-max="100" href="/submission/{s.sid}">{s.score}</a></td>'
+      f'<td>100ms</td><td>4096kb</td><td>C++17</td><td>2.1kb</td>'
+      f'<td><small>{t}</small></td><td><small>{t}</small></td></tr>'
+    )
+  pag = "".join(
+    f'<li class="page-item{" active" if i == page else ""}"><a class="page-link" href="?page={i}">{i}</a></li>'
+    for i in range(1, pages + 1)
+  )
+  return _layout(
+    '<div class="table-responsive"><table class="table table-bordered"><thead><tr>'
+    + "<th>ID</th>" * 10 + f'</tr></thead><tbody>{"".join(trs)}</tbody></table></div>'
+    f'<ul class="pagination">{pag}</ul>',
+    server_time=server_time,
+  )
+
+def qoj_detail(sid: int, pid: int, subtasks: list) -> str:
+  cards = "".join(
+    f'<div class="card"><div class="card-header"><h3 class="card-title">Subtask #{i + 1}</h3>'
+    f' score: {s}</div><div class="card-body">' + "<p>Test: AC 12ms</p>" * 15 + '</div></div>'
+    for i, s in enumerate(subtasks)
+  )
+  return _layout(f'<a href="/problem/{pid}">#{pid}</a><div class="submission">{cards}</div>')
+
+def ojuz_listing(first_id: int, rows: int = 50, seed: int = 0, subs: list | None = None) -> str:
+  if subs is None:
+    subs = _random_subs(first_id, rows, random.Random(seed + first_id), lambda rnd: f"JOI{rnd.randint(10, 25)}_p{rnd.randint(1, 5)}")
+    for s in subs:
+      s.subtasks = [100]
+  trs = []
+  for s in subs:
+    t = s.time.isoformat().replace("+00:00", "Z")
+    trs.append(
+      f'<tr><td><a href="/submission/{s.sid}">{s.sid}</a></td>'
+      f'<td><span data-timestamp-iso="{t}">{t}</span></td>'
+      f'<td><a href="/profile/u">u</a></td>'
+      f'<td><a href="/problem/view/{s.problem}">{s.problem}</a></td>'
+      f'<td><div class="progress"><div class="progress-bar">{s.score} / 100</div></div></td>'
+      f'<td>12 ms</td><td>4096 KB</td><td>C++17</td></tr>'
+    )
+  return _layout(f'<table class="table"><thead><tr>{"<th>x</th>" * 8}</tr></thead><tbody>{"".join(trs)}</tbody></table>')
+
+def ojuz_detail(sid: int, subtasks: list) -> str:
+  divs = "".join(
+    f'<div id="subtask_results_div_{i}"><span class="subtask-score badge">{s} / 100</span>'
+    + '<table><tr><td>AC</td></tr></table>' * 10 + '</div>'
+    for i, s in enumerate(subtasks)
+  )
+  return _layout(f'<div class="submission">{divs}</div>')
+
+def ojuz_profile(problems: list) -> str:
+  links = "".join(f'<a href="/problem/view/{p}">{p}</a> ' for p in problems)
+  return _layout(f'<div class="panel"><h3>Solved problems</h3><p>{links}</p></div>')
+
+def ojuz_problem(name: str, score: float) -> str:
+  """A problem page; `score` is the account's best score out of 100."""
+  return _layout(
+    f'<h1>{name}</h1><div id="progress"></div>'
+    f'<script>$("#progress").circleProgress({{ value: {score / 100}, size: 80 }});</script>'
+  )
+
+def _codechef_verdict(score: float) -> str:
+  return "accepted" if score >= 100 else "partially accepted" if score > 0 else "wrong answer"
+
+def codechef_listing(first_id: int, rows: int = 12, seed: int = 0, subs: list | None = None) -> str:
+  """The HTML fragment returned under "content" by /recent/user."""
+  if subs is None:
+    subs = _random_subs(first_id, rows, random.Random(seed + first_id), lambda rnd: f"PROB{rnd.randint(1, 999)}")
+    for s in subs:
+      s.subtasks, s.time = [100], datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+  trs = []
+  for s in subs:
+    t = s.time.strftime("%I:%M %p %d/%m/%y")
+    trs.append(
+      f'<tr><td title="{t}">{t}</td>'
+      f'<td><a href="/problems/{s.problem}" title="{s.problem}">{s.problem}</a></td>'
+      f'<td><span title="{_codechef_verdict(s.score)}"><img src="/tick.png"/></span>({s.score})</td>'
+      f'<td>C++</td><td><a href="/viewsolution/{s.sid}" target="_blank">View</a></td></tr>'
+    )
+  return (
+    '<div class="tablebox-section"><table class="dataTable"><thead><tr>'
+    '<th>Time</th><th>Problem</th><th>Result</th><th>Lang</th><th>Solution</th>'
+    f'</tr></thead><tbody>{"".join(trs)}</tbody></table></div>'
+  )
+
+def codechef_detail(sub: Sub) -> dict:
+  """The JSON returned by /api/submission-details/<id>."""
+  info = "".join(
+    f'<div class="subtask"><p>Subtask #{i + 1}</p><p>Subtask Score: {s}%</p>'
+    + '<table><tr><td>AC</td><td>0.01</td></tr></table>' * 5 + '</div>'
+    for i, s in enumerate(sub.subtasks)
+  )
+  return {
+    "status": "OK",
+    "data": {
+      "other_details": {
+        "problemCode": sub.problem,
+        "submissionDate": int(sub.time.timestamp() * 1000),
+        "testInfo": info,
+      }
+    },
+  }
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Times the scrapers' page parsers on synthetic pages under every installed
+HTML backend, and full-page parsing against parsing only the listing table.
+
+  python3 bench/parse_bench.py [iterations]
+"""
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import dom, extract
+from bench import pages
+from qoj import fetchProblemScores as qoj_problems
+from codechef import fetchProblemScores as codechef_problems
+
+def _timed(fn, n):
+  fn()
+  start = time.perf_counter()
+  for _ in range(n):
+    fn()
+  return (time.perf_counter() - start) / n * 1000
+
+def main():
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+  qoj_page = pages.qoj_listing(100000)
+  qoj_sub = pages.qoj_detail(100000, 42, [10, 25, 65])
+  ojuz_page = pages.ojuz_listing(100000)
+  ojuz_sub = pages.ojuz_detail(100000, [7, 13, 80])
+  cc_page = pages.codechef_listing(100000)
+
+  cases = {
+    "qoj listing (full)": lambda: dom.parse(qoj_page).select("table tbody tr"),
+    "qoj listing (table)": lambda: qoj_problems._parse_submissions_rows_for_page(qoj_page, timedelta(0)),
+    "qoj detail (dom)": lambda: extract._qoj_dom(qoj_sub),
+    "qoj detail (regex)": lambda: extract._qoj_fast(qoj_sub),
+    "oj.uz detail (dom)": lambda: extract._ojuz_dom(ojuz_sub),
+    "oj.uz detail (regex)": lambda: extract._ojuz_fast(ojuz_sub),
+    "oj.uz listing (full)": lambda: dom.parse(ojuz_page).select("table.table tbody tr"),
+    "oj.uz listing (table)": lambda: dom.parse(ojuz_page, "table").select("table.table tbody tr"),
+    "codechef listing": lambda: codechef_problems._parse_recent_submissions(cc_page),
+  }
+
+  baseline = {}
+  print(f"{'case':<24}" + "".join(f"{b:>16}" for b in reversed(dom.BACKENDS)))
+  for name, fn in cases.items():
+    line = f"{name:<24}"
+    for backend in reversed(dom.BACKENDS):
+      dom.BACKEND = backend
+      ms = _timed(fn, n)
+      baseline.setdefault(name, ms)
+      line += f"{ms:>10.2f} ms x{baseline[name] / ms:<4.1f}"
+    print(line)
+
+if __name__ == "__main__":
+  main()
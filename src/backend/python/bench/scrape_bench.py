@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+End-to-end scraper benchmark against the local stand-ins (bench/standin.py).
+Each fetch script is run as its own process, the way the one-shot scripts
+run in production, for 1 to N concurrent users, and the harness reports the
+requests served, wall time, p50/p99 job latency and the peak RSS of a single
+job process.
+
+  python3 bench/scrape_bench.py [--users 1,4,16] [--pages 5] [--latency 50]
+                                [--throttle 0.02] [--scripts qoj/fetchProblemScores,...]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench.standin import StandIn, PROBLEMS, ROWS, SPACING, problem_url
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPTS = [
+  "ojuz/fetchProblemScores",
+  "ojuz/fetchContestScores",
+  "qoj/fetchProblemScores",
+  "qoj/fetchContestScores",
+  "codechef/fetchProblemScores",
+  "codechef/fetchContestScores",
+]
+SITE = {"ojuz": "oj.uz", "qoj": "qoj.ac", "codechef": "codechef.com"}
+PLATFORM = {"ojuz": "oj.uz", "qoj": "qoj.ac", "codechef": "codechef"}
+# the stand-ins shouldn't be held to the real sites' rate limits
+RATES = ",".join(f"{site}=100000:1000" for site in SITE.values())
+CONTEST_PROBLEMS = 6
+
+def _iso(dt) -> str:
+  return dt.isoformat().replace("+00:00", "Z")
+
+def job_data(script: str, user: str, standin: StandIn) -> dict:
+  platform, job = script.split("/")
+  site = SITE[platform]
+  problems = [
+    {"id": i, "problemLinks": [{"platform": PLATFORM[platform], "url": problem_url(site, i)}]}
+    for i in range(PROBLEMS)
+  ]
+  if job == "fetchProblemScores":
+    return {"cookie": user, "username": user, "problems": problems}
+  # a contest covering the newer half of every user's history
+  span = SPACING * ROWS[site] * standin.data[site].depth / 2
+  contest = {
+    "userId": 1,
+    "startedAt": _iso(standin.now - span),
+    "endedAt": _iso(standin.now + timedelta(seconds=1)),
+    "contest": {"problems": [{"id": p["id"], "problem": p} for p in problems[:CONTEST_PROBLEMS]]},
+  }
+  return {"session": user, "cookie": user, "username": user, "contest": contest}
+
+def run_job(script: str, data: dict, env: dict) -> dict:
+  started = time.monotonic()
+  p = subprocess.Popen(
+    [sys.executable, os.path.join(ROOT, script + ".py")],
+    stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env, cwd=ROOT,
+  )
+  p.stdin.write(json.dumps(data).encode())
+  p.stdin.close()
+  out = p.stdout.read()
+  p.stdout.close()
+  # wait4 rather than wait() for this process's own peak RSS
+  _, status, usage = os.wait4(p.pid, 0)
+  p.returncode = os.waitstatus_to_exitcode(status)
+  try:
+    result = json.loads(out or b"{}")
+  except ValueError:
+    result = {"error": "unreadable output"}
+  return {
+    "seconds": time.monotonic() - started,
+    "rss_mb": usage.ru_maxrss / 1024,
+    "error": p.returncode != 0 or "error" in result,
+  }
+
+def percentile(values, q: float) -> float:
+  values = sorted(values)
+  return values[min(len(values) - 1, max(0, int(round(q * len(values) + 0.5)) - 1))]
+
+def bench(script: str, users: int, standin: StandIn) -> dict:
+  site = SITE[script.split("/")[0]]
+  with tempfile.TemporaryDirectory() as cache_dir:
+    # a fresh cache per run, so every run does the full work
+    env = dict(os.environ, SCRAPER_BASE_URLS=standin.base_urls(), SCRAPER_CACHE_DIR=cache_dir, SCRAPER_RATES=RATES)
+    before = standin.stats[site].snapshot()
+    results = [None] * users
+
+    def one(i):
+      results[i] = run_job(script, job_data(script, f"bench{i}", standin), env)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=one, args=(i,)) for i in range(users)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    wall = time.monotonic() - started
+    after = standin.stats[site].snapshot()
+
+  latencies = [r["seconds"] for r in results]
+  return {
+    "script": script,
+    "users": users,
+    "requests": after["requests"] - before["requests"],
+    "throttled": after["throttled"] - before["throttled"],
+    "wall": wall,
+    "p50": percentile(latencies, 0.50),
+    "p99": percentile(latencies, 0.99),
+    "rss_mb": max(r["rss_mb"] for r in results),
+    "errors": sum(r["error"] for r in results),
+  }
+
+def main():
+  ap = argparse.ArgumentParser(description="Benchmark the fetch scripts against local stand-in servers.")
+  ap.add_argument("--users", default="1,4,16", help="comma-separated concurrent user counts")
+  ap.add_argument("--pages", type=int, default=5, help="listing pages per user")
+  ap.add_argument("--latency", type=float, default=50.0, help="added latency per response, ms")
+  ap.add_argument("--throttle", type=float, default=0.0, help="share of requests answered with 429")
+  ap.add_argument("--retry-after", type=float, default=0.1, help="Retry-After on injected 429s, s")
+  ap.add_argument("--scripts", default=",".join(SCRIPTS), help="comma-separated scripts to run")
+  ap.add_argument("--json", action="store_true", help="print one JSON object per run instead of a table")
+  args = ap.parse_args()
+
+  standin = StandIn(args.latency / 1000, args.throttle, args.retry_after, args.pages).start()
+  try:
+    if not args.json:
+      print(f"{'script':<30}{'users':>6}{'requests':>10}{'429s':>6}{'wall s':>9}{'p50 s':>8}{'p99 s':>8}{'rss MB':>8}{'errors':>7}")
+    for script in filter(None, args.scripts.split(",")):
+      for users in (int(u) for u in args.users.split(",")):
+        r = bench(script, users, standin)
+        if args.json:
+          print(json.dumps(r), flush=True)
+        else:
+          print(
+            f"{r['script']:<30}{r['users']:>6}{r['requests']:>10}{r['throttled']:>6}{r['wall']:>9.2f}"
+            f"{r['p50']:>8.2f}{r['p99']:>8.2f}{r['rss_mb']:>8.1f}{r['errors']:>7}",
+            flush=True,
+          )
+  finally:
+    standin.stop()
+
+if __name__ == "__main__":
+  main()
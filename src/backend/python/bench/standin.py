@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for oj.uz, qoj.ac and codechef.com. They serve synthetic
+listings, submission pages, oj.uz profiles and problem pages, and CodeChef's
+/recent/user and submission-details JSON, in the formats the scrapers parse
+(see bench/pages.py). Latency, 429 injection and listing depth are
+configurable.
+
+  python3 bench/standin.py [--latency MS] [--throttle P] [--pages N]
+
+prints the SCRAPER_BASE_URLS value that points the scrapers at them and
+serves until interrupted. Every user has the same shape of history, derived
+from the username, and each account's session cookie is its username.
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import argparse
+import threading
+import http.server
+from urllib.parse import urlsplit, parse_qs
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench import pages
+from bench.pages import Sub
+
+SITES = ("oj.uz", "qoj.ac", "codechef.com")
+# rows per listing page, as on the real sites
+ROWS = {"oj.uz": 50, "qoj.ac": 20, "codechef.com": 12}
+PROBLEMS = 40
+SUBTASKS = [20, 30, 50]
+SPACING = timedelta(minutes=10)
+
+def problem_name(site: str, i: int) -> str:
+  if site == "qoj.ac":
+    return str(1000 + i)
+  if site == "oj.uz":
+    return f"BENCH_p{i}"
+  return f"BENCH{i}"
+
+def problem_url(site: str, i: int) -> str:
+  name = problem_name(site, i)
+  if site == "qoj.ac":
+    return f"https://qoj.ac/problem/{name}"
+  if site == "oj.uz":
+    return f"https://oj.uz/problem/view/{name}"
+  return f"https://www.codechef.com/problems/{name}"
+
+class Dataset:
+  """
+  Every user's submission history on one site, newest first: `depth` listing
+  pages, one submission every SPACING back from `now`.
+  """
+
+  def __init__(self, site: str, depth: int, now: datetime):
+    self.site = site
+    self.rows = ROWS[site]
+    self.depth = depth
+    self.now = now
+    self._users = {}
+    self._subs = {}
+    self._lock = threading.Lock()
+
+  def history(self, user: str) -> list:
+    with self._lock:
+      subs = self._users.get(user)
+      if subs is None:
+        rnd = random.Random(f"{self.site}/{user}")
+        base = (zlib.crc32(user.encode()) % 10000) * 1_000_000
+        total = self.rows * self.depth
+        subs = []
+        for k in range(total):
+          subtasks = [rnd.choice([0, 0, s // 2, s]) for s in SUBTASKS]
+          subs.append(Sub(base + total - k, problem_name(self.site, rnd.randrange(PROBLEMS)), subtasks, self.now - k * SPACING))
+        self._users[user] = subs
+        self._subs.update((s.sid, s) for s in subs)
+      return subs
+
+  def find(self, sid: int) -> Sub | None:
+    with self._lock:
+      return self._subs.get(sid)
+
+  def best(self, user: str) -> dict:
+    """Best score per problem, merging subtasks across submissions like the sites do."""
+    best = {}
+    for s in self.history(user):
+      cur = best.get(s.problem, [0] * len(SUBTASKS))
+      best[s.problem] = [max(a, b) for a, b in zip(cur, s.subtasks)]
+    return {problem: sum(v) for problem, v in best.items()}
+
+class Stats:
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.requests = 0
+    self.throttled = 0
+
+  def snapshot(self) -> dict:
+    with self.lock:
+      return {"requests": self.requests, "throttled": self.throttled}
+
+def _handler(site: str, data: Dataset, stats: Stats, latency: float, throttle: float, retry_after: float):
+  rnd = random.Random(site)
+
+  class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+      pass
+
+    def _send(self, status: int, body, headers=()):
+      raw = (json.dumps(body) if isinstance(body, dict) else body).encode()
+      self.send_response(status)
+      self.send_header("Content-Type", "application/json" if isinstance(body, dict) else "text/html; charset=utf-8")
+      self.send_header("Content-Length", str(len(raw)))
+      for k, v in headers:
+        self.send_header(k, v)
+      self.end_headers()
+      self.wfile.write(raw)
+
+    def do_GET(self):
+      with stats.lock:
+        stats.requests += 1
+        throttled = rnd.random() < throttle
+        if throttled:
+          stats.throttled += 1
+      if latency:
+        time.sleep(latency)
+      if throttled:
+        return self._send(429, "Too Many Requests", [("Retry-After", f"{retry_after:g}")])
+      url = urlsplit(self.path)
+      query = {k: v[0] for k, v in parse_qs(url.query).items()}
+      try:
+        body = route(url.path, query, self.headers)
+      except (KeyError, ValueError):
+        body = None
+      if body is None:
+        return self._send(404, "Not Found")
+      self._send(200, body)
+
+    do_POST = do_GET
+
+  def route(path: str, q: dict, headers):
+    if site == "qoj.ac":
+      if path == "/submissions":
+        subs = data.history(q["submitter"])
+        last = max(1, data.depth)
+        page = min(max(1, int(q.get("page", 1))), last)
+        chunk = subs[(page - 1) * data.rows:page * data.rows]
+        return pages.qoj_listing(0, page=page, pages=last, subs=chunk, server_time=datetime.now(timezone.utc))
+      if path.startswith("/submission/"):
+        s = data.find(int(path.rsplit("/", 1)[1]))
+        return s and pages.qoj_detail(s.sid, s.problem, s.subtasks)
+    elif site == "oj.uz":
+      if path == "/submissions":
+        subs = data.history(q["handle"])
+        if "id" in q:
+          before = int(q["id"])
+          subs = [s for s in subs if s.sid < before]
+        return pages.ojuz_listing(0, subs=subs[:data.rows])
+      if path.startswith("/submission/"):
+        s = data.find(int(path.rsplit("/", 1)[1]))
+        return s and pages.ojuz_detail(s.sid, s.subtasks)
+      if path.startswith("/profile/"):
+        return pages.ojuz_profile(sorted(data.best(path.rsplit("/", 1)[1])))
+      if path.startswith("/problem/view/"):
+        name = path.rsplit("/", 1)[1]
+        user = (headers.get("Cookie") or "").partition("oidc-auth=")[2].split(";")[0]
+        return pages.ojuz_problem(name, data.best(user).get(name, 0) if user else 0)
+    else:
+      if path == "/recent/user":
+        subs = data.history(q["user_handle"])
+        page = 0 if q.get("page") in (None, "undefined") else int(q["page"])
+        chunk = subs[page * data.rows:(page + 1) * data.rows]
+        return {"max_page": data.depth, "content": pages.codechef_listing(0, subs=chunk)}
+      if path.startswith("/api/submission-details/"):
+        s = data.find(int(path.rsplit("/", 1)[1]))
+        return s and pages.codechef_detail(s)
+    return None
+
+  return Handler
+
+class StandIn:
+  """
+  The three stand-in servers. `latency` is added to every response (seconds),
+  `throttle` is the share of requests answered with a 429 carrying
+  Retry-After: `retry_after`, and `depth` is the number of listing pages
+  per user.
+  """
+
+  def __init__(self, latency: float = 0.0, throttle: float = 0.0, retry_after: float = 1.0, depth: int = 5):
+    self.now = datetime.now(timezone.utc).replace(microsecond=0)
+    self.data = {site: Dataset(site, depth, self.now) for site in SITES}
+    self.stats = {site: Stats() for site in SITES}
+    self.latency = latency
+    self.throttle = throttle
+    self.retry_after = retry_after
+    self.urls = {}
+    self._servers = []
+
+  def start(self) -> "StandIn":
+    for site in SITES:
+      handler = _handler(site, self.data[site], self.stats[site], self.latency, self.throttle, self.retry_after)
+      srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+      srv.daemon_threads = True
+      threading.Thread(target=srv.serve_forever, daemon=True).start()
+      self._servers.append(srv)
+      self.urls[site] = f"http://127.0.0.1:{srv.server_port}"
+    return self
+
+  def stop(self):
+    for srv in self._servers:
+      srv.shutdown()
+      srv.server_close()
+    self._servers = []
+
+  def base_urls(self) -> str:
+    """The SCRAPER_BASE_URLS value that sends the scrapers here."""
+    return ",".join(f"{site}={url}" for site, url in self.urls.items())
+
+def main():
+  ap = argparse.ArgumentParser(description="Serve stand-ins for oj.uz, qoj.ac and codechef.com.")
+  ap.add_argument("--latency", type=float, default=0.0, help="added latency per response, ms")
+  ap.add_argument("--throttle", type=float, default=0.0, help="share of requests answered with 429")
+  ap.add_argument("--retry-after", type=float, default=1.0, help="Retry-After on injected 429s, s")
+  ap.add_argument("--pages", type=int, default=5, help="listing pages per user")
+  args = ap.parse_args()
+
+  standin = StandIn(args.latency / 1000, args.throttle, args.retry_after, args.pages).start()
+  print(f"SCRAPER_BASE_URLS={standin.base_urls()}", flush=True)
+  try:
+    threading.Event().wait()
+  except KeyboardInterrupt:
+    standin.stop()
+
+if __name__ == "__main__":
+  main()
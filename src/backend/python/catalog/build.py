@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Compile the data/ YAML tree into the catalog read by catalog/lookup.py.
+
+The catalog remembers each file's content hash, so a rebuild only re-parses
+the files that changed and drops rows of the ones that were removed; an
+unchanged tree is checked in a few milliseconds. Rows are derived the way
+src/sync/problems.ts and src/sync/contests.ts derive them, so keys match
+the database.
+
+  python3 catalog/build.py [--out PATH] [--full]
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from catalog.lookup import ROOT, CATALOG_PATH, SCHEMA_VERSION, platform_of, canonical_url
+
+DATA_DIR = os.path.join(ROOT, "data")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+  key TEXT PRIMARY KEY,
+  value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+  path TEXT PRIMARY KEY,
+  sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS problems (
+  id INTEGER PRIMARY KEY,
+  file TEXT NOT NULL,
+  source TEXT NOT NULL,
+  year INTEGER NOT NULL,
+  number INTEGER,
+  extra TEXT NOT NULL,
+  name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS problems_key ON problems (source, year, number, extra);
+CREATE INDEX IF NOT EXISTS problems_file ON problems (file);
+CREATE TABLE IF NOT EXISTS links (
+  problem_id INTEGER NOT NULL REFERENCES problems (id) ON DELETE CASCADE,
+  position INTEGER NOT NULL,
+  platform TEXT NOT NULL,
+  url TEXT NOT NULL,
+  canonical TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS links_problem ON links (problem_id);
+CREATE INDEX IF NOT EXISTS links_canonical ON links (canonical);
+CREATE TABLE IF NOT EXISTS contests (
+  id INTEGER PRIMARY KEY,
+  file TEXT NOT NULL,
+  source TEXT NOT NULL,
+  year INTEGER NOT NULL,
+  stage TEXT NOT NULL,
+  data TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS contests_key ON contests (source, year, stage);
+CREATE INDEX IF NOT EXISTS contests_file ON contests (file);
+CREATE TABLE IF NOT EXISTS contest_problems (
+  contest_id INTEGER NOT NULL REFERENCES contests (id) ON DELETE CASCADE,
+  position INTEGER NOT NULL,
+  source TEXT NOT NULL,
+  year INTEGER NOT NULL,
+  number INTEGER NOT NULL,
+  extra TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contest_problems_contest ON contest_problems (contest_id);
+"""
+
+def yaml_files(kind: str):
+  """(path relative to data/, source, year, sub-file stem or None) for data/<kind>."""
+  base = os.path.join(DATA_DIR, kind)
+  for source in sorted(os.listdir(base)):
+    dir_ = os.path.join(base, source)
+    if not os.path.isdir(dir_):
+      continue
+    for name in sorted(os.listdir(dir_)):
+      path = os.path.join(dir_, name)
+      if name.endswith(".yaml") and os.path.isfile(path):
+        yield f"{kind}/{source}/{name}", source, int(name[:-5]), None
+      elif os.path.isdir(path):
+        for sub in sorted(os.listdir(path)):
+          if sub.endswith(".yaml"):
+            yield f"{kind}/{source}/{name}/{sub}", source, int(name), sub[:-5]
+
+def load_problems(conn, rel: str, source: str, year: int, stem: str | None, doc):
+  for p in doc or []:
+    # problems.ts turns only the first underscore into a space here
+    extra = stem.replace("_", " ", 1) if stem is not None else (p.get("extra") or "")
+    cur = conn.execute(
+      "INSERT INTO problems (file, source, year, number, extra, name) VALUES (?, ?, ?, ?, ?, ?)",
+      (rel, source, year, p.get("number"), extra, p.get("name"))
+    )
+    links = [*(p.get("links") or []), *([p["link"]] if p.get("link") else [])]
+    rows = []
+    for i, link in enumerate(links):
+      if isinstance(link, str):
+        link = {"platform": platform_of(link), "url": link}
+      rows.append((cur.lastrowid, i, link["platform"], link["url"], canonical_url(link["url"])))
+    conn.executemany("INSERT INTO links VALUES (?, ?, ?, ?, ?)", rows)
+
+def load_contest(conn, rel: str, source: str, year: int, stem: str | None, doc):
+  doc = dict(doc or {})
+  problems = doc.pop("problems", None) or []
+  stage = stem.replace("_", " ") if stem is not None else ""
+  doc.update(source=source, year=year, stage=stage or None)
+  cur = conn.execute(
+    "INSERT INTO contests (file, source, year, stage, data) VALUES (?, ?, ?, ?, ?)",
+    (rel, source, year, stage, json.dumps(doc, default=str))
+  )
+  conn.executemany(
+    "INSERT INTO contest_problems VALUES (?, ?, ?, ?, ?, ?)",
+    [(cur.lastrowid, i, p["source"], p["year"], p["number"], p.get("extra") or "") for i, p in enumerate(problems)]
+  )
+
+def drop_file(conn, rel: str):
+  conn.execute("DELETE FROM problems WHERE file = ?", (rel,))
+  conn.execute("DELETE FROM contests WHERE file = ?", (rel,))
+  conn.execute("DELETE FROM files WHERE path = ?", (rel,))
+
+def build(out: str = CATALOG_PATH, full: bool = False) -> dict:
+  """Bring the catalog at `out` up to date with data/; returns what changed."""
+  os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+  conn = sqlite3.connect(out, timeout=30, isolation_level=None)
+  conn.execute("PRAGMA journal_mode=WAL")
+  conn.execute("PRAGMA foreign_keys=ON")
+  meta = {}
+  try:
+    meta = dict(conn.execute("SELECT key, value FROM meta"))
+  except sqlite3.Error:
+    pass
+  if full or int(meta.get("schema", SCHEMA_VERSION)) != SCHEMA_VERSION:
+    for table in ("contest_problems", "contests", "links", "problems", "files", "meta"):
+      conn.execute(f"DROP TABLE IF EXISTS {table}")
+  conn.executescript(SCHEMA)
+
+  stats = {"files": 0, "rebuilt": 0, "removed": 0}
+  conn.execute("BEGIN IMMEDIATE")
+  try:
+    known = dict(conn.execute("SELECT path, sha256 FROM files"))
+    seen = set()
+    digest = hashlib.sha256()
+    for kind, load in (("problems", load_problems), ("contests", load_contest)):
+      for rel, source, year, stem in yaml_files(kind):
+        with open(os.path.join(DATA_DIR, rel), "rb") as f:
+          raw = f.read()
+        sha = hashlib.sha256(raw).hexdigest()
+        seen.add(rel)
+        digest.update(f"{rel}\0{sha}\n".encode())
+        stats["files"] += 1
+        if known.get(rel) == sha:
+          continue
+        drop_file(conn, rel)
+        load(conn, rel, source, year, stem, yaml.safe_load(raw))
+        conn.execute("INSERT INTO files VALUES (?, ?)", (rel, sha))
+        stats["rebuilt"] += 1
+    for rel in set(known) - seen:
+      drop_file(conn, rel)
+      stats["removed"] += 1
+    # the version changes whenever any input does, so readers can key caches on it
+    version = digest.hexdigest()[:16]
+    conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [
+      ("schema", str(SCHEMA_VERSION)),
+      ("version", version),
+      ("built", str(int(time.time()))),
+    ])
+    conn.execute("COMMIT")
+  except BaseException:
+    conn.execute("ROLLBACK")
+    raise
+  finally:
+    conn.close()
+  stats["version"] = version
+  return stats
+
+def main():
+  ap = argparse.ArgumentParser(description="Compile the data/ YAML tree into the catalog.")
+  ap.add_argument("--out", default=CATALOG_PATH, help=f"catalog file to write (default {CATALOG_PATH})")
+  ap.add_argument("--full", action="store_true", help="rebuild every file, not only the changed ones")
+  args = ap.parse_args()
+  started = time.monotonic()
+  stats = build(args.out, args.full)
+  print(
+    f"[ok] catalog {stats['version']}: {stats['rebuilt']} of {stats['files']} files rebuilt, "
+    f"{stats['removed']} removed in {time.monotonic() - started:.2f}s -> {args.out}"
+  )
+
+if __name__ == "__main__":
+  main()
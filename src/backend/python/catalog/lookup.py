@@ -0,0 +1,134 @@
+"""
+Read side of the problem/contest catalog compiled by catalog/build.py.
+
+The catalog is one SQLite file holding every problem, problem link and
+contest from data/, keyed the way the database keys them:
+(source, year, number, extra) for problems, (source, year, stage) for
+contests. Opening it doesn't parse any YAML.
+
+  cat = Catalog()
+  cat.problem("ioi", 2023, 1)          # {"name": "Closing Time", "links": [...], ...}
+  cat.problem_by_url("https://qoj.ac/problem/7118/")
+  cat.contest("ceoi", 2023, "Day 1")   # {"name": "CEOI 2023", "problems": [...], ...}
+"""
+import os
+import json
+import sqlite3
+from urllib.parse import urlsplit
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", ".."))
+CATALOG_PATH = os.environ.get("CATALOG_DB") or os.path.join(ROOT, ".cache", "catalog.db")
+SCHEMA_VERSION = 1
+
+# mirrors HostnameToPlatform in src/config.ts
+HOSTNAME_TO_PLATFORM = {
+  "acmicpc.net": "baekjoon",
+  "atcoder.jp": "atcoder",
+  "cms.iarcs.org.in": "cms",
+  "codebreaker.xyz": "codebreaker",
+  "codechef.com": "codechef",
+  "codedrills.io": "codedrills",
+  "codeforces.com": "codeforces",
+  "dmoj.ca": "dmoj",
+  "icpc.codedrills.io": "codedrills",
+  "oj.uz": "oj.uz",
+  "qoj.ac": "qoj.ac",
+  "szkopul.edu.pl": "szkopuł",
+  "usaco.org": "usaco",
+  "eolymp.com": "eolymp",
+}
+
+def platform_of(url: str) -> str:
+  """The platform name the problem sync gives a link."""
+  host = urlsplit(url).hostname or ""
+  host = host[4:] if host.startswith("www") else host
+  return HOSTNAME_TO_PLATFORM.get(host, host)
+
+def canonical_url(url: str) -> str:
+  """
+  `url` reduced to what identifies a problem: no scheme, www. or fragment, a
+  lowercase host and no trailing slash. The query stays, since some sites
+  (usaco.org) put the problem id there.
+  """
+  parts = urlsplit(url.strip())
+  host = (parts.hostname or "").lower()
+  if host.startswith("www."):
+    host = host[4:]
+  if parts.port:
+    host = f"{host}:{parts.port}"
+  key = host + (parts.path.rstrip("/") or "")
+  return f"{key}?{parts.query}" if parts.query else key
+
+class Catalog:
+  def __init__(self, path: str = CATALOG_PATH):
+    if not os.path.exists(path):
+      raise Exception(f"{path} not found; build it with catalog/build.py")
+    self.path = path
+    self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+    if int(meta.get("schema", 0)) != SCHEMA_VERSION:
+      raise Exception(f"{path} has an old catalog schema; rebuild it with catalog/build.py")
+    self.version = meta.get("version")
+
+  def _links(self, problem_id: int) -> list:
+    return [
+      {"platform": platform, "url": url}
+      for platform, url in self.conn.execute(
+        "SELECT platform, url FROM links WHERE problem_id = ? ORDER BY position", (problem_id,)
+      )
+    ]
+
+  def _problem(self, row) -> dict | None:
+    if row is None:
+      return None
+    id_, source, year, number, extra, name = row
+    return {
+      "source": source, "year": year, "number": number, "extra": extra,
+      "name": name, "links": self._links(id_),
+    }
+
+  def problem(self, source: str, year: int, number: int, extra: str = "") -> dict | None:
+    return self._problem(self.conn.execute(
+      "SELECT id, source, year, number, extra, name FROM problems "
+      "WHERE source = ? AND year = ? AND number = ? AND extra = ?",
+      (source, year, number, extra or "")
+    ).fetchone())
+
+  def problem_by_url(self, url: str) -> dict | None:
+    return self._problem(self.conn.execute(
+      "SELECT p.id, p.source, p.year, p.number, p.extra, p.name FROM links l "
+      "JOIN problems p ON p.id = l.problem_id WHERE l.canonical = ? LIMIT 1",
+      (canonical_url(url),)
+    ).fetchone())
+
+  def problems(self, source: str | None = None, year: int | None = None) -> list:
+    sql = "SELECT id, source, year, number, extra, name FROM problems"
+    where, args = [], []
+    if source is not None:
+      where.append("source = ?")
+      args.append(source)
+    if year is not None:
+      where.append("year = ?")
+      args.append(year)
+    if where:
+      sql += " WHERE " + " AND ".join(where)
+    return [self._problem(row) for row in self.conn.execute(sql + " ORDER BY source, year, extra, number", args)]
+
+  def contest(self, source: str, year: int, stage: str | None = None) -> dict | None:
+    row = self.conn.execute(
+      "SELECT id, data FROM contests WHERE source = ? AND year = ? AND stage = ?",
+      (source, year, stage or "")
+    ).fetchone()
+    if row is None:
+      return None
+    contest = json.loads(row[1])
+    contest["problems"] = [
+      {"source": s, "year": y, "number": n, "extra": e}
+      for s, y, n, e in self.conn.execute(
+        "SELECT source, year, number, extra FROM contest_problems WHERE contest_id = ? ORDER BY position", (row[0],)
+      )
+    ]
+    return contest
+
+  def close(self):
+    self.conn.close()
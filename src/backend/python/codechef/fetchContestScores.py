@@ -1,15 +1,29 @@
 #!/usr/bin/env python3
+import os
 import sys
-import json
 import re
-import time
-from datetime import datetime, timezone
+import contextlib
+from datetime import datetime, timedelta, timezone
 
 import cloudscraper
-from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import aio, dom, metrics, cookies
+from common.cache import DetailCache
+from common.checkpoint import Checkpoint
+from common.stream import Collector, cli_main
+from common.listing import fetch_pages
+from common.watch import ContestWatch, JUDGING, BEFORE_START, contest_window
 
 BASE = "https://www.codechef.com"
 
+# listing times are shown in an unstated timezone; a day covers any offset
+ROW_TIME_SLACK_MS = 24 * 3600 * 1000
+DETAIL_CONCURRENCY = 4
+
+# verdicts of a submission that hasn't finished judging
+PENDING_RE = re.compile(r"\b(waiting|running|compiling|pending|judging|queue)", re.I)
+
 
 ############################################################
 #   TIME HELPERS
@@ -31,33 +45,83 @@ def epoch_ms_to_iso(ms: int) -> str:
     return dt.isoformat().replace('+00:00', 'Z')
 
 
+RELATIVE_TIME_RE = re.compile(r"(\d+)\s*(sec|min|hour|day)s?\s+ago", re.I)
+RELATIVE_UNITS = {"sec": 1, "min": 60, "hour": 3600, "day": 86400}
+
+
+def row_time_to_epoch_ms(text: str) -> int | None:
+    """
+    Best-effort time of a /recent/user row, read as UTC: either an absolute
+    '12:30 PM 01/12/25' (day/month/year) or a relative '5 min ago'.
+    None when the text is in neither form.
+    """
+    text = " ".join((text or "").split())
+    m = RELATIVE_TIME_RE.search(text)
+    if m:
+        secs = int(m.group(1)) * RELATIVE_UNITS[m.group(2).lower()]
+        dt = datetime.now(timezone.utc) - timedelta(seconds=secs)
+        return int(dt.timestamp() * 1000)
+    try:
+        dt = datetime.strptime(text, "%I:%M %p %d/%m/%y").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+    return int(dt.timestamp() * 1000)
+
+
 ############################################################
 #   HTTP + RATE-LIMIT HELPERS
 ############################################################
 
-def fetch_json_with_retry(scraper, url, params=None, max_attempts=7):
+def make_scraper(cookie: str | None):
     """
-    Fetch JSON from CodeChef with retry & exponential backoff.
+    Scraper with session + browser-like headers.
+    """
+    scraper = cloudscraper.create_scraper()
+
+    if cookie:
+        scraper.cookies.set("SESS93b6022d778ee317bf48f7dbffe03173", cookie)
+
+    scraper.headers.update({
+        "accept": "application/json, text/javascript, */*; q=0.01",
+        "accept-language": "en-US,en;q=0.9",
+        "cache-control": "no-cache",
+        "dnt": "1",
+        "pragma": "no-cache",
+        "priority": "u=1, i",
+        "sec-ch-ua": '"Chromium";v="142", "Google Chrome";v="142", "Not_A Brand";v="99"',
+        "sec-ch-ua-arch": '"arm"',
+        "sec-ch-ua-bitness": '"64"',
+        "sec-ch-ua-full-version": '"142.0.7444.176"',
+        "sec-ch-ua-full-version-list": '"Chromium";v="142.0.7444.176", "Google Chrome";v="142.0.7444.176", "Not_A Brand";v="99.0.0.0"',
+        "sec-ch-ua-mobile": "?0",
+        "sec-ch-ua-model": '""',
+        "sec-ch-ua-platform": '"macOS"',
+        "sec-ch-ua-platform-version": '"15.3.1"',
+        "sec-fetch-dest": "empty",
+        "sec-fetch-mode": "cors",
+        "sec-fetch-site": "same-origin",
+        "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36",
+        "x-requested-with": "XMLHttpRequest"
+    })
+    cookies.attach(scraper, "codechef.com")
+    return scraper
+
+
+async def fetch_json_with_retry(client, url, params=None, max_attempts=7):
+    """
+    Fetch JSON from CodeChef through the shared rate limiter, which retries
+    429s with Retry-After / exponential backoff.
     Works for BOTH: /recent/user and /api/submission-details/<id>.
     """
-    backoff = 2.0
-    for _ in range(max_attempts):
-        r = scraper.get(url, params=params, timeout=20)
-
-        if r.status_code == 200:
-            try:
-                return r.json()
-            except Exception:
-                return None
-
-        if r.status_code == 429:
-            time.sleep(backoff)
-            backoff *= 1.5
-            continue
+    r = await client.get(url, params=params, timeout=20, max_attempts=max_attempts)
 
-        # Non-rate-limit HTTP error -> treat as fatal for this call
-        return None
+    if r.status_code == 200:
+        try:
+            return r.json()
+        except Exception:
+            return None
 
+    # Non-rate-limit HTTP error -> treat as fatal for this call
     return None
 
 
@@ -87,10 +151,10 @@ def extract_subtask_scores(testinfo_html: str):
 def parse_recent_submissions(content_html: str):
     """
     Parse the HTML snippet returned under 'content' from
-    https://www.codechef.com/recent/user to extract submission ids
-    and problem codes.
+    https://www.codechef.com/recent/user to extract submission ids,
+    problem codes and (when readable) row times.
     """
-    soup = BeautifulSoup(content_html, "html.parser")
+    soup = dom.parse(content_html, "table")
     rows = soup.select("table.dataTable tbody tr")
     results = []
 
@@ -115,9 +179,19 @@ def parse_recent_submissions(content_html: str):
 
             sub_id = m.group(1)
 
+            time_ms = None
+            td_time = row.select_one("td")
+            if td_time:
+                time_ms = row_time_to_epoch_ms(td_time.get("title") or td_time.get_text(" ", strip=True))
+
+            # the verdict icon's title, e.g. "accepted" or "wrong answer"
+            verdict = row.select_one("td span[title]")
+
             results.append({
                 "submission_id": sub_id,
                 "problem_code": code,
+                "time_ms": time_ms,
+                "verdict": verdict.get("title", "").strip().lower() if verdict else None,
             })
         except Exception:
             continue
@@ -129,25 +203,40 @@ def parse_recent_submissions(content_html: str):
 #   SUBMISSION DETAILS
 ############################################################
 
-def fetch_submission_details(scraper, sub_id: str):
+@metrics.staged("details")
+async def fetch_submission_details(client, sub_id: str, cache: DetailCache | None = None):
     """
     Call https://www.codechef.com/api/submission-details/<id>
     and return:
       - problem_code (string)
       - submission_date_ms (int)
       - total_score (float)
-      - subtask_scores (list[float])
+      - subtask_scores (list[float]), empty for non-scoring verdicts
+      - pending (bool), True while the submission may still be judged
+    or None for a submission that doesn't exist. A failed request raises.
+    Graded results are served from / stored in `cache` when given.
     """
-    url = f"{BASE}/api/submission-details/{sub_id}"
-    payload = fetch_json_with_retry(scraper, url)
+    if cache is not None:
+        hit = await aio.off_loop(cache.get, sub_id)
+        if hit is not None and hit["time"]:
+            return {
+                "problem_code": hit["problem"],
+                "submission_date_ms": iso_to_epoch_ms(hit["time"]),
+                "total_score": hit["total_score"],
+                "subtask_scores": hit["subtask_scores"],
+                "pending": False,
+            }
 
-    if not payload:
+    url = f"{BASE}/api/submission-details/{sub_id}"
+    r = await client.get(url, timeout=20)
+    if r.status_code == 404:
         return None
-
+    if r.status_code != 200:
+        raise Exception(f"Failed to fetch submission {sub_id}: {r.status_code}")
     try:
-        od = payload["data"]["other_details"]
+        od = r.json()["data"]["other_details"]
     except Exception:
-        return None
+        raise Exception(f"Unreadable details for submission {sub_id}")
 
     problem_code = od.get("problemCode")
     submission_date_ms = od.get("submissionDate")
@@ -157,15 +246,26 @@ def fetch_submission_details(scraper, sub_id: str):
     subtask_scores = extract_subtask_scores(testinfo_html)
 
     if not subtask_scores:
-        # No subtasks found → usually non-scoring / WA. Ignore.
-        return None
+        # No subtasks found: non-scoring (WA/TLE/...), or nothing judged yet
+        # when there's no verdict and no test results either
+        verdict = str(od.get("result") or od.get("verdict") or "")
+        return {
+            "problem_code": problem_code,
+            "submission_date_ms": submission_date_ms,
+            "total_score": 0.0,
+            "subtask_scores": [],
+            "pending": bool(PENDING_RE.search(verdict)) if verdict else not testinfo_html.strip(),
+        }
 
     total_score = float(sum(subtask_scores))
+    if cache is not None and isinstance(submission_date_ms, int):
+        await aio.off_loop(cache.put, sub_id, subtask_scores, total_score, epoch_ms_to_iso(submission_date_ms), problem_code)
     return {
         "problem_code": problem_code,
         "submission_date_ms": submission_date_ms,
         "total_score": total_score,
         "subtask_scores": subtask_scores,
+        "pending": False,
     }
 
 
@@ -173,170 +273,269 @@ def fetch_submission_details(scraper, sub_id: str):
 #   MAIN
 ############################################################
 
-def main():
-    try:
-        data = json.loads(sys.stdin.read() or "{}")
-
-        cookie = data.get("cookie")
-        username = data.get("username")
-        contest = data.get("contest") or {}
-
-        if not username or not contest:
-            sys.stdout.write(json.dumps({"submissions": []}))
-            sys.exit(0)
-
-        started_at = contest.get("startedAt")
-        ended_at = contest.get("endedAt")
-        contest_inner = (contest.get("contest") or {})
-        contest_problems = contest_inner.get("problems") or []
-        virtual_contest_id = contest.get("userId")
-
-        if not started_at:
-            sys.stdout.write(json.dumps({"submissions": []}))
-            sys.exit(0)
-
-        start_ms = iso_to_epoch_ms(started_at)
-        if ended_at is None:
-            end_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
-        else:
-            end_ms = iso_to_epoch_ms(ended_at)
-
-        # Map CodeChef problem code → contest_problem_id
-        problem_code_map = {}
-        for cprob in contest_problems:
-            cprob_id = cprob.get("id")
-            prob = cprob.get("problem") or {}
-            for pl in prob.get("problemLinks", []):
-                if pl.get("platform") == "codechef":
-                    url = pl.get("url") or ""
-                    code = _extract_problem_code_from_url(url)
-                    if code:
-                        problem_code_map[code] = {"contest_problem_id": cprob_id}
-
-        if not problem_code_map:
-            sys.stdout.write(json.dumps({"submissions": []}))
-            sys.exit(0)
-
-        # Scraper with session + browser-like headers
-        scraper = cloudscraper.create_scraper()
-
-        if cookie:
-            scraper.cookies.set("SESS93b6022d778ee317bf48f7dbffe03173", cookie)
-
-        scraper.headers.update({
-            "accept": "application/json, text/javascript, */*; q=0.01",
-            "accept-language": "en-US,en;q=0.9",
-            "cache-control": "no-cache",
-            "dnt": "1",
-            "pragma": "no-cache",
-            "priority": "u=1, i",
-            "sec-ch-ua": '"Chromium";v="142", "Google Chrome";v="142", "Not_A Brand";v="99"',
-            "sec-ch-ua-arch": '"arm"',
-            "sec-ch-ua-bitness": '"64"',
-            "sec-ch-ua-full-version": '"142.0.7444.176"',
-            "sec-ch-ua-full-version-list": '"Chromium";v="142.0.7444.176", "Google Chrome";v="142.0.7444.176", "Not_A Brand";v="99.0.0.0"',
-            "sec-ch-ua-mobile": "?0",
-            "sec-ch-ua-model": '""',
-            "sec-ch-ua-platform": '"macOS"',
-            "sec-ch-ua-platform-version": '"15.3.1"',
-            "sec-fetch-dest": "empty",
-            "sec-fetch-mode": "cors",
-            "sec-fetch-site": "same-origin",
-            "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36",
-            "x-requested-with": "XMLHttpRequest"
-        })
-
-        # Step 1: Discover all relevant submissions (by problem code) via /recent/user
-        relevant_subs = []
-
-        # First page: page=undefined
-        params = {"page": "undefined", "user_handle": username}
-        payload = fetch_json_with_retry(scraper, f"{BASE}/recent/user", params=params)
+def contest_problem_map(contest_problems) -> dict:
+    """
+    Map CodeChef problem code → contest_problem_id.
+    """
+    problem_code_map = {}
+    for cprob in contest_problems:
+        cprob_id = cprob.get("id")
+        prob = cprob.get("problem") or {}
+        for pl in prob.get("problemLinks", []):
+            if pl.get("platform") == "codechef":
+                url = pl.get("url") or ""
+                code = _extract_problem_code_from_url(url)
+                if code:
+                    problem_code_map[code] = {"contest_problem_id": cprob_id}
+    return problem_code_map
+
+
+async def run_async(data, emit=None):
+    out = Collector(emit)
+    cookie = data.get("cookie")
+    username = data.get("username")
+    contest = data.get("contest") or {}
+
+    if not username or not contest:
+        return out.result()
+
+    started_at = contest.get("startedAt")
+    ended_at = contest.get("endedAt")
+    contest_problems = (contest.get("contest") or {}).get("problems") or []
+    virtual_contest_id = contest.get("userId")
+
+    if not started_at:
+        return out.result()
+
+    start_ms = iso_to_epoch_ms(started_at)
+    if ended_at is None:
+        end_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+    else:
+        end_ms = iso_to_epoch_ms(ended_at)
+
+    problem_code_map = contest_problem_map(contest_problems)
+
+    if not problem_code_map:
+        return out.result()
+
+    client = aio.client(("codechef", cookie), lambda: make_scraper(cookie))
+
+    cache = DetailCache("codechef")
+
+    # Listing rows carry only a coarse local timestamp, so a row counts as
+    # before the contest only with a day of slack.
+    cutoff_ms = start_ms - ROW_TIME_SLACK_MS
+
+    # A finished contest's window doesn't move, so a failed run can be resumed.
+    checkpoint = await aio.off_loop(Checkpoint, "codechef/fetchContestScores", ended_at and [
+        username, virtual_contest_id, started_at, ended_at, sorted(problem_code_map)
+    ])
+    rows = checkpoint.state.setdefault("rows", [])
+    seen = {it["submission_id"] for it in rows}
+    # The listing page to continue from; None once the listing is done. New
+    # submissions only push rows to later pages, so resuming at the same page
+    # number may read some rows again but never skips one.
+    next_page = checkpoint.state.get("next", 0)
+
+    @metrics.staged("listing")
+    async def fetch_listing(page):
+        params = {"page": "undefined" if page == 0 else str(page), "user_handle": username}
+        payload = await fetch_json_with_retry(client, f"{BASE}/recent/user", params=params)
         if not payload:
-            sys.stdout.write(json.dumps({"submissions": []}))
-            sys.exit(0)
-
-        try:
-            max_page = int(payload.get("max_page", 1))
-        except Exception:
-            max_page = 1
-
-        content = payload.get("content", "") or ""
-        items = parse_recent_submissions(content)
-        for it in items:
-            if it["problem_code"] in problem_code_map:
-                relevant_subs.append(it)
-
-        # Subsequent pages: 1 .. max_page-1
-        for page in range(1, max_page):
-            params = {"page": str(page), "user_handle": username}
-            payload = fetch_json_with_retry(scraper, f"{BASE}/recent/user", params=params)
-            if not payload:
+            raise Exception(f"Failed to fetch submissions page {page}")
+        return payload
+
+    async def details(sub_info):
+        return await fetch_submission_details(client, sub_info["submission_id"], cache)
+
+    async def collect(relevant):
+        """Add the graded rows in the window; True once one predates the contest."""
+        reached_start = False
+        async for sub_info, details_, err in aio.as_ready(details, relevant, DETAIL_CONCURRENCY, retries=aio.ITEM_RETRIES):
+            if err is not None:
+                out.fail(err, sub_info["submission_id"])
                 continue
-
-            content = payload.get("content", "") or ""
-            items = parse_recent_submissions(content)
-            for it in items:
-                if it["problem_code"] in problem_code_map:
-                    relevant_subs.append(it)
-
-            time.sleep(0.5)
-
-        # Step 2: For each relevant submission, fetch details and stop
-        # when we hit a submission older than contest start (descending order).
-        submissions_out = []
-
-        for sub_info in relevant_subs:
-            sub_id = sub_info["submission_id"]
-            details = fetch_submission_details(scraper, sub_id)
-            if not details:
-                time.sleep(2.0)
+            if not details_ or not details_["subtask_scores"]:
                 continue
 
-            problem_code = details["problem_code"]
-            submission_date_ms = details["submission_date_ms"]
-            total_score = details["total_score"]
-            subtask_scores = details["subtask_scores"]
+            problem_code = details_["problem_code"]
+            submission_date_ms = details_["submission_date_ms"]
+            total_score = details_["total_score"]
+            subtask_scores = details_["subtask_scores"]
 
             if not isinstance(submission_date_ms, int):
-                time.sleep(2.0)
                 continue
 
             # Too new (after contest end) → ignore but keep going
             if submission_date_ms > end_ms:
-                time.sleep(2.0)
                 continue
 
-            # Too old (before contest start) → since sorted, we can stop here
+            # Too old (before contest start) → no later page can be in the window
             if submission_date_ms < start_ms:
-                time.sleep(2.0)
-                break
+                reached_start = True
+                continue
 
             mapping = problem_code_map.get(problem_code)
             if not mapping:
-                time.sleep(2.0)
                 continue
 
-            contest_problem_id = mapping["contest_problem_id"]
-            iso_time = epoch_ms_to_iso(submission_date_ms)
-
-            submissions_out.append({
+            out.add({
                 "virtualContestId": virtual_contest_id,
-                "contestProblemId": contest_problem_id,
-                "time": iso_time,
+                "contestProblemId": mapping["contest_problem_id"],
+                "time": epoch_ms_to_iso(submission_date_ms),
                 "score": total_score,
                 "subtaskScores": subtask_scores,
             })
+        return reached_start
 
-            time.sleep(2.0)
-
-        submissions_out.sort(key=lambda x: x["time"])
-        sys.stdout.write(json.dumps({"submissions": submissions_out}))
-        sys.exit(0)
+    # Rows that a previous run already listed go first; their graded details
+    # come from the cache.
+    if rows and await collect(list(rows)):
+        next_page = None
 
+    # Walk newest first and stop at the first page that reaches back past
+    # the contest start, either by a row timestamp or by a detail (ids are
+    # monotonic, so everything after it is older too).
+    try:
+        if next_page is not None:
+            # the first page (page=undefined) also tells the page count
+            first = await fetch_listing(0)
+            try:
+                max_page = int(first.get("max_page", 1))
+            except Exception:
+                max_page = 1
+
+            async def fetch(page):
+                return first if page == 0 else await fetch_listing(page)
+
+            pages = fetch_pages(fetch, range(next_page, max_page), concurrency=2)
+            async with contextlib.aclosing(pages):
+                async for page, payload in pages:
+                    items = parse_recent_submissions(payload.get("content", "") or "")
+                    relevant = [
+                        it for it in items
+                        if it["problem_code"] in problem_code_map
+                        and it["submission_id"] not in seen
+                        and not (it["time_ms"] is not None and it["time_ms"] < cutoff_ms)
+                    ]
+                    reached_start = any(it["time_ms"] is not None and it["time_ms"] < cutoff_ms for it in items)
+
+                    seen.update(it["submission_id"] for it in relevant)
+                    rows.extend(relevant)
+                    checkpoint.state["next"] = None if reached_start or page + 1 >= max_page else page + 1
+                    await aio.off_loop(checkpoint.save)
+
+                    if await collect(relevant) or reached_start:
+                        checkpoint.state["next"] = None
+                        break
+            checkpoint.state["next"] = None
     except Exception as e:
-        sys.stdout.write(json.dumps({"error": str(e)}))
-        sys.exit(1)
+        # the listing failed part way; a re-run continues from that page
+        out.fail(e)
+
+    # keep the listing progress for a re-run only while something is missing
+    if out.errors:
+        await aio.off_loop(checkpoint.save)
+    else:
+        await aio.off_loop(checkpoint.clear)
+    return out.result(cache=cache.stats(), resumed=checkpoint.resumed)
+
+
+async def watch_async(data, emit, stop=None):
+    """
+    Follow a running virtual contest (see common/watch.py), emitting each
+    graded submission once until the contest is over.
+    """
+    cookie = data.get("cookie")
+    username = data.get("username")
+    contest = data.get("contest") or {}
+
+    start_dt, end_dt = contest_window(contest)
+    start_ms = int(start_dt.timestamp() * 1000)
+    end_ms = int(end_dt.timestamp() * 1000)
+    problem_code_map = contest_problem_map((contest.get("contest") or {}).get("problems") or [])
+    virtual_contest_id = contest.get("userId")
+
+    client = aio.client(("codechef", cookie), lambda: make_scraper(cookie))
+    cache = DetailCache("codechef")
+    cutoff_ms = start_ms - ROW_TIME_SLACK_MS
+
+    async def pages():
+        # first page is page=undefined, then 1 .. max_page-1
+        page, max_page = "undefined", 1
+        while True:
+            params = {"page": str(page), "user_handle": username}
+            with metrics.stage("listing"):
+                payload = await fetch_json_with_retry(client, f"{BASE}/recent/user", params=params)
+            if not payload:
+                return
+            if page == "undefined":
+                try:
+                    max_page = int(payload.get("max_page", 1))
+                except Exception:
+                    max_page = 1
+                page = 0
+
+            rows = []
+            for it in parse_recent_submissions(payload.get("content", "") or ""):
+                rows.append({
+                    "submission_id": it["submission_id"],
+                    # a verdict the listing already showed as final
+                    "graded": it["verdict"] is not None and not PENDING_RE.search(it["verdict"]),
+                    "relevant": it["problem_code"] in problem_code_map,
+                    "before_start": it["time_ms"] is not None and it["time_ms"] < cutoff_ms,
+                })
+            yield rows
+
+            page += 1
+            if page >= max_page:
+                return
+
+    async def details(sub_info):
+        details_ = await fetch_submission_details(client, sub_info["submission_id"], cache)
+        if not details_:
+            return None
+        # only a submission still being judged is looked at again on the
+        # next poll; a graded non-scoring one is done
+        if not details_["subtask_scores"] and details_["pending"] and not sub_info["graded"]:
+            return JUDGING
+
+        submission_date_ms = details_["submission_date_ms"]
+        if not isinstance(submission_date_ms, int) or submission_date_ms > end_ms:
+            return None
+        if submission_date_ms < start_ms:
+            return BEFORE_START
+        if not details_["subtask_scores"]:
+            return None
+
+        mapping = problem_code_map.get(details_["problem_code"])
+        if not mapping:
+            return None
+        return {
+            "virtualContestId": virtual_contest_id,
+            "contestProblemId": mapping["contest_problem_id"],
+            "time": epoch_ms_to_iso(submission_date_ms),
+            "score": details_["total_score"],
+            "subtaskScores": details_["subtask_scores"],
+        }
+
+    watcher = ContestWatch(pages, details, end_dt, emit, data.get("interval"), concurrency=DETAIL_CONCURRENCY, stop=stop)
+    await watcher.run()
+    return watcher.result(cache=cache.stats())
+
+
+@metrics.instrument
+def run(data, emit=None):
+    return aio.run(run_async(data, emit))
+
+
+@metrics.instrument
+def watch(data, emit):
+    return aio.run(watch_async(data, emit))
+
+
+def main():
+    cli_main(run, watch)
 
 
 if __name__ == "__main__":
@@ -1,35 +1,43 @@
 #!/usr/bin/env python3
+import os
 import sys
 import json
 import re
-import time
+import hashlib
+import contextlib
+from datetime import datetime, timezone
 import cloudscraper
-from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import aio, dom, metrics, cookies, problem_index
+from common.aggregate import BestScores
+from common.cache import DetailCache
+from common.listing import fetch_pages, LISTING_CONCURRENCY
+from common.planner import SaturationPlanner
 
 BASE = "https://www.codechef.com"
+DETAIL_CONCURRENCY = 2
+
+# the whole text of the result cell, e.g. "(40)"
+RESULT_SCORE_RE = re.compile(r"^\(([0-9]+(?:\.[0-9]+)?)\)$")
+# verdicts of a submission that hasn't finished judging
+PENDING_RE = re.compile(r"\b(waiting|running|compiling|pending|judging|queue)", re.I)
 
-def fetch_json_with_retry(scraper, url, params=None, max_attempts=7):
+async def fetch_json_with_retry(client, url, params=None, max_attempts=7):
     """
-    Fetch JSON from CodeChef with retry & exponential backoff.
+    Fetch JSON from CodeChef through the shared rate limiter, which retries
+    429s with Retry-After / exponential backoff.
     Works for BOTH: /recent/user and /submission-details/<id>.
     """
-    backoff = 2.0
-    for _ in range(max_attempts):
-        r = scraper.get(url, params=params, timeout=20)
-
-        if r.status_code == 200:
-            try:
-                return r.json()
-            except:
-                return None
-
-        if r.status_code == 429:
-            time.sleep(backoff)
-            backoff *= 1.5
-            continue
+    r = await client.get(url, params=params, timeout=20, max_attempts=max_attempts)
 
-        return None
+    if r.status_code == 200:
+        try:
+            return r.json()
+        except:
+            return None
 
+    # Non-rate-limit HTTP error -> treat as fatal for this call
     return None
 
 def _extract_problem_code_from_url(url: str) -> str | None:
@@ -48,7 +56,7 @@ def extract_subtask_scores(testinfo_html: str):
 
 
 def _parse_recent_submissions(content_html: str):
-    soup = BeautifulSoup(content_html, "html.parser")
+    soup = dom.parse(content_html, "table")
     rows = soup.select("table.dataTable tbody tr")
     results = []
 
@@ -73,159 +81,231 @@ def _parse_recent_submissions(content_html: str):
 
             sub_id = m.group(1)
 
+            # the result cell holds the verdict icon, and for scored
+            # problems the points as "(40)"; other cells are never read
+            score = None
+            accepted = False
+            pending = False
+            for td in row.select("td"):
+                verdict = td.select_one("span[title]")
+                if not verdict:
+                    continue
+                title = verdict.get("title", "").strip().lower()
+                accepted = title == "accepted"
+                pending = bool(PENDING_RE.search(title))
+                m = RESULT_SCORE_RE.match(td.get_text("", strip=True))
+                if m:
+                    score = float(m.group(1))
+                break
+
             results.append({
                 "submission_id": sub_id,
                 "problem_code": code,
+                "score": score,
+                # an accepted submission scores the problem's maximum
+                "max": score if accepted else None,
+                "full": accepted,
+                "pending": pending,
             })
         except:
             continue
 
     return results
 
-def _fetch_submission_subtasks(scraper, sub_id: str):
+@metrics.staged("details")
+async def _fetch_submission_subtasks(client, sub_id: str, cache: DetailCache):
+    """
+    (subtask scores, submission time) of a graded submission, or None. A
+    failed request raises, so that the submission is retried by a later sync.
+    """
+    hit = await aio.off_loop(cache.get, sub_id)
+    if hit is not None:
+        return hit["subtask_scores"], hit["time"]
+
     url = f"{BASE}/api/submission-details/{sub_id}"
-    payload = fetch_json_with_retry(scraper, url)
-    if not payload:
+    r = await client.get(url, timeout=20)
+    if r.status_code == 404:
         return None
+    if r.status_code != 200:
+        raise Exception(f"Failed to fetch submission {sub_id}: {r.status_code}")
+    try:
+        payload = r.json()
+    except ValueError:
+        raise Exception(f"Unreadable details of submission {sub_id}")
 
     try:
-        testinfo_html = payload["data"]["other_details"]["testInfo"]
+        od = payload["data"]["other_details"]
+        testinfo_html = od["testInfo"]
     except:
+        od = {}
         testinfo_html = ""
 
     scores = extract_subtask_scores(testinfo_html)
-    return scores or None
-
-def main():
-    try:
-        data = json.loads(sys.stdin.read() or "{}")
-        username = data.get("username")
-        problems = data.get("problems", [])
-        cookie = data.get("cookie")
-
-        if not username:
-            sys.stdout.write(json.dumps({"scores": []}))
-            sys.exit(0)
-
-        problem_map = {}
-        for p in problems:
-            link = None
-            for entry in p.get("problemLinks", []):
-                if entry.get("platform") == "codechef":
-                    link = entry.get("url")
-                    break
-
-            code = _extract_problem_code_from_url(link or "")
-            if code:
-                problem_map[code] = {"id": p.get("id"), "link": link}
-
-        scraper = cloudscraper.create_scraper()
-
-        if cookie:
-            scraper.cookies.set("SESS93b6022d778ee317bf48f7dbffe03173", cookie)
-            scraper.headers.update({
-                "accept": "application/json, text/javascript, */*; q=0.01",
-                "accept-language": "en-US,en;q=0.9",
-                "cache-control": "no-cache",
-                "dnt": "1",
-                "pragma": "no-cache",
-                "priority": "u=1, i",
-                "referer": f"https://www.codechef.com/users/{username}",
-                "sec-ch-ua": '"Chromium";v="142", "Google Chrome";v="142", "Not_A Brand";v="99"',
-                "sec-ch-ua-arch": '"arm"',
-                "sec-ch-ua-bitness": '"64"',
-                "sec-ch-ua-full-version": '"142.0.7444.176"',
-                "sec-ch-ua-full-version-list": '"Chromium";v="142.0.7444.176", "Google Chrome";v="142.0.7444.176", "Not_A Brand";v="99.0.0.0"',
-                "sec-ch-ua-mobile": "?0",
-                "sec-ch-ua-model": '""',
-                "sec-ch-ua-platform": '"macOS"',
-                "sec-ch-ua-platform-version": '"15.3.1"',
-                "sec-fetch-dest": "empty",
-                "sec-fetch-mode": "cors",
-                "sec-fetch-site": "same-origin",
-                "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36",
-                "x-requested-with": "XMLHttpRequest"
-            })
+    # the contest fetcher reads time and problem code from the same entries
+    submission_date_ms = od.get("submissionDate")
+    submitted_at = None
+    if isinstance(submission_date_ms, int):
+        submitted_at = datetime.fromtimestamp(submission_date_ms / 1000.0, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+        if scores:
+            await aio.off_loop(cache.put, sub_id, scores, sum(scores), submitted_at, od.get("problemCode"))
+    return (scores, submitted_at) if scores else None
+
+def _make_scraper(cookie, username):
+    scraper = cloudscraper.create_scraper()
+    if cookie:
+        scraper.cookies.set("SESS93b6022d778ee317bf48f7dbffe03173", cookie)
+        scraper.headers.update({
+            "accept": "application/json, text/javascript, */*; q=0.01",
+            "accept-language": "en-US,en;q=0.9",
+            "cache-control": "no-cache",
+            "dnt": "1",
+            "pragma": "no-cache",
+            "priority": "u=1, i",
+            "referer": f"https://www.codechef.com/users/{username}",
+            "sec-ch-ua": '"Chromium";v="142", "Google Chrome";v="142", "Not_A Brand";v="99"',
+            "sec-ch-ua-arch": '"arm"',
+            "sec-ch-ua-bitness": '"64"',
+            "sec-ch-ua-full-version": '"142.0.7444.176"',
+            "sec-ch-ua-full-version-list": '"Chromium";v="142.0.7444.176", "Google Chrome";v="142.0.7444.176", "Not_A Brand";v="99.0.0.0"',
+            "sec-ch-ua-mobile": "?0",
+            "sec-ch-ua-model": '""',
+            "sec-ch-ua-platform": '"macOS"',
+            "sec-ch-ua-platform-version": '"15.3.1"',
+            "sec-fetch-dest": "empty",
+            "sec-fetch-mode": "cors",
+            "sec-fetch-site": "same-origin",
+            "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36",
+            "x-requested-with": "XMLHttpRequest"
+        })
+    cookies.attach(scraper, "codechef.com")
+    return scraper
+
+async def run_async(data):
+    username = data.get("username")
+    cookie = data.get("cookie")
+
+    if not username:
+        return {"scores": []}
+
+    # problem code -> {"id", "link"}
+    problem_map = problem_index.resolve(data, "codechef", _extract_problem_code_from_url).problems
+
+    # high-water mark from the previous sync: every submission up to
+    # lastSubmissionId is already folded into the stored best vectors
+    # it is only valid for the same account and the same tracked problem set,
+    # otherwise older submissions on newly tracked problems would be skipped
+    problem_set = hashlib.sha1(",".join(sorted(problem_map)).encode()).hexdigest()
+    cursor = data.get("cursor") or {}
+    if cursor.get("username") != username or cursor.get("problemSet") != problem_set:
+        cursor = {}
+    since_id = int(cursor.get("lastSubmissionId") or 0)
+
+    client = aio.client(("codechef", cookie, username), lambda: _make_scraper(cookie, username))
+
+    cache = DetailCache("codechef")
+    # the stored best vectors; new submissions are folded in as they arrive,
+    # so memory stays per problem
+    best = BestScores()
+    best.load(cursor.get("problems"))
+    planner = SaturationPlanner("problem_code", best=best, maxima=cursor.get("maxima"))
+    newest_id = since_id
+    oldest_pending = None
+    failed = []
+
+    params = {"page": "undefined", "user_handle": username}
+    with metrics.stage("listing"):
+        payload = await fetch_json_with_retry(client, f"{BASE}/recent/user", params=params)
 
-        detailed_submissions = []
+    if not payload:
+        return {"scores": []}
 
-        params = {"page": "undefined", "user_handle": username}
-        payload = fetch_json_with_retry(scraper, f"{BASE}/recent/user", params=params)
+    max_page = int(payload.get("max_page", 1))
 
+    @metrics.staged("listing")
+    async def fetch_listing(page):
+        params = {"page": str(page), "user_handle": username}
+        payload = await fetch_json_with_retry(client, f"{BASE}/recent/user", params=params)
+        # a page that can't be read must fail the sync: the cursor would
+        # otherwise move past every submission on it
         if not payload:
-            sys.stdout.write(json.dumps({"scores": []}))
-            sys.exit(0)
-
-        max_page = int(payload.get("max_page", 1))
+            raise Exception(f"Failed to fetch submissions page {page}")
+        return payload
+
+    # the listing is newest first, so a cursor walk stays sequential and
+    # stops at the first page that reaches the mark; without one the
+    # remaining pages are prefetched while earlier details are fetched
+    async def listing(first):
+        yield 0, first
+        rest = fetch_pages(fetch_listing, range(1, max_page), concurrency=1 if since_id else LISTING_CONCURRENCY)
+        async with contextlib.aclosing(rest):
+            async for item in rest:
+                yield item
+
+    pages = listing(payload)
+    async for _, payload in pages:
         items = _parse_recent_submissions(payload.get("content", ""))
+        fresh = [it for it in items if int(it["submission_id"]) > since_id]
+        for it in fresh:
+            sid = int(it["submission_id"])
+            newest_id = max(newest_id, sid)
+            if it["pending"] and (oldest_pending is None or sid < oldest_pending):
+                oldest_pending = sid
+
+        # still-judging submissions are left for the next sync
+        relevant = [it for it in fresh if it["problem_code"] in problem_map and not it["pending"]]
+
+        async def subtasks(sub_info):
+            return await _fetch_submission_subtasks(client, sub_info["submission_id"], cache)
+
+        # problems at full marks need no more details; the most promising
+        # submission of each problem goes first so that it can prune the rest
+        wave, rest = planner.split(relevant)
+        while wave:
+            async for sub_info, det, err in aio.as_ready(subtasks, wave, DETAIL_CONCURRENCY, retries=aio.ITEM_RETRIES):
+                if err is not None:
+                    failed.append(int(sub_info["submission_id"]))
+                elif det is not None:
+                    scores, submitted_at = det
+                    planner.observe(sub_info["problem_code"], scores, submitted_at, sub_info["full"])
+            wave, rest = planner.useful(rest), []
+
+        if len(fresh) < len(items):
+            break
+    # cancels listing pages still in flight after an early stop
+    await pages.aclose()
+
+    results = [
+        {"problemId": problem_map[code]["id"], "score": round(best.total(code), 2)}
+        for code in best if code in problem_map
+    ]
+
+    # never move the mark past a submission that is still being judged, or
+    # whose details couldn't be fetched; the next sync picks those up again
+    for held in (oldest_pending, min(failed, default=None)):
+        if held is not None:
+            newest_id = max(since_id, min(newest_id, held - 1))
+
+    new_cursor = {
+        "username": username,
+        "problemSet": problem_set,
+        "lastSubmissionId": newest_id,
+        "problems": best.dump(),
+        "maxima": planner.maxima,
+    }
+
+    return {"scores": results, "cursor": new_cursor, "failed": sorted(failed), "cache": cache.stats(), "pruned": planner.pruned}
+
+@metrics.instrument
+def run(data):
+    return aio.run(run_async(data))
 
-        relevant = [it for it in items if it["problem_code"] in problem_map]
-
-        for sub_info in relevant:
-            scores = _fetch_submission_subtasks(scraper, sub_info["submission_id"])
-            if scores is not None:
-                detailed_submissions.append({
-                    "problem_code": sub_info["problem_code"],
-                    "subtask_scores": scores,
-                })
-            time.sleep(2.0)
-
-        for page in range(1, max_page):
-            params = {"page": str(page), "user_handle": username}
-            payload = fetch_json_with_retry(scraper, f"{BASE}/recent/user", params=params)
-
-            if not payload:
-                continue
-
-            items = _parse_recent_submissions(payload.get("content", ""))
-            relevant = [it for it in items if it["problem_code"] in problem_map]
-
-            for sub_info in relevant:
-                scores = _fetch_submission_subtasks(scraper, sub_info["submission_id"])
-                if scores is not None:
-                    detailed_submissions.append({
-                        "problem_code": sub_info["problem_code"],
-                        "subtask_scores": scores,
-                    })
-                time.sleep(2.0)
-
-        problem_best = {}
-
-        for sub in detailed_submissions:
-            code = sub["problem_code"]
-            if code not in problem_map:
-                continue
-
-            b = sub["subtask_scores"]
-            if not b:
-                continue
-
-            if code not in problem_best:
-                problem_best[code] = {
-                    "total_score": sum(b),
-                    "subtask_scores": b,
-                }
-            else:
-                a = problem_best[code]["subtask_scores"]
-                merged = [
-                    max(a[i] if i < len(a) else 0.0,
-                        b[i] if i < len(b) else 0.0)
-                    for i in range(max(len(a), len(b)))
-                ]
-                problem_best[code]["total_score"] = sum(merged)
-                problem_best[code]["subtask_scores"] = merged
-
-        results = [
-            {"problemId": problem_map[code]["id"], "score": round(best["total_score"], 2)}
-            for code, best in problem_best.items()
-        ]
-
-        sys.stdout.write(json.dumps({"scores": results}))
-        sys.exit(0)
-
+def main():
+    try:
+        out = run(json.loads(sys.stdin.read() or "{}"))
     except Exception as e:
-        sys.stdout.write(json.dumps({"error": str(e)}))
-        sys.exit(1)
+        out = {"error": str(e)}
+    sys.stdout.write(json.dumps(out))
+    sys.exit(1 if "error" in out else 0)
 
 if __name__ == "__main__":
     main()
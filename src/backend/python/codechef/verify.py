@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 
+import os
 import json
 import sys
 import cloudscraper
 import re
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import aio, metrics, cookies
+
 BASE = "https://codechef.com"
 
 def extract_codechef_username(html: str) -> str | None:
@@ -26,19 +30,35 @@ def extract_codechef_username(html: str) -> str | None:
     return None
   return data.get("user", {}).get("username")
 
-def main():
-  data = json.loads(sys.stdin.read())
-  session = data.get("session")
+def make_scraper(session: str):
   s = cloudscraper.create_scraper()
   s.cookies.set("SESS93b6022d778ee317bf48f7dbffe03173", session)
+  # the fetch scripts' User-Agent, so they share a clearance
+  s.headers["User-Agent"] = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36"
+  cookies.attach(s, "codechef.com")
+  return s
+
+async def run_async(data):
+  session = data.get("session")
+  client = aio.client(("codechef", "verify", session), lambda: make_scraper(session))
 
-  resp = s.get(BASE)
+  resp = await client.get(BASE)
   username = extract_codechef_username(resp.text)
   if username is None:
-    sys.stdout.write(json.dumps({"error": "Invalid codechef session"}))
-    sys.exit(1)
-  sys.stdout.write(json.dumps({"username": username}))
-  sys.exit(0)
+    return {"error": "Invalid codechef session"}
+  return {"username": username}
+
+@metrics.instrument
+def run(data):
+  return aio.run(run_async(data))
+
+def main():
+  try:
+    out = run(json.loads(sys.stdin.read()))
+  except Exception as e:
+    out = {"error": str(e)}
+  sys.stdout.write(json.dumps(out))
+  sys.exit(1 if "error" in out else 0)
 
 if __name__ == "__main__":
-  main()
\ No newline at end of file
+  main()
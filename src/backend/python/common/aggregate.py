@@ -0,0 +1,120 @@
+import math
+from array import array
+from datetime import datetime, timezone
+
+# record layout: [total, time, subtask 0, reached 0, subtask 1, reached 1, ...]
+TOTAL = 0
+TIME = 1
+SUBTASKS = 2
+
+def _ts(iso) -> float:
+  if not iso:
+    return math.nan
+  return datetime.fromisoformat(str(iso).replace("Z", "+00:00")).astimezone(timezone.utc).timestamp()
+
+def _iso(ts: float) -> str | None:
+  if math.isnan(ts):
+    return None
+  return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+
+def _earlier(a: float, b: float) -> float:
+  if math.isnan(a):
+    return b
+  return a if math.isnan(b) else min(a, b)
+
+class BestScores:
+  """
+  Per-problem best subtask vectors, merged element-wise, plus the time the
+  best total was first reached.
+
+  Submissions are folded in one at a time, so a sync keeps one record per
+  problem however long the user's history is, and a record stored by the
+  previous sync (see dump()/load()) is extended with only the new
+  submissions. Each record is a single array of doubles laid out as
+  [total, time, subtask, reached, subtask, reached, ...], times as epoch
+  seconds (NaN when unknown).
+
+  `reached` is the earliest submission that scored the subtask's best value.
+  The merged total first hits its final value once every subtask has, so the
+  record's time is the latest of those; it doesn't depend on the order the
+  listing is walked in. A problem with nothing scored keeps its earliest
+  submission's time.
+  """
+
+  def __init__(self):
+    self._best = {}
+
+  def fold(self, problem, subtask_scores, time=None) -> bool:
+    """Merge one graded submission into `problem`'s record; True if it raised anything."""
+    b = [float(x) for x in subtask_scores or []]
+    t = _ts(time)
+    rec = self._best.get(problem)
+    improved = rec is None
+    if improved:
+      rec = self._best[problem] = array("d", [0.0, t])
+    n = (len(rec) - SUBTASKS) // 2
+    if len(b) > n:
+      rec.extend([0.0, math.nan] * (len(b) - n))
+    for i, v in enumerate(b):
+      j = SUBTASKS + 2 * i
+      if v > rec[j]:
+        rec[j], rec[j + 1] = v, t
+        improved = True
+      elif v == rec[j]:
+        rec[j + 1] = _earlier(rec[j + 1], t)
+    self._settle(rec, t)
+    return improved
+
+  def _settle(self, rec, t=math.nan):
+    rec[TOTAL] = sum(rec[SUBTASKS::2])
+    reached = [r for v, r in zip(rec[SUBTASKS::2], rec[SUBTASKS + 1::2]) if v > 0 and not math.isnan(r)]
+    if reached:
+      rec[TIME] = max(reached)
+    elif rec[TOTAL] <= 0:
+      rec[TIME] = _earlier(rec[TIME], t)
+    else:
+      rec[TIME] = math.nan
+
+  def load(self, stored: dict, key=lambda k: k):
+    """Seed records from dump() output, e.g. a sync cursor; `key` converts its (string) keys."""
+    for k, best in (stored or {}).items():
+      scores = best.get("subtaskScores") or []
+      # records stored before per-subtask times fall back to the record's time
+      reached = best.get("reachedAt") or [best.get("time")] * len(scores)
+      problem = key(k)
+      for i, (v, r) in enumerate(zip(scores, reached)):
+        self.fold(problem, [0.0] * i + [v], r)
+      if not scores:
+        self.fold(problem, [], best.get("time"))
+
+  def dump(self) -> dict:
+    return {
+      str(problem): {
+        "subtaskScores": list(rec[SUBTASKS::2]),
+        "reachedAt": [_iso(r) for r in rec[SUBTASKS + 1::2]],
+        "time": _iso(rec[TIME]),
+      }
+      for problem, rec in self._best.items()
+    }
+
+  def total(self, problem) -> float:
+    rec = self._best.get(problem)
+    return rec[TOTAL] if rec is not None else 0.0
+
+  def time(self, problem) -> str | None:
+    """When the best total was first reached, as an ISO UTC string."""
+    rec = self._best.get(problem)
+    return _iso(rec[TIME]) if rec is not None else None
+
+  def subtask_scores(self, problem) -> list:
+    rec = self._best.get(problem)
+    return list(rec[SUBTASKS::2]) if rec is not None else []
+
+  def __contains__(self, problem) -> bool:
+    return problem in self._best
+
+  def __iter__(self):
+    return iter(self._best)
+
+  def __len__(self) -> int:
+    return len(self._best)
@@ -0,0 +1,245 @@
+import os
+import time
+import asyncio
+import weakref
+import threading
+import functools
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+import cloudscraper
+
+from common import metrics, cookies
+from common.sessions import pooled, discard
+from common.ratelimit import host_of, try_acquire, penalize
+from common.net import RETRY_STATUSES, retry_after, rebase
+
+def _available(module: str) -> bool:
+  try:
+    return importlib.util.find_spec(module) is not None
+  except ModuleNotFoundError:
+    return False
+
+# httpx when installed (HTTP/2 with h2), otherwise requests on a thread pool;
+# SCRAPER_HTTP_TRANSPORT forces one
+TRANSPORT = os.environ.get("SCRAPER_HTTP_TRANSPORT") or ("httpx" if _available("httpx") else "threads")
+HTTP2 = _available("h2")
+HOST_CONCURRENCY = int(os.environ.get("SCRAPER_HOST_CONCURRENCY", "6"))
+THREADS = int(os.environ.get("SCRAPER_HTTP_THREADS", "32"))
+DB_THREADS = int(os.environ.get("SCRAPER_DB_THREADS", "4"))
+# how often callers of as_ready retry a failed item, and the delay before
+# each attempt (times the attempt number)
+ITEM_RETRIES = int(os.environ.get("SCRAPER_ITEM_RETRIES", "2"))
+RETRY_DELAY = float(os.environ.get("SCRAPER_RETRY_DELAY", "1"))
+
+_loop = None
+_loop_lock = threading.Lock()
+_threads = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix="scraper-http")
+# the rate limiter, cookie jar and detail cache are SQLite files that other
+# processes lock too, so their calls run here instead of on the shared loop
+_db_threads = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="scraper-db")
+_local = threading.local()
+_slots = {}
+
+def _get_loop():
+  global _loop
+  with _loop_lock:
+    if _loop is None:
+      _loop = asyncio.new_event_loop()
+      threading.Thread(target=_loop.run_forever, name="scraper-aio", daemon=True).start()
+    return _loop
+
+def run(coro):
+  """
+  Run `coro` on the process-wide event loop and wait for its result. Every job
+  shares the loop, so keep-alive connections and per-host limits span jobs.
+  """
+  return asyncio.run_coroutine_threadsafe(metrics.bound(metrics.current(), coro), _get_loop()).result()
+
+def spawn(coro):
+  """
+  Start `coro` on the shared loop without waiting for it; returns a
+  concurrent.futures.Future for its result.
+  """
+  return asyncio.run_coroutine_threadsafe(metrics.bound(metrics.current(), coro), _get_loop())
+
+def call_soon(fn, *args):
+  """Call fn(*args) on the loop thread, e.g. to set an asyncio.Event from a job thread."""
+  _get_loop().call_soon_threadsafe(fn, *args)
+
+def _host_slots(host: str) -> asyncio.Semaphore:
+  # only touched from the loop thread
+  sem = _slots.get(host)
+  if sem is None:
+    sem = _slots[host] = asyncio.Semaphore(HOST_CONCURRENCY)
+  return sem
+
+async def off_loop(fn, *args):
+  """Run the blocking (SQLite) call fn(*args) on a database thread."""
+  return await asyncio.get_running_loop().run_in_executor(_db_threads, functools.partial(fn, *args))
+
+async def acquire(host: str):
+  """Wait for the shared per-host rate limiter without blocking the loop."""
+  while True:
+    wait = await off_loop(try_acquire, host)
+    if wait <= 0:
+      return
+    metrics.slept(wait)
+    await asyncio.sleep(wait)
+
+def _clone(session):
+  """
+  Per-thread copy of `session` sharing its cookie jar and headers, so the
+  thread transport never drives one requests.Session from two threads.
+  """
+  clones = getattr(_local, "clones", None)
+  if clones is None:
+    clones = _local.clones = weakref.WeakKeyDictionary()
+  clone = clones.get(session)
+  if clone is None:
+    if isinstance(session, cloudscraper.CloudScraper):
+      clone = cloudscraper.create_scraper(sess=session)
+    else:
+      clone = type(session)()
+      clone.headers = session.headers
+      clone.cookies = session.cookies
+    clones[session] = clone
+  return clone
+
+def _blocking(session, method: str, url: str, kwargs):
+  return _clone(session).request(method, url, **kwargs)
+
+def _challenged(r) -> bool:
+  if r.status_code not in (403, 503):
+    return False
+  if r.headers.get("cf-mitigated") == "challenge":
+    return True
+  return "cloudflare" in r.headers.get("server", "").lower() and "challenge-platform" in r.text
+
+class Client:
+  """
+  Async front for a pooled requests/cloudscraper session: same cookies and
+  headers, with requests going through the shared rate limiter and at most
+  HOST_CONCURRENCY in flight per host. Responses expose status_code, text,
+  headers and json() whichever transport is in use.
+  """
+
+  def __init__(self, session):
+    self.session = session
+    self._http = None
+
+  def _httpx(self):
+    if self._http is None:
+      import httpx
+      self._http = httpx.AsyncClient(
+        # the jar is shared with the session, so a Cloudflare clearance that
+        # cloudscraper obtains is sent on the next httpx request too
+        cookies=self.session.cookies,
+        http2=HTTP2,
+        limits=httpx.Limits(max_connections=HOST_CONCURRENCY * 2, max_keepalive_connections=HOST_CONCURRENCY),
+      )
+    return self._http
+
+  async def _in_thread(self, method: str, url: str, kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_threads, functools.partial(_blocking, self.session, method, url, kwargs))
+
+  async def _send(self, method: str, url: str, kwargs):
+    if TRANSPORT != "httpx":
+      return await self._in_thread(method, url, kwargs)
+    kw = dict(kwargs)
+    kw["follow_redirects"] = kw.pop("allow_redirects", method != "HEAD")
+    kw["headers"] = {**self.session.headers, **(kw.get("headers") or {})}
+    r = await self._httpx().request(method, url, **kw)
+    if _challenged(r) and isinstance(self.session, cloudscraper.CloudScraper):
+      r = await self._in_thread(method, url, kwargs)
+    return r
+
+  async def request(self, method: str, url: str, max_attempts: int = 7, **kwargs):
+    """Async counterpart of net.request, with the same retry behaviour."""
+    host = host_of(url)
+    target = rebase(url)
+    backoff = 2.0
+    async with _host_slots(host):
+      for attempt in range(max_attempts):
+        await acquire(host)
+        if attempt:
+          metrics.retry()
+        start = time.perf_counter()
+        r = await self._send(method, target, kwargs)
+        metrics.request(url, r, time.perf_counter() - start)
+        await off_loop(cookies.sync, self.session)
+        if r.status_code not in RETRY_STATUSES or attempt == max_attempts - 1:
+          return r
+        delay = retry_after(r)
+        if delay is None:
+          if r.status_code != 429:
+            return r
+          delay = backoff
+          backoff *= 1.5
+        await off_loop(penalize, host, delay)
+    return r
+
+  async def get(self, url: str, **kwargs):
+    return await self.request("GET", url, **kwargs)
+
+  async def post(self, url: str, **kwargs):
+    return await self.request("POST", url, **kwargs)
+
+  def close(self):
+    if self._http is not None:
+      asyncio.run_coroutine_threadsafe(self._http.aclose(), _get_loop())
+      self._http = None
+
+def client(key, factory) -> Client:
+  """The pooled session under `key` (see sessions.pooled) wrapped in a pooled Client."""
+  session = pooled(key, factory)
+  c = pooled(("aio",) + tuple(key), lambda: Client(session))
+  if c.session is not session:
+    # the session was evicted and rebuilt since the client was made
+    discard(("aio",) + tuple(key))
+    c = pooled(("aio",) + tuple(key), lambda: Client(session))
+  return c
+
+async def map_limited(fn, items, limit: int):
+  """Await fn(item) for every item with at most `limit` running; results keep item order."""
+  sem = asyncio.Semaphore(max(1, limit))
+
+  async def one(item):
+    async with sem:
+      return await fn(item)
+
+  return await asyncio.gather(*(one(item) for item in items))
+
+async def as_ready(fn, items, limit: int, retries: int = 0):
+  """
+  Await fn(item) for every item with at most `limit` running, yielding
+  (item, result, error) in completion order. A failure is yielded, not
+  raised, so one bad item doesn't take the others down. With `retries`, a
+  failed item goes to the back of the queue and is tried up to that many
+  more times (after RETRY_DELAY) before its error is yielded.
+  """
+  sem = asyncio.Semaphore(max(1, limit))
+
+  async def one(item, attempt):
+    if attempt:
+      await asyncio.sleep(RETRY_DELAY * attempt)
+    async with sem:
+      try:
+        return item, attempt, await fn(item), None
+      except Exception as e:
+        return item, attempt, None, e
+
+  tasks = {asyncio.ensure_future(one(item, 0)) for item in items}
+  try:
+    while tasks:
+      done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+      for fut in done:
+        item, attempt, result, error = fut.result()
+        if error is not None and attempt < retries:
+          tasks.add(asyncio.ensure_future(one(item, attempt + 1)))
+          continue
+        yield item, result, error
+  finally:
+    for task in tasks:
+      task.cancel()
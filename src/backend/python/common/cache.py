@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", ".."))
+CACHE_DIR = os.environ.get("SCRAPER_CACHE_DIR") or os.path.join(ROOT, ".cache", "scraper")
+MAX_ENTRIES = int(os.environ.get("SCRAPER_CACHE_MAX_ENTRIES", "200000"))
+EVICT_EVERY = 256
+
+_conn = None
+_lock = threading.Lock()
+_puts = 0
+# (platform, submission id) -> last hit; a hit only reads, and the next
+# write records these before it evicts anything
+_touched = {}
+
+def _connect():
+  global _conn
+  if _conn is None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(CACHE_DIR, "details.db"), timeout=10, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS details (
+        platform TEXT NOT NULL,
+        submission_id TEXT NOT NULL,
+        subtask_scores TEXT NOT NULL,
+        total_score REAL NOT NULL,
+        time TEXT,
+        problem TEXT,
+        used REAL NOT NULL,
+        PRIMARY KEY (platform, submission_id)
+      )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS details_used ON details (used)")
+    _conn = conn
+  return _conn
+
+def _flush_touched(conn):
+  if _touched:
+    conn.executemany(
+      "UPDATE details SET used = ? WHERE platform = ? AND submission_id = ?",
+      [(used, platform, sub_id) for (platform, sub_id), used in _touched.items()]
+    )
+    _touched.clear()
+
+def _evict(conn):
+  n = conn.execute("SELECT COUNT(*) FROM details").fetchone()[0]
+  if n > MAX_ENTRIES:
+    # drop the least recently used rows, leaving some headroom
+    conn.execute(
+      "DELETE FROM details WHERE rowid IN (SELECT rowid FROM details ORDER BY used LIMIT ?)",
+      (n - MAX_ENTRIES * 9 // 10,)
+    )
+
+class DetailCache:
+  """
+  Parsed results of graded submissions, keyed by (platform, submission id).
+  A graded submission never changes, so only final results may be stored;
+  callers must not put pending or judging ones. Both calls block on SQLite,
+  so async code makes them through aio.off_loop.
+  """
+
+  def __init__(self, platform: str):
+    self.platform = platform
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, sub_id):
+    try:
+      with _lock:
+        conn = _connect()
+        row = conn.execute(
+          "SELECT subtask_scores, total_score, time, problem FROM details WHERE platform = ? AND submission_id = ?",
+          (self.platform, str(sub_id))
+        ).fetchone()
+        if row is not None:
+          _touched[(self.platform, str(sub_id))] = time.time()
+    except sqlite3.Error:
+      row = None
+    with _lock:
+      if row is None:
+        self.misses += 1
+      else:
+        self.hits += 1
+    if row is None:
+      return None
+    return {
+      "subtask_scores": json.loads(row[0]),
+      "total_score": row[1],
+      "time": row[2],
+      "problem": row[3],
+    }
+
+  def put(self, sub_id, subtask_scores, total_score, time_=None, problem=None):
+    global _puts
+    try:
+      with _lock:
+        conn = _connect()
+        conn.execute(
+          "INSERT OR REPLACE INTO details VALUES (?, ?, ?, ?, ?, ?, ?)",
+          (self.platform, str(sub_id), json.dumps(subtask_scores), float(total_score),
+           time_, None if problem is None else str(problem), time.time())
+        )
+        _puts += 1
+        _flush_touched(conn)
+        if _puts % EVICT_EVERY == 0:
+          _evict(conn)
+        conn.commit()
+    except sqlite3.Error:
+      pass
+
+  def stats(self):
+    total = self.hits + self.misses
+    return {
+      "hits": self.hits,
+      "misses": self.misses,
+      "hitRate": round(self.hits / total, 4) if total else None,
+    }
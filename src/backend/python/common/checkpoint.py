@@ -0,0 +1,77 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from common.cache import CACHE_DIR
+
+# a checkpoint nobody resumed within this long is dropped
+TTL = float(os.environ.get("SCRAPER_CHECKPOINT_TTL", str(7 * 24 * 3600)))
+
+_local = threading.local()
+
+def _conn():
+  c = getattr(_local, "conn", None)
+  if c is None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    c = sqlite3.connect(os.path.join(CACHE_DIR, "checkpoints.db"), timeout=30, isolation_level=None)
+    c.execute("PRAGMA journal_mode=WAL")
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS checkpoints (
+        key TEXT PRIMARY KEY,
+        state TEXT NOT NULL,
+        updated REAL NOT NULL
+      )
+    """)
+    _local.conn = c
+  return c
+
+class Checkpoint:
+  """
+  Progress of one long fetch, so a re-run of the same job after a failure
+  continues where it stopped instead of starting over. `state` is a plain
+  JSON-able dict the fetcher fills in (how far the listing got, the rows it
+  found) and save()s as it goes; clear() it once the job has fully
+  succeeded. Submission details need no checkpoint of their own, since the
+  graded ones are already in the DetailCache.
+
+  `key` is anything JSON-able that identifies the job, e.g. (username,
+  startedAt, endedAt). Pass key=None for a job that can't be resumed; the
+  checkpoint then only lives in memory.
+  """
+
+  def __init__(self, job: str, key):
+    self.key = None if key is None else job + "/" + hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+    self.state = {}
+    if self.key is not None:
+      try:
+        row = _conn().execute(
+          "SELECT state FROM checkpoints WHERE key = ? AND updated > ?", (self.key, time.time() - TTL)
+        ).fetchone()
+        if row is not None:
+          self.state = json.loads(row[0])
+      except (sqlite3.Error, ValueError):
+        pass
+    self.resumed = bool(self.state)
+
+  def save(self):
+    if self.key is None:
+      return
+    try:
+      c = _conn()
+      now = time.time()
+      c.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)", (self.key, json.dumps(self.state), now))
+      c.execute("DELETE FROM checkpoints WHERE updated < ?", (now - TTL,))
+    except sqlite3.Error:
+      pass
+
+  def clear(self):
+    self.state = {}
+    if self.key is None:
+      return
+    try:
+      _conn().execute("DELETE FROM checkpoints WHERE key = ?", (self.key,))
+    except sqlite3.Error:
+      pass
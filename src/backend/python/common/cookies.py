@@ -0,0 +1,144 @@
+import os
+import time
+import sqlite3
+import weakref
+import threading
+import http.cookiejar
+
+from common.cache import CACHE_DIR
+
+# Cloudflare clearance outlives a single run, and solving the challenge again
+# is the slowest step of a cold start. Clearance cookies are shared by every
+# account on a platform but kept per User-Agent, since Cloudflare ties
+# cf_clearance to the one it was issued to; scrapers that want to reuse them
+# have to send a fixed User-Agent. Login sessions are stored per account.
+CLEARANCE_PREFIXES = ("cf_", "__cf", "_cf")
+# how long a cookie without an expiry of its own is trusted for, seconds
+SESSION_TTL = float(os.environ.get("SCRAPER_COOKIE_TTL", str(30 * 24 * 3600)))
+
+_local = threading.local()
+_lock = threading.Lock()
+_bound = weakref.WeakKeyDictionary()
+
+def _conn():
+  c = getattr(_local, "conn", None)
+  if c is None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    c = sqlite3.connect(os.path.join(CACHE_DIR, "cookies.db"), timeout=30, isolation_level=None)
+    c.execute("PRAGMA journal_mode=WAL")
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS cookies (
+        platform TEXT NOT NULL,
+        account TEXT NOT NULL,
+        agent TEXT NOT NULL,
+        name TEXT NOT NULL,
+        value TEXT NOT NULL,
+        domain TEXT NOT NULL,
+        path TEXT NOT NULL,
+        expires REAL,
+        updated REAL NOT NULL,
+        PRIMARY KEY (platform, account, agent, name, domain, path)
+      )
+    """)
+    _local.conn = c
+  return c
+
+def _live(now: float) -> str:
+  return f"(expires IS NULL AND updated > {now - SESSION_TTL}) OR expires > {now}"
+
+def is_clearance(name: str) -> bool:
+  return name.startswith(CLEARANCE_PREFIXES)
+
+def _clearance(session) -> tuple:
+  return tuple(sorted(
+    (c.name, c.value or "", c.domain, c.path, c.expires)
+    for c in session.cookies if is_clearance(c.name)
+  ))
+
+def attach(session, platform: str):
+  """
+  Seed `session` with the clearance cookies stored for `platform` and the
+  session's User-Agent, and keep the store up to date from then on (see sync()).
+  Call it after the scraper's own header setup.
+  """
+  agent = session.headers.get("User-Agent", "")
+  try:
+    rows = _conn().execute(
+      "SELECT name, value, domain, path, expires FROM cookies "
+      f"WHERE platform = ? AND account = '' AND agent = ? AND ({_live(time.time())})",
+      (platform, agent)
+    ).fetchall()
+  except sqlite3.Error:
+    rows = []
+  for name, value, domain, path, expires in rows:
+    session.cookies.set_cookie(http.cookiejar.Cookie(
+      0, name, value, None, False, domain, True, domain.startswith("."), path, True,
+      False, None if expires is None else int(expires), expires is None, None, None, {},
+    ))
+  with _lock:
+    _bound[session] = [platform, _clearance(session)]
+
+def sync(session):
+  """
+  Store the clearance cookies of an attached session if they changed since
+  the last call. Cheap enough to run after every response.
+  """
+  with _lock:
+    binding = _bound.get(session)
+    if binding is None:
+      return
+    current = _clearance(session)
+    if current == binding[1]:
+      return
+    binding[1] = current
+  platform = binding[0]
+  agent = session.headers.get("User-Agent", "")
+  now = time.time()
+  try:
+    c = _conn()
+    # replace the whole set in one transaction, so concurrent processes never
+    # leave a mix of two clearances behind
+    c.execute("BEGIN IMMEDIATE")
+    try:
+      c.execute("DELETE FROM cookies WHERE platform = ? AND account = '' AND agent = ?", (platform, agent))
+      c.executemany(
+        "INSERT OR REPLACE INTO cookies VALUES (?, '', ?, ?, ?, ?, ?, ?, ?)",
+        [(platform, agent, name, value, domain, path, expires, now) for name, value, domain, path, expires in current]
+      )
+      c.execute("COMMIT")
+    except BaseException:
+      c.execute("ROLLBACK")
+      raise
+  except sqlite3.Error:
+    pass
+
+def remember(platform: str, account: str, name: str, value: str, domain: str = "", path: str = "/", expires: float | None = None):
+  """Store a login cookie for `account`, e.g. a fresh UOJSESSID after logging in."""
+  try:
+    _conn().execute(
+      "INSERT OR REPLACE INTO cookies VALUES (?, ?, '', ?, ?, ?, ?, ?, ?)",
+      (platform, account, name, value, domain, path, expires, time.time())
+    )
+  except sqlite3.Error:
+    pass
+
+def recall(platform: str, account: str, name: str) -> str | None:
+  """The newest unexpired login cookie `name` stored for `account`, if any."""
+  try:
+    row = _conn().execute(
+      f"SELECT value FROM cookies WHERE platform = ? AND account = ? AND name = ? AND ({_live(time.time())}) "
+      "ORDER BY updated DESC LIMIT 1",
+      (platform, account, name)
+    ).fetchone()
+  except sqlite3.Error:
+    return None
+  return row[0] if row else None
+
+def forget(platform: str, account: str, name: str):
+  try:
+    _conn().execute(
+      "DELETE FROM cookies WHERE platform = ? AND account = ? AND name = ?",
+      (platform, account, name)
+    )
+  except sqlite3.Error:
+    pass
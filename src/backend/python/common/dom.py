@@ -0,0 +1,71 @@
+import os
+import importlib.util
+
+from bs4 import BeautifulSoup
+
+from common import metrics
+
+def _available(module: str) -> bool:
+  try:
+    return importlib.util.find_spec(module) is not None
+  except ModuleNotFoundError:
+    return False
+
+# fastest installed backend first; SCRAPER_HTML_BACKEND forces one
+BACKENDS = [b for b, mod in (("selectolax", "selectolax.lexbor"), ("lxml", "lxml"), ("html.parser", "html")) if _available(mod)]
+BACKEND = os.environ.get("SCRAPER_HTML_BACKEND") or BACKENDS[0]
+
+class LaxNode:
+  """
+  Wraps a selectolax node in the small slice of the bs4 Tag interface the
+  scrapers use: select, select_one, get_text, get and item access.
+  """
+  __slots__ = ("node",)
+
+  def __init__(self, node):
+    self.node = node
+
+  def select(self, css: str):
+    return [LaxNode(n) for n in self.node.css(css)]
+
+  def select_one(self, css: str):
+    n = self.node.css_first(css)
+    return LaxNode(n) if n is not None else None
+
+  def get_text(self, separator: str = "", strip: bool = False) -> str:
+    return self.node.text(separator=separator, strip=strip)
+
+  def get(self, key: str, default=None):
+    v = self.node.attributes.get(key)
+    return default if v is None else v
+
+  def __getitem__(self, key: str):
+    v = self.node.attributes.get(key)
+    if v is None:
+      raise KeyError(key)
+    return v
+
+def fragment(html: str, tag: str) -> str:
+  """
+  Cut `html` down to the span from the first <tag> to the last </tag>, so a
+  listing page only parses its table instead of the whole layout around it.
+  """
+  i = html.find(f"<{tag}")
+  j = html.rfind(f"</{tag}>")
+  if i < 0 or j < i:
+    return html
+  return html[i:j + len(tag) + 3]
+
+def parse(html: str, only: str | None = None, backend: str | None = None):
+  """
+  Parse `html` (restricted to the `only` element when given) with the fastest
+  installed backend. Nodes support select, select_one, get_text, get and [].
+  """
+  backend = backend or BACKEND
+  if only:
+    html = fragment(html, only)
+  with metrics.parsing():
+    if backend == "selectolax":
+      from selectolax.lexbor import LexborHTMLParser
+      return LaxNode(LexborHTMLParser(html).root)
+    return BeautifulSoup(html, backend)
@@ -0,0 +1,154 @@
+import re
+
+from common import dom, metrics
+
+# Submission pages can carry thousands of test-case rows, but only a few
+# numbers are needed. Each extractor scans the raw HTML for the markers first
+# and builds a DOM only when that finds nothing (e.g. the markup changed).
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_NUM = r"([0-9]+(?:\.[0-9]+)?)"
+
+QOJ_HEADER_RE = re.compile(r"""<div\b[^>]*\bclass=["'][^"']*\bcard-header\b""")
+QOJ_BODY_RE = re.compile(r"""\bclass=["'][^"']*\bcard-body\b""")
+QOJ_TITLE_RE = re.compile(r"""<h3\b[^>]*\bclass=["'][^"']*\bcard-title\b[^>]*>(.*?)</h3>""", re.S)
+QOJ_SUBTASK_RE = re.compile(r"^\s*Subtask\b", re.I)
+QOJ_SCORE_RE = re.compile(r"(?i)score:\s*" + _NUM)
+QOJ_BADGE_RE = re.compile(r"""<a\b[^>]*\bclass=["'][^"']*\buoj-score\b[^>]*>""")
+QOJ_DATA_SCORE_RE = re.compile(r"""\bdata-score=["']([^"']*)["']""")
+QOJ_PROBLEM_LINK_RE = re.compile(r"""<a\b[^>]*\bhref=["']([^"']*/problem/[^"']*)["']""")
+QOJ_PROBLEM_ID_RE = re.compile(r"/problem/(\d+)")
+
+OJUZ_DIV_RE = re.compile(r"""\bid=["']subtask_results_div_\d+["']""")
+OJUZ_SPAN_RE = re.compile(r"""<span\b[^>]*\bclass=["'][^"']*subtask-score[^>]*>(.*?)</span>""", re.S)
+OJUZ_SCORE_RE = re.compile(_NUM + r"\s*/\s*" + _NUM)
+
+def _text(html: str) -> str:
+  return " ".join(_TAG_RE.sub(" ", html).split())
+
+def _num(val: float):
+  val = round(val, 2)
+  return int(val) if float(val).is_integer() else val
+
+def _qoj_problem_id(href: str | None) -> int | None:
+  m = QOJ_PROBLEM_ID_RE.search(href or "")
+  return int(m.group(1)) if m else None
+
+def _qoj_fast(html: str):
+  pid = None
+  m = QOJ_PROBLEM_LINK_RE.search(html)
+  if m:
+    pid = _qoj_problem_id(m.group(1))
+
+  # a header runs until the next header or the start of its card body
+  starts = [m.start() for m in QOJ_HEADER_RE.finditer(html)]
+  subtask_scores = []
+  for i, start in enumerate(starts):
+    end = starts[i + 1] if i + 1 < len(starts) else len(html)
+    body = QOJ_BODY_RE.search(html, start, end)
+    if body:
+      end = body.start()
+    header = html[start:end]
+    title = QOJ_TITLE_RE.search(header)
+    if not title or not QOJ_SUBTASK_RE.search(_text(title.group(1))):
+      continue
+    m = QOJ_SCORE_RE.search(_text(header))
+    subtask_scores.append(_num(float(m.group(1))) if m else 0)
+
+  if subtask_scores:
+    return pid, subtask_scores, _num(sum(float(x) for x in subtask_scores))
+
+  for badge in QOJ_BADGE_RE.finditer(html):
+    m = QOJ_DATA_SCORE_RE.search(badge.group(0))
+    if m and m.group(1):
+      try:
+        total = _num(float(m.group(1)))
+      except ValueError:
+        return None
+      return pid, [total], total
+  return None
+
+def _qoj_dom(html: str):
+  soup = dom.parse(html)
+
+  pid = None
+  a_prob = soup.select_one("a[href*='/problem/']")
+  if a_prob:
+    pid = _qoj_problem_id(a_prob["href"])
+
+  subtask_scores = []
+  total_score = 0.0
+
+  for hdr in soup.select("div.card-header"):
+    title_el = hdr.select_one("h3.card-title")
+    if not title_el:
+      continue
+    title_txt = title_el.get_text(" ", strip=True)
+    if not QOJ_SUBTASK_RE.search(title_txt):
+      continue
+
+    m = QOJ_SCORE_RE.search(hdr.get_text(" ", strip=True))
+    subtask_scores.append(_num(float(m.group(1))) if m else 0)
+
+  if subtask_scores:
+    total_score = _num(sum(float(x) for x in subtask_scores))
+  else:
+    score_badge = soup.select_one("a.uoj-score[data-score]")
+    if score_badge and score_badge.get("data-score"):
+      try:
+        total_score = _num(float(score_badge["data-score"]))
+        subtask_scores = [total_score]
+      except ValueError:
+        pass
+
+  return pid, subtask_scores, total_score
+
+def qoj_submission(html: str) -> dict:
+  """
+  Problem id, subtask scores and total from a qoj.ac submission page. Subtask
+  scores are empty until the submission is graded.
+  """
+  with metrics.parsing():
+    found = _qoj_fast(html) or _qoj_dom(html)
+  pid, subtask_scores, total_score = found
+  return {
+    "problem_id": pid,
+    "subtask_scores": subtask_scores,
+    "total_score": total_score,
+  }
+
+def _ojuz_score(span_html: str | None):
+  if span_html is None:
+    return None
+  m = OJUZ_SCORE_RE.search(_text(span_html))
+  return _num(float(m.group(1))) if m else None
+
+def _ojuz_fast(html: str):
+  starts = [m.start() for m in OJUZ_DIV_RE.finditer(html)]
+  scores = []
+  for i, start in enumerate(starts):
+    end = starts[i + 1] if i + 1 < len(starts) else len(html)
+    span = OJUZ_SPAN_RE.search(html, start, end)
+    scores.append(_ojuz_score(span.group(1) if span else None))
+  return scores or None
+
+def _ojuz_dom(html: str):
+  soup = dom.parse(html)
+  scores = []
+  for d in soup.select("div[id^='subtask_results_div_']"):
+    span = d.select_one("span[class*='subtask-score']")
+    scores.append(_ojuz_score(span.get_text() if span else None))
+  return scores
+
+def ojuz_submission(html: str) -> dict:
+  """
+  Subtask scores and total from an oj.uz submission page. `graded` is False
+  while any subtask is still missing its "x / y" score.
+  """
+  with metrics.parsing():
+    scores = _ojuz_fast(html) or _ojuz_dom(html)
+  return {
+    "subtask_scores": [0 if s is None else s for s in scores],
+    "total_score": float(sum(s for s in scores if s is not None)),
+    "graded": bool(scores) and None not in scores,
+  }
@@ -0,0 +1,32 @@
+import os
+import asyncio
+from collections import deque
+
+LISTING_CONCURRENCY = int(os.environ.get("SCRAPER_LISTING_CONCURRENCY", "4"))
+
+async def fetch_pages(fetch, pages, concurrency: int = LISTING_CONCURRENCY):
+  """
+  Await fetch(page) for every page with up to `concurrency` requests in flight,
+  yielding (page, result) strictly in page order. Pages are started lazily,
+  so a consumer that stops early only wastes the ones already in flight; wrap
+  the iteration in contextlib.aclosing to cancel those right away.
+  """
+  pages = iter(pages)
+  window = deque()
+  try:
+    for page in pages:
+      window.append((page, asyncio.ensure_future(fetch(page))))
+      if len(window) >= concurrency:
+        break
+    while window:
+      page, task = window[0]
+      result = await task
+      window.popleft()
+      yield page, result
+      # only top up once the consumer asks for more
+      nxt = next(pages, None)
+      if nxt is not None:
+        window.append((nxt, asyncio.ensure_future(fetch(nxt))))
+  finally:
+    for _, task in window:
+      task.cancel()
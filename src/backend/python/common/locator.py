@@ -0,0 +1,154 @@
+import os
+import time
+import sqlite3
+import itertools
+import threading
+from datetime import datetime
+
+from common import aio
+from common.cache import CACHE_DIR
+from common.listing import fetch_pages
+
+# cached page ranges older than this are dropped
+INDEX_TTL = float(os.environ.get("SCRAPER_PAGE_INDEX_TTL", str(30 * 24 * 3600)))
+
+_local = threading.local()
+
+def _conn():
+  c = getattr(_local, "conn", None)
+  if c is None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    c = sqlite3.connect(os.path.join(CACHE_DIR, "listing.db"), timeout=30, isolation_level=None)
+    c.execute("PRAGMA journal_mode=WAL")
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS pages (
+        platform TEXT NOT NULL,
+        user TEXT NOT NULL,
+        page INTEGER NOT NULL,
+        first_time REAL NOT NULL,
+        last_time REAL NOT NULL,
+        fetched REAL NOT NULL,
+        PRIMARY KEY (platform, user, page)
+      )
+    """)
+    _local.conn = c
+  return c
+
+class PageLocator:
+  """
+  Finds the pages of a newest-first submission listing that overlap a time
+  window, without knowing the page count and without walking every newer
+  page: it gallops forward, then bisects on the oldest row of each page.
+
+  What each page held is remembered per user in CACHE_DIR. New submissions
+  only push rows to later pages, so a page that was entirely newer than the
+  window then still bounds the search from below; the next lookup for the
+  same window starts there and gallops over however far the listing moved.
+
+  `fetch(page)` returns the page's rows, newest first; `row_time(row)` their
+  UTC datetime and `row_id(row)` a unique id. Out-of-range pages may come
+  back empty or as a repeat of the last page.
+  """
+
+  def __init__(self, platform: str, user: str, fetch, row_time, row_id):
+    self.platform = platform
+    self.user = user
+    self.fetch = fetch
+    self.row_time = row_time
+    self.row_id = row_id
+    self._pages = {}
+    self._first_ids = {}
+    self.probes = 0
+
+  async def page(self, n: int) -> list:
+    if n not in self._pages:
+      rows = await self.fetch(n) or []
+      self._pages[n] = rows
+      self.probes += 1
+      if rows:
+        first = self.row_id(rows[0])
+        self._first_ids[first] = min(n, self._first_ids.get(first, n))
+    return self._pages[n]
+
+  def _past_end(self, n: int, rows: list) -> bool:
+    return not rows or self._first_ids.get(self.row_id(rows[0]), n) < n
+
+  async def _reaches(self, n: int, until: datetime) -> bool:
+    """Whether page n holds a row at or before `until`, or lies past the end."""
+    rows = await self.page(n)
+    return self._past_end(n, rows) or self.row_time(rows[-1]) <= until
+
+  def _floor(self, until: datetime) -> int:
+    """The first page that can still hold a row at or before `until`, going by the cache."""
+    try:
+      row = _conn().execute(
+        "SELECT MAX(page) FROM pages WHERE platform = ? AND user = ? AND last_time > ?",
+        (self.platform, self.user, until.timestamp())
+      ).fetchone()
+    except sqlite3.Error:
+      return 1
+    return row[0] + 1 if row and row[0] else 1
+
+  async def locate(self, until: datetime) -> int:
+    """The first page holding a row at or before `until`."""
+    floor = await aio.off_loop(self._floor, until)
+    # a stale index (deleted submissions) could put the floor too far out
+    if floor > 1 and await self._reaches(floor - 1, until):
+      await aio.off_loop(self.forget)
+      floor = 1
+    newer, probe, step = floor - 1, floor, 1
+    while not await self._reaches(probe, until):
+      newer, probe, step = probe, probe + step, step * 2
+    reached = probe
+    while reached - newer > 1:
+      mid = (newer + reached) // 2
+      if await self._reaches(mid, until):
+        reached = mid
+      else:
+        newer = mid
+    return reached
+
+  async def walk(self, since: datetime, until: datetime):
+    """Yield (page, rows) for every page overlapping [since, until], in order."""
+    first = await self.locate(until)
+    # one page at a time: only the rows on a page tell whether the next one
+    # is still inside the window
+    listing = fetch_pages(self.page, itertools.count(first), concurrency=1)
+    try:
+      async for n, rows in listing:
+        if self._past_end(n, rows):
+          break
+        yield n, rows
+        if self.row_time(rows[-1]) < since:
+          break
+    finally:
+      await listing.aclose()
+      await aio.off_loop(self.save)
+
+  def save(self):
+    now = time.time()
+    rows = [
+      (self.platform, self.user, n, self.row_time(r[0]).timestamp(), self.row_time(r[-1]).timestamp(), now)
+      for n, r in self._pages.items() if not self._past_end(n, r)
+    ]
+    try:
+      c = _conn()
+      c.execute("BEGIN IMMEDIATE")
+      try:
+        c.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)", rows)
+        c.execute("DELETE FROM pages WHERE fetched < ?", (now - INDEX_TTL,))
+        c.execute("COMMIT")
+      except BaseException:
+        c.execute("ROLLBACK")
+        raise
+    except sqlite3.Error:
+      pass
+
+  def forget(self):
+    try:
+      _conn().execute("DELETE FROM pages WHERE platform = ? AND user = ?", (self.platform, self.user))
+    except sqlite3.Error:
+      pass
+
+  def stats(self) -> dict:
+    return {"pages": self.probes}
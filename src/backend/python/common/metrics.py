@@ -0,0 +1,192 @@
+import os
+import re
+import sys
+import json
+import time
+import functools
+import contextvars
+from contextlib import contextmanager
+from collections import Counter
+from urllib.parse import urlsplit
+
+# SCRAPER_METRICS=1 adds a "metrics" object to every script's JSON output,
+# SCRAPER_METRICS=stderr writes it as one {"metrics": ...} line on stderr
+# instead. Recording is a few counter updates per request and parse.
+MODE = os.environ.get("SCRAPER_METRICS", "")
+ENABLED = MODE not in ("", "0")
+
+_DIGIT_RE = re.compile(r"\d")
+
+_current = contextvars.ContextVar("scraper_metrics", default=None)
+_stage = contextvars.ContextVar("scraper_stage", default=None)
+
+def endpoint(url: str) -> str:
+  """`url` with ids collapsed, e.g. qoj.ac/submission/*, so requests group by kind."""
+  parts = urlsplit(url)
+  host = parts.hostname or ""
+  if host.startswith("www."):
+    host = host[4:]
+  segs = [s for s in parts.path.split("/") if s]
+  segs = ["*" if i >= 2 or _DIGIT_RE.search(s) else s for i, s in enumerate(segs)]
+  return host + "/" + "/".join(segs)
+
+def _stage_stats():
+  return {"calls": 0, "seconds": 0.0, "requests": 0, "network": 0.0, "parse": 0.0}
+
+class Metrics:
+  """Counters for one job; see report() for what is collected."""
+
+  def __init__(self):
+    self.started = time.perf_counter()
+    self.endpoints = {}
+    self.statuses = Counter()
+    self.retries = 0
+    self.sleep = 0.0
+    self.network = 0.0
+    self.parse = 0.0
+    self.stages = {}
+    self._parsing = 0
+
+  def _stage(self):
+    name = _stage.get()
+    if name is None:
+      return None
+    st = self.stages.get(name)
+    if st is None:
+      st = self.stages[name] = _stage_stats()
+    return st
+
+  def request(self, url: str, r, seconds: float):
+    ep = self.endpoints.get(endpoint(url))
+    if ep is None:
+      ep = self.endpoints[endpoint(url)] = {"count": 0, "bytes": 0, "seconds": 0.0}
+    ep["count"] += 1
+    ep["bytes"] += len(getattr(r, "content", b"") or b"")
+    ep["seconds"] += seconds
+    self.statuses[str(r.status_code)] += 1
+    self.network += seconds
+    st = self._stage()
+    if st is not None:
+      st["requests"] += 1
+      st["network"] += seconds
+
+  def report(self) -> dict:
+    r2 = lambda x: round(x, 4)
+    return {
+      "seconds": r2(time.perf_counter() - self.started),
+      "requests": sum(ep["count"] for ep in self.endpoints.values()),
+      "bytes": sum(ep["bytes"] for ep in self.endpoints.values()),
+      "statuses": dict(self.statuses),
+      "retries": self.retries,
+      "sleep": r2(self.sleep),
+      "network": r2(self.network),
+      "parse": r2(self.parse),
+      "endpoints": {k: dict(v, seconds=r2(v["seconds"])) for k, v in sorted(self.endpoints.items())},
+      "stages": {k: {n: r2(v) if isinstance(v, float) else v for n, v in st.items()} for k, st in self.stages.items()},
+    }
+
+  def attach(self, out):
+    report = self.report()
+    if MODE == "stderr" or not isinstance(out, dict):
+      sys.stderr.write(json.dumps({"metrics": report}) + "\n")
+      sys.stderr.flush()
+    else:
+      out["metrics"] = report
+    return out
+
+def current() -> Metrics | None:
+  return _current.get()
+
+def request(url: str, r, seconds: float):
+  m = _current.get()
+  if m is not None:
+    m.request(url, r, seconds)
+
+def retry():
+  m = _current.get()
+  if m is not None:
+    m.retries += 1
+
+def slept(seconds: float):
+  m = _current.get()
+  if m is not None:
+    m.sleep += seconds
+
+@contextmanager
+def stage(name: str):
+  """Attribute the requests and parsing inside the block to stage `name`."""
+  m = _current.get()
+  if m is None:
+    yield
+    return
+  token = _stage.set(name)
+  start = time.perf_counter()
+  try:
+    yield
+  finally:
+    _stage.reset(token)
+    st = m.stages.get(name)
+    if st is None:
+      st = m.stages[name] = _stage_stats()
+    st["calls"] += 1
+    st["seconds"] += time.perf_counter() - start
+
+def staged(name: str):
+  """Decorator form of stage() for coroutine functions."""
+  def deco(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+      with stage(name):
+        return await fn(*args, **kwargs)
+    return wrapper
+  return deco
+
+@contextmanager
+def parsing():
+  """Time a parse; nested parses (a DOM fallback inside an extractor) count once."""
+  m = _current.get()
+  if m is None or m._parsing:
+    yield
+    return
+  m._parsing += 1
+  start = time.perf_counter()
+  try:
+    yield
+  finally:
+    m._parsing -= 1
+    took = time.perf_counter() - start
+    m.parse += took
+    st = m._stage()
+    if st is not None:
+      st["parse"] += took
+
+async def bound(m: Metrics | None, coro):
+  """Await `coro` with `m` as the current metrics (for code run on the aio loop)."""
+  if m is None:
+    return await coro
+  token = _current.set(m)
+  try:
+    return await coro
+  finally:
+    _current.reset(token)
+
+def instrument(fn):
+  """
+  Wrap a script's run(): when metrics are enabled each call collects its own
+  Metrics and attaches the report to the result (or writes it to stderr).
+  """
+  @functools.wraps(fn)
+  def wrapper(*args, **kwargs):
+    if not ENABLED:
+      return fn(*args, **kwargs)
+    m = Metrics()
+    token = _current.set(m)
+    try:
+      out = fn(*args, **kwargs)
+    except Exception:
+      m.attach(None)
+      raise
+    finally:
+      _current.reset(token)
+    return m.attach(out)
+  return wrapper
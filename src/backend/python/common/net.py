@@ -0,0 +1,71 @@
+import os
+import time
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
+
+from common import metrics, cookies
+from common.ratelimit import host_of, acquire, penalize
+
+RETRY_STATUSES = (429, 503)
+
+# send a site's requests elsewhere, e.g. to the stand-ins in bench/standin.py:
+# SCRAPER_BASE_URLS="oj.uz=http://127.0.0.1:8001,..."; rate limits stay keyed
+# by the real host
+BASE_URLS = {}
+for _spec in filter(None, os.environ.get("SCRAPER_BASE_URLS", "").split(",")):
+  _host, _, _base = _spec.partition("=")
+  BASE_URLS[_host.strip()] = _base.strip().rstrip("/")
+
+def rebase(url: str) -> str:
+  base = BASE_URLS.get(host_of(url)) if BASE_URLS else None
+  if base is None:
+    return url
+  parts = urlsplit(url)
+  return base + parts.path + (f"?{parts.query}" if parts.query else "")
+
+def retry_after(r) -> float | None:
+  value = r.headers.get("Retry-After")
+  if not value:
+    return None
+  try:
+    return max(0.0, float(value))
+  except ValueError:
+    pass
+  try:
+    return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+  except Exception:
+    return None
+
+def request(session, method: str, url: str, max_attempts: int = 7, **kwargs):
+  """
+  Send a request through the shared per-host rate limiter.
+  429s (and 503s carrying Retry-After) are retried, waiting for Retry-After
+  when given and backing off exponentially otherwise; the wait applies to
+  every process talking to that host. Returns the last response.
+  """
+  host = host_of(url)
+  backoff = 2.0
+  for attempt in range(max_attempts):
+    acquire(host)
+    if attempt:
+      metrics.retry()
+    start = time.perf_counter()
+    r = session.request(method, rebase(url), **kwargs)
+    metrics.request(url, r, time.perf_counter() - start)
+    cookies.sync(session)
+    if r.status_code not in RETRY_STATUSES or attempt == max_attempts - 1:
+      return r
+    delay = retry_after(r)
+    if delay is None:
+      if r.status_code != 429:
+        return r
+      delay = backoff
+      backoff *= 1.5
+    penalize(host, delay)
+  return r
+
+def get(session, url: str, **kwargs):
+  return request(session, "GET", url, **kwargs)
+
+def post(session, url: str, **kwargs):
+  return request(session, "POST", url, **kwargs)
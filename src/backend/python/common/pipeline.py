@@ -0,0 +1,75 @@
+import os
+import asyncio
+
+from common import aio
+
+# rows the listing may run ahead of the detail workers, per worker
+QUEUE_PER_WORKER = int(os.environ.get("SCRAPER_PIPELINE_QUEUE", "4"))
+
+_DONE = object()
+
+async def pipelined(produce, consume, workers: int, retries: int = 0, maxsize: int | None = None):
+  """
+  Run a listing and its detail fetches as one pipeline: every row the async
+  iterator `produce` yields goes into a bounded queue that `workers` tasks
+  drain with consume(row), so details start while later listing pages are
+  still loading. When the queue is full the producer waits, so a listing
+  that outruns the details doesn't pile up rows.
+
+  Yields (row, result, error) in completion order, like aio.as_ready; a
+  failed row is retried up to `retries` more times first. If `produce`
+  itself fails, the rows it did yield are still consumed and its error comes
+  last as (None, None, error).
+  """
+  workers = max(1, workers)
+  queue = asyncio.Queue(maxsize or workers * QUEUE_PER_WORKER)
+  results = asyncio.Queue(workers * QUEUE_PER_WORKER)
+
+  async def producer():
+    error = None
+    try:
+      async for row in produce:
+        await queue.put(row)
+    except Exception as e:
+      error = e
+    for _ in range(workers):
+      await queue.put(_DONE)
+    return error
+
+  async def worker():
+    while True:
+      row = await queue.get()
+      if row is _DONE:
+        await results.put(_DONE)
+        return
+      for attempt in range(retries + 1):
+        if attempt:
+          await asyncio.sleep(aio.RETRY_DELAY * attempt)
+        try:
+          out = (row, await consume(row), None)
+          break
+        except Exception as e:
+          out = (row, None, e)
+      await results.put(out)
+
+  feeding = asyncio.ensure_future(producer())
+  tasks = [asyncio.ensure_future(worker()) for _ in range(workers)]
+  try:
+    running = workers
+    while running:
+      item = await results.get()
+      if item is _DONE:
+        running -= 1
+      else:
+        yield item
+    error = await feeding
+    if error is not None:
+      yield None, None, error
+  finally:
+    for task in [feeding, *tasks]:
+      task.cancel()
+    await asyncio.gather(feeding, *tasks, return_exceptions=True)
+    # a consumer that stopped early leaves the listing open, with pages in flight
+    aclose = getattr(produce, "aclose", None)
+    if aclose is not None:
+      await aclose()
@@ -0,0 +1,82 @@
+from common.aggregate import BestScores
+
+class SaturationPlanner:
+  """
+  Decides which submission details a problem-score sync still needs.
+  Scores merge element-wise per problem, so once a problem's merged vector
+  reaches the problem's maximum no submission can raise it, and a
+  submission whose listing score is 0 can't raise any subtask.
+
+  Maxima differ per problem and are only known once something shows them:
+  a listing row carrying one under `max_key`, or an observed submission the
+  listing marks as fully accepted. A problem whose maximum is unknown is
+  never treated as saturated.
+
+  Rows are listing dicts; `problem_key` names the problem field and
+  `score_key` the listing score (None when the listing doesn't show one).
+  Pass the sync's own BestScores as `best` so that the plan and the result
+  share one set of records, and maxima learned by an earlier sync as
+  `maxima`.
+  """
+
+  def __init__(self, problem_key: str, score_key: str = "score", max_key: str = "max",
+               best: BestScores | None = None, maxima: dict | None = None):
+    self.problem_key = problem_key
+    self.score_key = score_key
+    self.max_key = max_key
+    self.best = best if best is not None else BestScores()
+    self.maxima = dict(maxima or {})
+    self.pruned = 0
+
+  def learn(self, problem, maximum):
+    if maximum is not None and maximum > self.maxima.get(problem, 0.0):
+      self.maxima[problem] = float(maximum)
+
+  def observe(self, problem, subtask_scores, time=None, full: bool = False):
+    """Fold a graded submission; `full` if it is known to score the maximum."""
+    self.best.fold(problem, subtask_scores, time)
+    if full:
+      self.learn(problem, sum(subtask_scores or []))
+
+  def total(self, problem) -> float:
+    return self.best.total(problem)
+
+  def saturated(self, problem) -> bool:
+    maximum = self.maxima.get(problem)
+    return maximum is not None and self.total(problem) >= maximum - 1e-9
+
+  def useful(self, rows):
+    """The rows that could still raise their problem's score."""
+    for row in rows:
+      self.learn(row[self.problem_key], row.get(self.max_key))
+    out = []
+    for row in rows:
+      score = row.get(self.score_key)
+      if self.saturated(row[self.problem_key]) or (score is not None and score <= 0):
+        self.pruned += 1
+      else:
+        out.append(row)
+    return out
+
+  def split(self, rows):
+    """
+    Split `rows` into two waves: the most promising row of each unsaturated
+    problem (least solved problems first), then the rest, which should go
+    through useful() again once the first wave has been observed.
+    """
+    first = {}
+    rest = []
+    for row in self.useful(rows):
+      problem = row[self.problem_key]
+      cur = first.get(problem)
+      if cur is None:
+        first[problem] = row
+        continue
+      score = row.get(self.score_key)
+      if score is not None and score > (cur.get(self.score_key) or 0):
+        first[problem] = row
+        rest.append(cur)
+      else:
+        rest.append(row)
+    wave = sorted(first.values(), key=lambda row: self.total(row[self.problem_key]))
+    return wave, rest
@@ -0,0 +1,132 @@
+import os
+import re
+import json
+import threading
+from collections import OrderedDict
+
+from common.cache import CACHE_DIR
+
+# Problem-score jobs need every tracked problem's link on one platform. Rather
+# than the whole problem list, the bridge sends a versioned index once:
+#   "problemIndex": {"version": "...", "entries": [[problemId, url], ...]}
+# later jobs send only {"version": "..."}, or a delta against an index this
+# process already has:
+#   {"version": "...", "base": "...", "add": [[problemId, url], ...], "remove": [url, ...]}
+# Indexes stay resident in the worker and are written under CACHE_DIR, so
+# one-shot runs can use them too. A job that still sends "problems" works as
+# before.
+UNKNOWN = "Unknown problem index"
+MAX_RESIDENT = 8
+
+INDEX_DIR = os.path.join(CACHE_DIR, "problem-index")
+VERSION_RE = re.compile(r"[0-9A-Za-z_-]{1,64}")
+
+_resident = OrderedDict()
+_lock = threading.Lock()
+
+class ProblemIndex:
+  """
+  One platform's tracked problems: `urls` maps link -> problem id and
+  `problems` maps the platform's own problem key -> {"id", "link"}.
+  Shared between jobs, so treat both as read-only.
+  """
+
+  def __init__(self, version: str | None, urls: dict, key):
+    self.version = version
+    self.urls = urls
+    self.problems = {}
+    for url, problem_id in urls.items():
+      k = key(url) if url else None
+      if k is not None:
+        self.problems[k] = {"id": problem_id, "link": url}
+
+def _path(platform: str, version: str) -> str:
+  return os.path.join(INDEX_DIR, f"{platform.replace('.', '_')}-{version}.json")
+
+def _store(platform: str, version: str, urls: dict):
+  try:
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    path = _path(platform, version)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+      json.dump(urls, f, separators=(",", ":"))
+    os.replace(tmp, path)
+    # keep the newest few versions per platform
+    prefix = platform.replace(".", "_") + "-"
+    old = sorted(
+      (e for e in os.scandir(INDEX_DIR) if e.name.startswith(prefix) and e.name.endswith(".json")),
+      key=lambda e: e.stat().st_mtime, reverse=True,
+    )[MAX_RESIDENT:]
+    for e in old:
+      os.unlink(e.path)
+  except OSError:
+    pass
+
+def _stored(platform: str, version: str) -> dict | None:
+  try:
+    with open(_path(platform, version)) as f:
+      return json.load(f)
+  except (OSError, ValueError):
+    return None
+
+def _urls(platform: str, version: str) -> dict | None:
+  with _lock:
+    idx = _resident.get((platform, version))
+    if idx is not None:
+      _resident.move_to_end((platform, version))
+      return idx.urls
+  return _stored(platform, version)
+
+def _keep(platform: str, idx: ProblemIndex) -> ProblemIndex:
+  with _lock:
+    _resident[(platform, idx.version)] = idx
+    _resident.move_to_end((platform, idx.version))
+    while len(_resident) > MAX_RESIDENT:
+      _resident.popitem(last=False)
+  return idx
+
+def resolve(data: dict, platform: str, key) -> ProblemIndex:
+  """
+  The problem index for a job on `platform` (a ProblemLink platform, e.g.
+  "qoj.ac"); `key(url)` turns a link into the platform's problem key, or None
+  for links it can't use. Raises UNKNOWN when the job names an index this
+  process doesn't have, so the bridge can send it in full.
+  """
+  spec = data.get("problemIndex")
+  if spec is None:
+    urls = {}
+    for p in data.get("problems") or []:
+      for entry in p.get("problemLinks", []):
+        if entry.get("platform") == platform:
+          urls[entry.get("url")] = p.get("id")
+          break
+    return ProblemIndex(None, urls, key)
+
+  version = str(spec.get("version"))
+  if not VERSION_RE.fullmatch(version) or not VERSION_RE.fullmatch(str(spec.get("base", version))):
+    raise Exception(f"Bad problem index version {version}")
+  with _lock:
+    idx = _resident.get((platform, version))
+    if idx is not None:
+      _resident.move_to_end((platform, version))
+      return idx
+
+  if "entries" in spec:
+    urls = {url: problem_id for problem_id, url in spec["entries"]}
+  elif "base" in spec:
+    base = _urls(platform, spec["base"])
+    if base is None:
+      raise Exception(f"{UNKNOWN} {platform}/{spec['base']}")
+    urls = dict(base)
+    for url in spec.get("remove") or []:
+      urls.pop(url, None)
+    for problem_id, url in spec.get("add") or []:
+      urls[url] = problem_id
+  else:
+    urls = _stored(platform, version)
+    if urls is None:
+      raise Exception(f"{UNKNOWN} {platform}/{version}")
+    return _keep(platform, ProblemIndex(version, urls, key))
+
+  _store(platform, version, urls)
+  return _keep(platform, ProblemIndex(version, urls, key))
@@ -0,0 +1,99 @@
+import os
+import time
+import sqlite3
+import threading
+from urllib.parse import urlparse
+
+from common import metrics
+from common.cache import CACHE_DIR
+
+# requests per second and burst size per host, shared by every scraper
+# process on this machine; override with SCRAPER_RATES="qoj.ac=10:10,..."
+RATES = {
+  "oj.uz": (8.0, 8),
+  "qoj.ac": (10.0, 10),
+  "codechef.com": (0.5, 2),
+}
+DEFAULT_RATE = (5.0, 5)
+
+for _spec in filter(None, os.environ.get("SCRAPER_RATES", "").split(",")):
+  _host, _, _val = _spec.partition("=")
+  _rate, _, _burst = _val.partition(":")
+  RATES[_host.strip()] = (float(_rate), int(_burst or 1))
+
+MAX_PENALTY = 120.0
+
+_local = threading.local()
+
+def host_of(url: str) -> str:
+  host = urlparse(url).hostname or ""
+  return host[4:] if host.startswith("www.") else host
+
+def _conn():
+  c = getattr(_local, "conn", None)
+  if c is None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    c = sqlite3.connect(os.path.join(CACHE_DIR, "ratelimit.db"), timeout=30, isolation_level=None)
+    c.execute("PRAGMA journal_mode=WAL")
+    c.execute("""
+      CREATE TABLE IF NOT EXISTS buckets (
+        host TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated REAL NOT NULL,
+        blocked_until REAL NOT NULL
+      )
+    """)
+    _local.conn = c
+  return c
+
+def _update(host: str, take: bool, block: float = 0.0) -> float:
+  """
+  Refill the bucket for `host`, then either take a token or push back its
+  blocked_until. Returns how long the caller has to wait (0 once a token is taken).
+  """
+  rate, burst = RATES.get(host, DEFAULT_RATE)
+  c = _conn()
+  c.execute("BEGIN IMMEDIATE")
+  try:
+    now = time.time()
+    row = c.execute("SELECT tokens, updated, blocked_until FROM buckets WHERE host = ?", (host,)).fetchone()
+    tokens, updated, blocked = row if row else (float(burst), now, 0.0)
+    tokens = min(float(burst), tokens + max(0.0, now - updated) * rate)
+    blocked = max(blocked, now + block)
+    wait = 0.0
+    if take:
+      if blocked > now:
+        wait = blocked - now
+      elif tokens >= 1.0:
+        tokens -= 1.0
+      else:
+        wait = (1.0 - tokens) / rate
+    c.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)", (host, tokens, now, blocked))
+    c.execute("COMMIT")
+  except BaseException:
+    c.execute("ROLLBACK")
+    raise
+  return wait
+
+def try_acquire(host: str) -> float:
+  """Take a token for `host` if one is free; otherwise return how long to wait."""
+  try:
+    return _update(host, True)
+  except sqlite3.Error:
+    return 0.0
+
+def acquire(host: str):
+  """Block until a request to `host` is allowed."""
+  while True:
+    wait = try_acquire(host)
+    if wait <= 0:
+      return
+    metrics.slept(wait)
+    time.sleep(wait)
+
+def penalize(host: str, seconds: float):
+  """Hold back every process's requests to `host` for `seconds`."""
+  try:
+    _update(host, False, min(seconds, MAX_PENALTY))
+  except sqlite3.Error:
+    pass
@@ -0,0 +1,36 @@
+import threading
+from collections import OrderedDict
+
+MAX_SESSIONS = 64
+
+_pool = OrderedDict()
+_lock = threading.Lock()
+
+def pooled(key, factory):
+  """
+  Return the session cached under `key`, building it with `factory` on first use.
+  One-shot scripts only ever build one; the long-lived worker keeps sessions,
+  their cookies and keep-alive connections warm between jobs.
+  """
+  with _lock:
+    s = _pool.get(key)
+    if s is not None:
+      _pool.move_to_end(key)
+      return s
+    s = _pool[key] = factory()
+    if len(_pool) > MAX_SESSIONS:
+      _, old = _pool.popitem(last=False)
+      try:
+        old.close()
+      except Exception:
+        pass
+    return s
+
+def discard(key):
+  with _lock:
+    s = _pool.pop(key, None)
+  if s is not None:
+    try:
+      s.close()
+    except Exception:
+      pass
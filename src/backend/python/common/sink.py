@@ -0,0 +1,126 @@
+"""
+Optional sink that writes sync results straight into the app's SQLite
+database (the one Prisma manages, at DATABASE_PATH) instead of leaving every
+row to the Node side.
+
+A worker job opts in with a "sink" object in its data, e.g.
+  {"job": "fetchProblemScores", "data": {..., "sink": {"userId": 1, "platform": "qoj.ac"}}}
+  {"job": "fetchContestScores", "data": {..., "sink": {"userId": 1}}}
+Problem scores become one batch of UserProblemData upserts that only touch
+rows whose score went up (plus the SyncCursor, if the job returned one);
+contest submissions become one batch of VirtualSubmission inserts for the
+user's active contest. Each job's writes are one short BEGIN IMMEDIATE
+transaction, so they queue behind Prisma's writers instead of failing on
+SQLITE_BUSY. The result then carries {"sink": {...counts}} and the caller
+must not write the rows again.
+
+Values are stored the way Prisma stores them on SQLite: DateTime as epoch
+milliseconds, Json as JSON text.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", ".."))
+BUSY_TIMEOUT = 30
+
+_local = threading.local()
+
+def database_path() -> str:
+  url = os.environ.get("DATABASE_PATH")
+  if not url:
+    raise Exception("DATABASE_PATH is not set")
+  path = url[len("file:"):] if url.startswith("file:") else url
+  path = path.split("?", 1)[0]
+  # Prisma resolves relative paths against the schema's directory
+  return path if os.path.isabs(path) else os.path.join(ROOT, "prisma", path)
+
+def _conn():
+  c = getattr(_local, "conn", None)
+  if c is None:
+    c = sqlite3.connect(database_path(), timeout=BUSY_TIMEOUT, isolation_level=None)
+    c.execute("PRAGMA foreign_keys=ON")
+    _local.conn = c
+  return c
+
+def _ms(iso: str) -> int:
+  dt = datetime.fromisoformat(str(iso).replace("Z", "+00:00"))
+  if dt.tzinfo is None:
+    dt = dt.replace(tzinfo=timezone.utc)
+  return int(dt.timestamp() * 1000)
+
+def _status(score: float) -> int:
+  # as the link routes set it
+  return 2 if score == 100 else 1 if score > 0 else 0
+
+class _transaction:
+  def __init__(self):
+    self.conn = _conn()
+
+  def __enter__(self):
+    self.conn.execute("BEGIN IMMEDIATE")
+    return self.conn
+
+  def __exit__(self, exc_type, exc, tb):
+    self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+    return False
+
+def problem_scores(user_id: int, scores: list, platform: str | None = None, cursor=None) -> dict:
+  """Raise the user's stored scores to `scores`; returns how many rows changed."""
+  now = int(time.time() * 1000)
+  rows = [
+    (user_id, s["problemId"], float(s["score"]), _status(float(s["score"])), now)
+    for s in scores if s.get("problemId") is not None and float(s.get("score") or 0) > 0
+  ]
+  with _transaction() as c:
+    before = c.total_changes
+    c.executemany(
+      'INSERT INTO "UserProblemData" ("userId", "problemId", "score", "status", "updatedAt") '
+      'VALUES (?, ?, ?, ?, ?) '
+      'ON CONFLICT ("userId", "problemId") DO UPDATE SET "score" = excluded."score", "status" = excluded."status" '
+      'WHERE excluded."score" > "UserProblemData"."score"',
+      rows
+    )
+    updated = c.total_changes - before
+    if platform and cursor is not None:
+      c.execute(
+        'INSERT INTO "SyncCursor" ("userId", "platform", "cursor") VALUES (?, ?, ?) '
+        'ON CONFLICT ("userId", "platform") DO UPDATE SET "cursor" = excluded."cursor"',
+        (user_id, platform, json.dumps(cursor))
+      )
+  return {"updated": updated, "cursor": bool(platform and cursor is not None)}
+
+def virtual_submissions(user_id: int, submissions: list) -> dict:
+  """Add `submissions` to the user's active virtual contest."""
+  rows = [
+    (user_id, s["contestProblemId"], _ms(s["time"]), float(s["score"]), json.dumps(s.get("subtaskScores") or []))
+    for s in submissions
+  ]
+  with _transaction() as c:
+    c.executemany(
+      'INSERT INTO "VirtualSubmission" ("activeVirtualContestUserId", "contestProblemId", "time", "score", "subtaskScores") '
+      'VALUES (?, ?, ?, ?, ?)',
+      rows
+    )
+  return {"inserted": len(rows)}
+
+def write(job: str, spec: dict, result: dict) -> dict:
+  """Write a finished job's result as `spec` asks; returns the result with the counts added."""
+  if not isinstance(result, dict) or "error" in result:
+    return result
+  user_id = spec.get("userId")
+  if user_id is None:
+    raise Exception("sink needs a userId")
+  if job == "fetchProblemScores":
+    result["sink"] = problem_scores(user_id, result.get("scores") or [], spec.get("platform"), result.get("cursor"))
+  elif job == "fetchContestScores":
+    # a partial fetch is run again and would insert its submissions twice
+    if result.get("errors"):
+      return result
+    result["sink"] = virtual_submissions(user_id, result.get("submissions") or [])
+  else:
+    raise Exception(f"Nothing to sink for {job}")
+  return result
@@ -0,0 +1,64 @@
+import sys
+import json
+
+class Collector:
+  """
+  Gathers the submissions a contest fetcher produces. With `emit` set
+  (streaming mode) each one is also handed to emit({"submission": ...}) as
+  soon as it is ready.
+
+  A failed item is recorded instead of aborting the whole fetch: the result
+  carries the submissions that did arrive plus "errors" and "failed" (the
+  submission ids, where known), so the caller keeps the partial result and a
+  re-run can pick up the rest. Only a fetch that produced nothing but
+  failures reports an "error".
+  """
+
+  def __init__(self, emit=None):
+    self.emit = emit
+    self.items = []
+    self.errors = []
+    self.failed = []
+
+  def add(self, item):
+    self.items.append(item)
+    if self.emit is not None:
+      self.emit({"submission": item})
+
+  def fail(self, error: Exception, item_id=None):
+    self.errors.append(str(error))
+    if item_id is not None:
+      self.failed.append(item_id)
+
+  def result(self, **extra) -> dict:
+    if self.emit is None:
+      if self.errors and not self.items:
+        return {"error": self.errors[0], "errors": self.errors, "failed": self.failed}
+      return {"submissions": sorted(self.items, key=lambda x: x["time"]), "errors": self.errors, "failed": self.failed, **extra}
+    return {"summary": {"count": len(self.items), "errors": self.errors, "failed": self.failed, **extra}}
+
+def stdout_emitter(event: dict):
+  sys.stdout.write(json.dumps(event) + "\n")
+  sys.stdout.flush()
+
+def cli_main(run, watch=None):
+  """
+  Shared main() for the contest fetchers: reads the job from stdin and prints
+  one JSON result, or with --stream one NDJSON line per submission followed
+  by a {"summary": ...} line. --watch streams the same way but keeps polling
+  until the contest is over (see common/watch.py).
+  """
+  watching = watch is not None and "--watch" in sys.argv[1:]
+  streaming = watching or "--stream" in sys.argv[1:]
+  try:
+    data = json.loads(sys.stdin.read() or "{}")
+    if watching:
+      out = watch(data, emit=stdout_emitter)
+    else:
+      out = run(data, emit=stdout_emitter if streaming else None)
+  except Exception as e:
+    out = {"error": str(e)}
+  if streaming and "error" in out:
+    out = {"summary": {"error": out["error"]}}
+  sys.stdout.write(json.dumps(out) + ("\n" if streaming else ""))
+  sys.exit(1 if "error" in out or "error" in out.get("summary", {}) else 0)
@@ -0,0 +1,143 @@
+import os
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from common import aio, metrics
+from common.stream import Collector
+
+POLL_INTERVAL = float(os.environ.get("SCRAPER_WATCH_INTERVAL", "30"))
+# submissions still being judged (or whose detail page keeps failing) are
+# polled for this long after the contest ends before they are given up on
+JUDGING_GRACE = timedelta(minutes=5)
+
+# returned by a watcher's details() instead of a submission
+JUDGING = object()
+BEFORE_START = object()
+
+def _iso_to_dt(iso_str) -> datetime:
+  return datetime.fromisoformat(str(iso_str).replace('Z', '+00:00')).astimezone(timezone.utc)
+
+def contest_window(contest: dict) -> tuple[datetime, datetime]:
+  """
+  Start and end of a virtual contest. A running contest has no endedAt yet,
+  so it ends `duration` minutes after it started.
+  """
+  start = _iso_to_dt(contest['startedAt'])
+  if contest.get('endedAt'):
+    return start, _iso_to_dt(contest['endedAt'])
+  duration = (contest.get('contest') or {}).get('duration')
+  if not duration:
+    raise Exception('Contest has neither an end time nor a duration')
+  return start, start + timedelta(minutes=duration)
+
+class ContestWatch:
+  """
+  Follows a running virtual contest. Each poll walks the submissions listing
+  only down to the newest submission already seen (the first poll goes back
+  to the contest start) and fetches details for the new submissions plus the
+  ones still being judged last time, until JUDGING_GRACE after the end. Every
+  graded submission is emitted once as {"submission": ...}, and every poll
+  ends with a {"poll": ...} line. A failed detail fetch only counts as an
+  error if no later attempt at the same submission succeeds.
+
+  `pages()` is an async generator of listing rows, newest first, each a dict
+  with a `submission_id` and optionally `relevant` (False for other problems
+  or submissions after the end) and `before_start`. `details(row)` returns
+  the submission, None, JUDGING or BEFORE_START.
+
+  Setting the asyncio.Event `stop` ends the watch early, after the poll in
+  progress; its summary then says "cancelled".
+  """
+
+  def __init__(self, pages, details, end_dt: datetime, emit, interval: float | None = None, concurrency: int = 5,
+               stop: asyncio.Event | None = None):
+    self.pages = pages
+    self.details = details
+    self.end_dt = end_dt
+    self.interval = max(1.0, float(interval or POLL_INTERVAL))
+    self.concurrency = concurrency
+    self.stop = stop if stop is not None else asyncio.Event()
+    self.out = Collector(emit)
+    self.seen = set()
+    self.judging = {}
+    # the last error of each submission whose detail fetch hasn't succeeded
+    self.errors = {}
+    self.polls = 0
+
+  def _retry(self, row):
+    if datetime.now(timezone.utc) < self.end_dt + JUDGING_GRACE:
+      self.judging[row['submission_id']] = row
+
+  async def _fetch(self, rows) -> bool:
+    reached_start = False
+    async for row, res, err in aio.as_ready(self.details, rows, self.concurrency):
+      if err is not None:
+        self.errors[row['submission_id']] = str(err)
+        self._retry(row)
+        continue
+      self.errors.pop(row['submission_id'], None)
+      if res is JUDGING:
+        self._retry(row)
+      elif res is BEFORE_START:
+        reached_start = True
+      elif res is not None:
+        self.out.add(res)
+    return reached_start
+
+  async def poll(self):
+    before = len(self.out.items)
+    todo = list(self.judging.values())
+    self.judging.clear()
+    pages = self.pages()
+    try:
+      async for rows in pages:
+        done = not rows
+        for row in rows:
+          if row['submission_id'] in self.seen or row.get('before_start'):
+            done = True
+            break
+          self.seen.add(row['submission_id'])
+          if row.get('relevant', True):
+            todo.append(row)
+        # details go page by page so a submission from before the start can
+        # end the walk early
+        done = await self._fetch(todo) or done
+        todo = []
+        if done:
+          break
+    finally:
+      await pages.aclose()
+    if todo:
+      await self._fetch(todo)
+    self.polls += 1
+    if self.out.emit is not None:
+      self.out.emit({"poll": {
+        "n": self.polls,
+        "new": len(self.out.items) - before,
+        "judging": len(self.judging),
+      }})
+
+  async def run(self):
+    """Poll until the contest is over and nothing is left being judged, or until stopped."""
+    while not self.stop.is_set():
+      await self.poll()
+      now = datetime.now(timezone.utc)
+      if now >= self.end_dt and not self.judging:
+        break
+      wait = self.interval
+      if now < self.end_dt:
+        # wake up right after the end for the final poll
+        wait = min(wait, (self.end_dt - now).total_seconds() + 1)
+      metrics.slept(wait)
+      try:
+        await asyncio.wait_for(self.stop.wait(), wait)
+      except asyncio.TimeoutError:
+        pass
+
+  def result(self, **extra) -> dict:
+    for sid, err in self.errors.items():
+      self.out.fail(err, sid)
+    self.errors = {}
+    if self.stop.is_set():
+      extra["cancelled"] = True
+    return self.out.result(polls=self.polls, judging=len(self.judging), **extra)
@@ -1,155 +1,238 @@
 #!/usr/bin/env python3
+import os
 import sys
-import json
-import re
-import time
 from datetime import datetime, timezone
 import requests
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor
 
-def main():
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import aio, dom, extract, metrics
+from common.cache import DetailCache
+from common.checkpoint import Checkpoint
+from common.pipeline import pipelined
+from common.stream import Collector, cli_main
+from common.watch import ContestWatch, JUDGING, contest_window
+
+BASE = 'https://oj.uz'
+HEADERS = {
+  'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
+}
+
+def iso_to_dt(iso_str: str) -> datetime:
+  return datetime.fromisoformat(str(iso_str).replace('Z', '+00:00'))
+
+def contest_problem_map(contest) -> dict:
+  problem_link_map = {}
+  for cprob in contest['contest']['problems']:
+    cprob_id = cprob['id']
+    prob = cprob['problem']
+    for pl in prob.get('problemLinks', []):
+      if pl.get('platform') == 'oj.uz':
+        problem_link_map[pl['url']] = {
+          'contest_problem_id': cprob_id
+        }
+  return problem_link_map
+
+def parse_listing_rows(html: str):
+  """Rows of a submissions listing page, newest first."""
+  soup = dom.parse(html, 'table')
+  rows = []
+  for row in soup.select('table.table tbody tr'):
+    try:
+      tspan = row.select_one('span[data-timestamp-iso]')
+      if not tspan:
+        continue
+      ts_str = tspan['data-timestamp-iso']
+      sub_a = row.select_one("a[href*='/submission/']")
+      prob_a = row.select_one("a[href*='/problem/view/']")
+      rows.append({
+        'submission_id': sub_a['href'].split('/')[-1] if sub_a else None,
+        'submission_time': ts_str,
+        'ts': iso_to_dt(ts_str),
+        'problem_url': BASE + prob_a['href'] if prob_a else None,
+      })
+    except Exception as e:
+      raise Exception(f'Error processing submission row: {e}')
+  return rows
+
+@metrics.staged("listing")
+async def fetch_listing_page(client, url: str):
+  resp = await client.get(url, headers=HEADERS, timeout=10)
+  if resp.status_code != 200:
+    raise Exception(f'Failed to fetch submissions page: {resp.status_code}')
+  return parse_listing_rows(resp.text)
+
+@metrics.staged("details")
+async def fetch_details(client, cache: DetailCache, virtual_contest_id, s):
+  """The submission for listing row `s`, or None while it's still being judged."""
   try:
-    data = json.loads(sys.stdin.read())
-    username = data['username']
-    contest = data['contest']
-
-    started_at = contest['startedAt']
-    ended_at = contest['endedAt']
-
-    start_dt = datetime.fromisoformat(str(started_at).replace('Z', '+00:00'))
-    if ended_at is None:
-      end_dt = datetime.now(timezone.utc)
-    else:
-      end_dt = datetime.fromisoformat(str(ended_at).replace('Z', '+00:00'))
-
-    problems = contest['contest']['problems']
-
-    problem_link_map = {}
-    for cprob in problems:
-      cprob_id = cprob['id']
-      prob = cprob['problem']
-      for pl in prob.get('problemLinks', []):
-        if pl.get('platform') == 'oj.uz':
-          problem_link_map[pl['url']] = {
-            'contest_problem_id': cprob_id
-          }
-
-    headers = {
-      'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
+    hit = await aio.off_loop(cache.get, s['submission_id'])
+    if hit is not None:
+      return {
+        'virtualContestId': virtual_contest_id,
+        'contestProblemId': s['contest_problem_id'],
+        'time': s['submission_time'],
+        'score': hit['total_score'],
+        'subtaskScores': hit['subtask_scores']
+      }
+
+    url = f"{BASE}/submission/{s['submission_id']}"
+    r = await client.get(url, headers=HEADERS, timeout=10)
+    if r.status_code != 200:
+      raise Exception(f'Failed to fetch submission {s["submission_id"]}: {r.status_code}')
+    det = extract.ojuz_submission(r.text)
+    subscores, total = det['subtask_scores'], det['total_score']
+
+    # a subtask still being judged has no "x / y" score yet
+    if det['graded']:
+      await aio.off_loop(cache.put, s['submission_id'], subscores, total, s['submission_time'])
+
+    return {
+      'virtualContestId': virtual_contest_id,
+      'contestProblemId': s['contest_problem_id'],
+      'time': s['submission_time'],
+      'score': total,
+      'subtaskScores': subscores,
+      'graded': det['graded'],
     }
+  except Exception as e:
+    raise Exception(f'Error fetching submission {s["submission_id"]}: {e}')
 
-    relevant_submissions = []
-    submissions_url = f"https://oj.uz/submissions?handle={username}"
+async def run_async(data, emit=None):
+  username = data['username']
+  contest = data['contest']
 
-    while submissions_url:
-      resp = requests.get(submissions_url, headers=headers, timeout=10)
-      if resp.status_code != 200:
-        sys.stdout.write(json.dumps({'error': f'Failed to fetch submissions page: {resp.status_code}'}))
-        sys.exit(1)
+  started_at = contest['startedAt']
+  ended_at = contest['endedAt']
+
+  start_dt = iso_to_dt(started_at)
+  if ended_at is None:
+    end_dt = datetime.now(timezone.utc)
+  else:
+    end_dt = iso_to_dt(ended_at)
+
+  problem_link_map = contest_problem_map(contest)
+
+  client = aio.client(('oj.uz', None), requests.Session)
+  out = Collector(emit)
+
+  # a finished contest's window doesn't move, so a failed run can be resumed
+  checkpoint = await aio.off_loop(Checkpoint, 'oj.uz/fetchContestScores', ended_at and [
+    username, contest['userId'], started_at, ended_at, sorted(problem_link_map)
+  ])
+  relevant_submissions = checkpoint.state.setdefault('rows', [])
 
-      soup = BeautifulSoup(resp.text, 'html.parser')
-      rows = soup.select('table.table tbody tr')
+  async def listing():
+    # rows that a previous run already listed go first
+    for s in list(relevant_submissions):
+      yield s
+    # the listing page to continue from; None once the listing is done
+    submissions_url = checkpoint.state.get('next', f"{BASE}/submissions?handle={username}")
+
+    while submissions_url:
+      rows = await fetch_listing_page(client, submissions_url)
       if not rows:
+        checkpoint.state['next'] = None
         break
 
       last_submission_id = None
+      found = []
 
       for row in rows:
-        try:
-          tspan = row.find('span', {'data-timestamp-iso': True})
-          if not tspan:
-            continue
-          ts_str = tspan['data-timestamp-iso']
-          ts = datetime.fromisoformat(ts_str.replace('Z', '+00:00'))
-
-          if ts < start_dt:
-            submissions_url = None
-            break
-          if ts > end_dt:
-            continue
-
-          sub_a = row.find('a', href=re.compile(r'/submission/\d+'))
-          if not sub_a:
-            continue
-          submission_id = sub_a['href'].split('/')[-1]
-          last_submission_id = submission_id
-
-          prob_a = row.find('a', href=re.compile(r'/problem/view/'))
-          if not prob_a:
-            continue
-          prob_url = 'https://oj.uz' + prob_a['href']
-
-          if prob_url in problem_link_map:
-            relevant_submissions.append({
-              'submission_id': submission_id,
-              'submission_time': ts_str,
-              'contest_problem_id': problem_link_map[prob_url]['contest_problem_id']
-            })
-        except Exception as e:
-          sys.stdout.write(json.dumps({'error': f'Error processing submission row: {e}'}))
-          sys.exit(1)
+        if row['ts'] < start_dt:
+          submissions_url = None
+          break
+        if row['ts'] > end_dt:
+          continue
+
+        if not row['submission_id']:
+          continue
+        last_submission_id = row['submission_id']
+
+        if row['problem_url'] in problem_link_map:
+          found.append({
+            'submission_id': row['submission_id'],
+            'submission_time': row['submission_time'],
+            'contest_problem_id': problem_link_map[row['problem_url']]['contest_problem_id']
+          })
 
       if submissions_url and last_submission_id:
-        submissions_url = f"https://oj.uz/submissions?handle={username}&direction=down&id={last_submission_id}"
-        time.sleep(0.5)
+        submissions_url = f"{BASE}/submissions?handle={username}&direction=down&id={last_submission_id}"
       else:
         submissions_url = None
+      relevant_submissions.extend(found)
+      checkpoint.state['next'] = submissions_url
+      await aio.off_loop(checkpoint.save)
+      for s in found:
+        yield s
+
+  cache = DetailCache('oj.uz')
+
+  async def details(s):
+    sub = await fetch_details(client, cache, contest['userId'], s)
+    sub.pop('graded', None)
+    return sub
+
+  # details are fetched while the listing is still paging down
+  async for s, item, err in pipelined(listing(), details, 5, retries=aio.ITEM_RETRIES):
+    if err is not None:
+      out.fail(err, s and s['submission_id'])
+    elif item is not None:
+      out.add(item)
+
+  # keep the listing progress for a re-run only while something is missing
+  if out.errors:
+    await aio.off_loop(checkpoint.save)
+  else:
+    await aio.off_loop(checkpoint.clear)
+  return out.result(cache=cache.stats(), resumed=checkpoint.resumed)
+
+async def watch_async(data, emit, stop=None):
+  username = data['username']
+  contest = data['contest']
+
+  start_dt, end_dt = contest_window(contest)
+  problem_link_map = contest_problem_map(contest)
+  client = aio.client(('oj.uz', None), requests.Session)
+  cache = DetailCache('oj.uz')
+
+  async def pages():
+    url = f"{BASE}/submissions?handle={username}"
+    while url:
+      rows = []
+      for row in await fetch_listing_page(client, url):
+        if not row['submission_id']:
+          continue
+        mapping = problem_link_map.get(row['problem_url'])
+        rows.append({
+          'submission_id': row['submission_id'],
+          'submission_time': row['submission_time'],
+          'contest_problem_id': mapping and mapping['contest_problem_id'],
+          'relevant': mapping is not None and row['ts'] <= end_dt,
+          'before_start': row['ts'] < start_dt,
+        })
+      yield rows
+      url = rows and f"{BASE}/submissions?handle={username}&direction=down&id={rows[-1]['submission_id']}"
+
+  async def details(s):
+    sub = await fetch_details(client, cache, contest['userId'], s)
+    if sub.pop('graded', True) is False:
+      return JUDGING
+    return sub
+
+  watcher = ContestWatch(pages, details, end_dt, emit, data.get('interval'), stop=stop)
+  await watcher.run()
+  return watcher.result(cache=cache.stats())
+
+@metrics.instrument
+def run(data, emit=None):
+  return aio.run(run_async(data, emit))
+
+@metrics.instrument
+def watch(data, emit):
+  return aio.run(watch_async(data, emit))
 
-    def fetch_details(s):
-      try:
-        url = f"https://oj.uz/submission/{s['submission_id']}"
-        r = requests.get(url, headers=headers, timeout=10)
-        if r.status_code != 200:
-          sys.stdout.write(json.dumps({'error': f'Failed to fetch submission {s["submission_id"]}: {r.status_code}'}))
-          sys.exit(1)
-        soup = BeautifulSoup(r.text, 'html.parser')
-        divs = soup.find_all('div', id=re.compile(r'subtask_results_div_\d+'))
-
-        subscores = []
-        total = 0.0
-        for d in divs:
-          span = d.find('span', class_=re.compile(r'subtask-score'))
-          if not span:
-            subscores.append(0)
-            continue
-          txt = span.get_text().strip()
-          m = re.search(r'([0-9]+(?:\.[0-9]+)?)\s*/\s*([0-9]+(?:\.[0-9]+)?)', txt)
-          if not m:
-            subscores.append(0)
-            continue
-          earned = float(m.group(1))
-          earned_rounded = round(earned, 2)
-          if earned_rounded == int(earned_rounded):
-            earned_rounded = int(earned_rounded)
-          total += float(earned_rounded)
-          subscores.append(earned_rounded)
-
-        return {
-          'virtualContestId': contest['userId'],
-          'contestProblemId': s['contest_problem_id'],
-          'time': s['submission_time'],
-          'score': total,
-          'subtaskScores': subscores
-        }
-      except Exception as e:
-        sys.stdout.write(json.dumps({'error': f'Error fetching submission {s["submission_id"]}: {e}'}))
-        sys.exit(1)
-
-    submissions_out = []
-    if relevant_submissions:
-      with ThreadPoolExecutor(max_workers=5) as ex:
-        for item in ex.map(fetch_details, relevant_submissions):
-          if item is not None:
-            submissions_out.append(item)
-
-    submissions_out.sort(key=lambda x: x['time'])
-    sys.stdout.write(json.dumps({'submissions': submissions_out}))
-    sys.exit(0)
-
-  except Exception as e:
-    sys.stdout.write(json.dumps({'error': str(e)}))
-    sys.exit(1)
+def main():
+  cli_main(run, watch)
 
 if __name__ == '__main__':
   main()
\ No newline at end of file
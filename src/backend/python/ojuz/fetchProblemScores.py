@@ -1,84 +1,194 @@
 #!/usr/bin/env python3
+import os
 import sys
 import json
 import re
+import hashlib
 import requests
-import time
-import random
-from concurrent.futures import ThreadPoolExecutor
-from bs4 import BeautifulSoup
 
-def main():
-  data = json.loads(sys.stdin.read())
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import aio, dom, metrics, problem_index
+
+BASE = 'https://oj.uz'
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
+
+PENDING_RE = re.compile(r'\b(Waiting|Judging|Compiling|Pending|Running)\b', re.I)
+RESULT_RE = re.compile(r'([0-9]+(?:\.[0-9]+)?)\s*/\s*([0-9]+(?:\.[0-9]+)?)')
+
+def _canonical_link(url: str) -> str | None:
+  m = re.search(r'/problem/view/([^/?#]+)', url or '')
+  return f"{BASE}/problem/view/{m.group(1)}" if m else None
+
+def _parse_listing(html: str):
+  """Rows of a submissions listing page, newest first."""
+  soup = dom.parse(html, 'table')
+  rows = []
+  for row in soup.select('table.table tbody tr'):
+    sub_a = row.select_one("a[href*='/submission/']")
+    prob_a = row.select_one("a[href*='/problem/view/']")
+    if not sub_a or not prob_a:
+      continue
+    try:
+      sid = int(sub_a['href'].rstrip('/').split('/')[-1])
+    except ValueError:
+      continue
+    text = row.get_text(' ', strip=True)
+    # the result bar reads "x / y"; None when it can't be read
+    score = None
+    m = RESULT_RE.search(text)
+    if m and float(m.group(2)) > 0:
+      score = round(float(m.group(1)) / float(m.group(2)) * 100)
+    rows.append({
+      'submission_id': sid,
+      # the same form as the tracked problem links, which it is looked up in
+      'link': _canonical_link(prob_a['href']),
+      'score': score,
+      'pending': bool(PENDING_RE.search(text)),
+    })
+  return rows
+
+@metrics.staged("listing")
+async def _walk_listing(client, username: str, since_id: int, first_page_only: bool = False):
+  """
+  Submissions newer than `since_id`, newest first, paging down the listing
+  until the cursor is reached.
+  """
+  url = f"{BASE}/submissions?handle={username}"
+  fresh = []
+  while url:
+    r = await client.get(url, headers={'User-Agent': USER_AGENT}, timeout=10)
+    if r.status_code != 200:
+      raise Exception(f'Failed to fetch submissions page: {r.status_code}')
+    rows = _parse_listing(r.text)
+    if not rows:
+      break
+    new = [row for row in rows if row['submission_id'] > since_id]
+    fresh.extend(new)
+    if first_page_only or len(new) < len(rows):
+      break
+    url = f"{BASE}/submissions?handle={username}&direction=down&id={rows[-1]['submission_id']}"
+  return fresh
+
+def _high_water_mark(rows, since_id: int) -> int:
+  # judging submissions are not in the problem score yet, so the mark stays
+  # below the oldest of them and the next sync looks at them again
+  mark = max([since_id] + [row['submission_id'] for row in rows])
+  pending = [row['submission_id'] for row in rows if row['pending']]
+  if pending:
+    mark = min(mark, min(pending) - 1)
+  return max(mark, since_id)
+
+async def run_async(data):
   cookie = data['cookie']
   username = data['username']
-  problems = data['problems']
 
-  try:
-    profile_url = f"https://oj.uz/profile/{username}"
-    prof_res = requests.get(profile_url, headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'}, timeout=10)
+  client = aio.client(('oj.uz', cookie), requests.Session)
+
+  # canonical problem link -> {"id", "link"}
+  links = problem_index.resolve(data, 'oj.uz', _canonical_link).problems
+
+  # the cursor remembers the per-problem scores as of lastSubmissionId; it
+  # only holds for the same account and the same tracked problems
+  problem_set = hashlib.sha1(','.join(sorted(filter(None, links))).encode()).hexdigest()
+  cursor = data.get('cursor') or {}
+  if cursor.get('username') != username or cursor.get('problemSet') != problem_set:
+    cursor = {}
+  since_id = int(cursor.get('lastSubmissionId') or 0)
+  known = {url: s for url, s in (cursor.get('scores') or {}).items() if url in links}
+
+  fresh = await _walk_listing(client, username, since_id, first_page_only=not cursor)
+
+  if cursor:
+    # only problems with a graded submission that could beat the stored
+    # score need their page fetched
+    changed = set()
+    for row in fresh:
+      if row['pending'] or row['link'] not in links:
+        continue
+      if row['score'] is None or row['score'] > known.get(row['link'], 0):
+        changed.add(row['link'])
+    to_fetch = [dict(links[url], link=url) for url in changed]
+  else:
+    profile_url = f"{BASE}/profile/{username}"
+    prof_res = await client.get(profile_url, headers={'User-Agent': USER_AGENT}, timeout=10)
     if prof_res.status_code == 200:
-      prof_soup = BeautifulSoup(prof_res.text, 'html.parser')
+      prof_soup = dom.parse(prof_res.text)
       profile_links = set()
-      for a in prof_soup.find_all('a', href=True):
+      for a in prof_soup.select('a[href]'):
         href = a['href']
         if href.startswith('/problem/view/'):
-          profile_links.add('https://oj.uz' + href)
-      if profile_links:
-        filtered = []
-        for p in problems:
-          oj_link = None
-          for link_entry in p.get('problemLinks', []):
-            if link_entry.get('platform') == 'oj.uz':
-              oj_link = link_entry.get('url')
-              break
-          if oj_link in profile_links:
-            np = dict(p)
-            np['link'] = oj_link
-            filtered.append(np)
-        problems = filtered
+          profile_links.add(_canonical_link(href))
+      to_fetch = [dict(p, link=url) for url, p in links.items() if url in profile_links or not profile_links]
     else:
-      sys.stdout.write(json.dumps({"error": "Failed to fetch profile page"}))
-      sys.exit(1)
-  except Exception as e:
-    sys.stdout.write(json.dumps({"error": str(e)}))
-    sys.exit(1)
+      return {"error": "Failed to fetch profile page"}
 
   headers = {
     'Cookie': f'oidc-auth={cookie}',
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
+    'User-Agent': USER_AGENT
   }
 
-  def fetch_score(problem):
-    try:
-      time.sleep(random.uniform(0.2, 0.5))
-      res = requests.get(problem['link'], headers=headers, timeout=5, allow_redirects=True)
-      print(res, file=sys.stderr)
-      match = re.search(r"circleProgress\(\s*{\s*value:\s*([0-9.]+)", res.text)
-      if match:
-        score = round(float(match.group(1)) * 100)
-        return (problem, score)
-    except Exception as e:
-      sys.stdout.write(json.dumps({"error": str(e)}))
-      sys.exit(1)
+  @metrics.staged("problems")
+  async def fetch_score(problem):
+    res = await client.get(problem['link'], headers=headers, timeout=5, allow_redirects=True)
+    # a problem that's gone is skipped; anything else is worth another try
+    if res.status_code == 404:
+      return None
+    if res.status_code != 200:
+      raise Exception(f"Failed to fetch {problem['link']}: {res.status_code}")
+    match = re.search(r"circleProgress\(\s*{\s*value:\s*([0-9.]+)", res.text)
+    if match:
+      score = round(float(match.group(1)) * 100)
+      return (problem, score)
     return None
 
   results = []
-  with ThreadPoolExecutor(max_workers=8) as executor:
-    for result in executor.map(fetch_score, problems):
-      if result is not None:
-        results.append(result)
+  failed = []
+  errors = []
+  async for problem, result, err in aio.as_ready(fetch_score, to_fetch, 8, retries=aio.ITEM_RETRIES):
+    if err is not None:
+      failed.append(problem['link'])
+      errors.append(str(err))
+    elif result is not None:
+      results.append(result)
 
-  if not results:
-    sys.stdout.write(json.dumps({'error': 'Invalid or expired cookie'}))
-    sys.exit(1)
+  if to_fetch and not results:
+    # pages that loaded without a score mean oj.uz didn't see us logged in
+    if errors:
+      return {'error': '; '.join(dict.fromkeys(errors)), 'failed': failed}
+    return {'error': 'Invalid or expired cookie'}
 
-  scores_out = []
+  scores = dict(known)
   for problem, new_score in results:
-    scores_out.append({'problemId': problem.get('id'), 'score': new_score})
+    scores[problem['link']] = max(scores.get(problem['link'], 0), new_score)
 
-  sys.stdout.write(json.dumps({'scores': scores_out}))
-  sys.exit(0)
+  scores_out = []
+  for url, score in scores.items():
+    scores_out.append({'problemId': links[url].get('id'), 'score': score})
+
+  # a changed problem whose page didn't load is looked at again next time
+  mark = _high_water_mark(fresh, since_id)
+  if (cursor and len(results) < len(to_fetch)) or failed:
+    mark = since_id
+  new_cursor = {
+    'username': username,
+    'problemSet': problem_set,
+    'lastSubmissionId': mark,
+    'scores': scores,
+  }
+
+  return {'scores': scores_out, 'cursor': new_cursor, 'fetched': len(to_fetch), 'failed': failed}
+
+@metrics.instrument
+def run(data):
+  return aio.run(run_async(data))
+
+def main():
+  try:
+    out = run(json.loads(sys.stdin.read()))
+  except Exception as e:
+    out = {"error": str(e)}
+  sys.stdout.write(json.dumps(out))
+  sys.exit(1 if 'error' in out else 0)
 
 if __name__ == '__main__':
-  main()
\ No newline at end of file
+  main()
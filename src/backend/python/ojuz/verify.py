@@ -1,29 +1,40 @@
 #!/usr/bin/env python3
+import os
 import sys
 import json
 import re
 import requests
 
-def verify_ojuz(cookie: str):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import aio, metrics
+
+async def run_async(data):
+  cookie = data['cookie']
   headers = {
     'Cookie': f'oidc-auth={cookie}',
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
   }
+  client = aio.client(('oj.uz', cookie), requests.Session)
+  r = await client.get('https://oj.uz', headers=headers, timeout=5)
+  if r.status_code != 200:
+    return {"error": "Failed to fetch homepage"}
+  match = re.search(r'<span><a href="/profile/([^"]+)">([^<]+)</a></span>', r.text)
+  if not match:
+    return {"error": "Invalid oj.uz cookie"}
+  username = match.group(2).strip()
+  return {"username": username}
+
+@metrics.instrument
+def run(data):
+  return aio.run(run_async(data))
+
+def verify_ojuz(cookie: str):
   try:
-    r = requests.get('https://oj.uz', headers=headers, timeout=5)
-    if r.status_code != 200:
-      sys.stdout.write(json.dumps({"error": "Failed to fetch homepage"}))
-      sys.exit(1)
-    match = re.search(r'<span><a href="/profile/([^"]+)">([^<]+)</a></span>', r.text)
-    if not match:
-      sys.stdout.write(json.dumps({"error": "Invalid oj.uz cookie"}))
-      sys.exit(1)
-    username = match.group(2).strip()
-    sys.stdout.write(json.dumps({"username": username}))
-    sys.exit(0)
+    out = run({'cookie': cookie})
   except Exception as e:
-    sys.stdout.write(json.dumps({"error": str(e)}))
-    sys.exit(1)
+    out = {"error": str(e)}
+  sys.stdout.write(json.dumps(out))
+  sys.exit(1 if "error" in out else 0)
 
 if __name__ == "__main__":
-  verify_ojuz(sys.argv[1])
\ No newline at end of file
+  verify_ojuz(sys.argv[1])
@@ -1,15 +1,23 @@
 #!/usr/bin/env python3
+import os
 import sys
-import json
 import re
-import time
 from datetime import datetime, timezone, timedelta
-from concurrent.futures import ThreadPoolExecutor
 import cloudscraper
-from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import aio, dom, extract, metrics, cookies
+from common.cache import DetailCache
+from common.checkpoint import Checkpoint
+from common.pipeline import pipelined
+from common.stream import Collector, cli_main
+from common.locator import PageLocator
+from common.watch import ContestWatch, JUDGING, contest_window
 
 BASE = "https://qoj.ac"
 
+SERVER_TIME_RE = re.compile(r"Server Time:\s*(\d{4}-\d{2}-\d{2})\s+(\d{2}:\d{2}:\d{2})")
+
 def iso_to_dt(iso_str: str) -> datetime:
   return datetime.fromisoformat(str(iso_str).replace('Z', '+00:00')).astimezone(timezone.utc)
 
@@ -22,25 +30,24 @@ def make_scraper(session_cookie: str):
   s.headers.update({
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
   })
+  cookies.attach(s, "qoj.ac")
   return s
 
 def extract_problem_id_from_url(url: str) -> int | None:
   m = re.search(r'/problem/(\d+)', url or "")
   return int(m.group(1)) if m else None
 
-def parse_server_time_offset(soup: BeautifulSoup) -> timedelta:
-  p_tag = soup.find("p", string=re.compile(r"Server Time:\s*\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}"))
-  if not p_tag:
-    return timedelta(0)
-  m = re.search(r"Server Time:\s*([0-9:\-\s]{19})", p_tag.get_text(" ", strip=True))
+def parse_server_time_offset(html: str) -> timedelta:
+  # read straight off the raw page so the listing only needs its table parsed
+  m = SERVER_TIME_RE.search(html)
   if not m:
     return timedelta(0)
-  server_naive = datetime.strptime(m.group(1), "%Y-%m-%d %H:%M:%S")
+  server_naive = datetime.strptime(f"{m.group(1)} {m.group(2)}", "%Y-%m-%d %H:%M:%S")
   now_utc = datetime.utcnow()
   return server_naive - now_utc
 
 def parse_submissions_rows_for_page(html: str, server_offset: timedelta):
-  soup = BeautifulSoup(html, "html.parser")
+  soup = dom.parse(html, "table")
   rows = soup.select("table tbody tr")
   results = []
   for row in rows:
@@ -58,7 +65,7 @@ def parse_submissions_rows_for_page(html: str, server_offset: timedelta):
       if pid is None:
         continue
 
-      smalls = row.find_all("small")
+      smalls = row.select("small")
       if not smalls:
         continue
       tstr = smalls[0].get_text(strip=True)
@@ -74,12 +81,13 @@ def parse_submissions_rows_for_page(html: str, server_offset: timedelta):
       continue
   return results
 
-def discover_max_page(scraper, username: str) -> int:
+@metrics.staged("discover")
+async def discover_max_page(client, username: str) -> int:
   url = f"{BASE}/submissions?submitter={username}&page=10000000"
-  r = scraper.get(url, timeout=20)
+  r = await client.get(url, timeout=20)
   if r.status_code != 200:
     return 1
-  soup = BeautifulSoup(r.text, "html.parser")
+  soup = dom.parse(r.text)
   active = soup.select_one("li.page-item.active a.page-link")
   if active:
     try:
@@ -96,159 +104,204 @@ def discover_max_page(scraper, username: str) -> int:
       continue
   return max_page
 
-def fetch_submission_details(scraper, sub_id: str):
+@metrics.staged("details")
+async def fetch_submission_details(client, sub_id: str):
   try:
     url = f"{BASE}/submission/{sub_id}"
-    r = scraper.get(url, timeout=20)
+    r = await client.get(url, timeout=20)
     if r.status_code != 200:
-      sys.stdout.write(json.dumps({'error': f'Failed to fetch submission {sub_id}: {r.status_code}'}))
-      sys.exit(1)
-    soup = BeautifulSoup(r.text, "html.parser")
-
-    # Recover problem id from any /problem/<id> link
-    pid = None
-    a_prob = soup.select_one("a[href*='/problem/']")
-    if a_prob:
-      pid = extract_problem_id_from_url(a_prob["href"])
-
-    # Extract subtask scores
-    subtask_scores = []
-    total_score = 0.0
-
-    for hdr in soup.select("div.card-header"):
-      title_el = hdr.select_one("h3.card-title")
-      if not title_el:
-        continue
-      title_txt = title_el.get_text(" ", strip=True)
-      if not re.search(r'^\s*Subtask\b', title_txt, flags=re.I):
-        continue
-
-      header_text = hdr.get_text(" ", strip=True)
-      m = re.search(r'(?i)score:\s*([0-9]+(?:\.[0-9]+)?)', header_text)
-      if m:
-        val = float(m.group(1))
-        subtask_scores.append(int(val) if val.is_integer() else round(val, 2))
-      else:
-        subtask_scores.append(0)
-
-    if subtask_scores:
-      total_val = sum(float(x) for x in subtask_scores)
-      total_score = int(total_val) if float(total_val).is_integer() else round(total_val, 2)
-    else:
-      score_badge = soup.select_one("a.uoj-score[data-score]")
-      if score_badge and score_badge.get("data-score"):
-        try:
-          sc = float(score_badge["data-score"])
-          total_score = int(sc) if sc.is_integer() else round(sc, 2)
-          subtask_scores = [total_score]
-        except Exception:
-          pass
+      raise Exception(f'Failed to fetch submission {sub_id}: {r.status_code}')
+    return extract.qoj_submission(r.text)
+  except Exception as e:
+    raise Exception(f'Error fetching submission {sub_id}: {e}')
 
+async def cached_submission_details(cache: DetailCache, client, sub_id: str, submitted_at: str | None = None):
+  hit = await aio.off_loop(cache.get, sub_id)
+  if hit is not None:
     return {
-      'problem_id': pid,
-      'total_score': total_score,
-      'subtask_scores': subtask_scores
+      'problem_id': None if hit['problem'] is None else int(hit['problem']),
+      'total_score': hit['total_score'],
+      'subtask_scores': hit['subtask_scores']
     }
-  except Exception as e:
-    sys.stdout.write(json.dumps({'error': f'Error fetching submission {sub_id}: {e}'}))
-    sys.exit(1)
-
-def main():
-  try:
-    data = json.loads(sys.stdin.read())
-    session = data['session']
-    username = data['username']
-    contest = data['contest']
-
-    started_at = contest['startedAt']
-    ended_at = contest['endedAt']
-
-    start_dt = iso_to_dt(started_at)
-    if ended_at is None:
-      end_dt = datetime.now(timezone.utc)
-    else:
-      end_dt = iso_to_dt(ended_at)
-
-    problems = contest['contest']['problems']
-
-    # map qoj problem id -> contest_problem_id
-    problem_id_map = {}
-    for cprob in problems:
-      cprob_id = cprob['id']
-      prob = cprob['problem']
-      for pl in prob.get('problemLinks', []):
-        if pl.get('platform') == 'qoj.ac':
-          pid = extract_problem_id_from_url(pl.get('url'))
-          if pid is not None:
-            problem_id_map[pid] = {'contest_problem_id': cprob_id}
-
-    scraper = make_scraper(session)
-
-    max_page = discover_max_page(scraper, username)
-
-    relevant = []
-    stop_pagination = False
-    for page in range(1, max_page + 1):
-      if stop_pagination:
-        break
-      url = f"{BASE}/submissions?submitter={username}&page={page}"
-      r = scraper.get(url, timeout=20)
-      if r.status_code != 200:
-        sys.stdout.write(json.dumps({'error': f'Failed to fetch submissions page: {r.status_code}'}))
-        sys.exit(1)
-
-      soup = BeautifulSoup(r.text, "html.parser")
-      server_offset = parse_server_time_offset(soup)
-      items = parse_submissions_rows_for_page(r.text, server_offset)
-
-      if not items:
-        continue
-
+  det = await fetch_submission_details(client, sub_id)
+  # subtask headers only show up once the submission is graded
+  if det['subtask_scores']:
+    await aio.off_loop(cache.put, sub_id, det['subtask_scores'], det['total_score'], submitted_at, det['problem_id'])
+  return det
+
+def contest_problem_map(contest) -> dict:
+  # map qoj problem id -> contest_problem_id
+  problem_id_map = {}
+  for cprob in contest['contest']['problems']:
+    cprob_id = cprob['id']
+    prob = cprob['problem']
+    for pl in prob.get('problemLinks', []):
+      if pl.get('platform') == 'qoj.ac':
+        pid = extract_problem_id_from_url(pl.get('url'))
+        if pid is not None:
+          problem_id_map[pid] = {'contest_problem_id': cprob_id}
+  return problem_id_map
+
+@metrics.staged("listing")
+async def fetch_listing_page(client, username: str, page: int):
+  url = f"{BASE}/submissions?submitter={username}&page={page}"
+  r = await client.get(url, timeout=20)
+  if r.status_code != 200:
+    raise Exception(f'Failed to fetch submissions page: {r.status_code}')
+  server_offset = parse_server_time_offset(r.text)
+  return parse_submissions_rows_for_page(r.text, server_offset)
+
+async def run_async(data, emit=None):
+  session = data['session']
+  username = data['username']
+  contest = data['contest']
+
+  started_at = contest['startedAt']
+  ended_at = contest['endedAt']
+
+  start_dt = iso_to_dt(started_at)
+  if ended_at is None:
+    end_dt = datetime.now(timezone.utc)
+  else:
+    end_dt = iso_to_dt(ended_at)
+
+  problem_id_map = contest_problem_map(contest)
+
+  client = aio.client(('qoj.ac', session), lambda: make_scraper(session))
+
+  async def fetch_listing(page):
+    return await fetch_listing_page(client, username, page)
+
+  # jumps straight to the pages that overlap the contest, however far back it was
+  locator = PageLocator(
+    'qoj.ac', username, fetch_listing,
+    lambda it: iso_to_dt(it['submission_time_iso']), lambda it: it['submission_id']
+  )
+
+  out = Collector(emit)
+
+  # a finished contest's window doesn't move, so a failed run can be resumed
+  checkpoint = await aio.off_loop(Checkpoint, 'qoj.ac/fetchContestScores', ended_at and [
+    username, contest['userId'], started_at, ended_at, sorted(problem_id_map)
+  ])
+  relevant = checkpoint.state.setdefault('rows', [])
+  seen = {s['submission_id'] for s in relevant}
+
+  async def listing():
+    # rows that a previous run already listed go first
+    for s in list(relevant):
+      yield s
+    # the listing still has to be read from here back to the start; None
+    # once it has (pages shift as new submissions come in, so this is a time)
+    until = checkpoint.state.get('until', dt_to_iso_utc(end_dt))
+    if until is None:
+      return
+    async for page, items in locator.walk(start_dt, iso_to_dt(until)):
+      found = []
       for it in items:
         try:
           sub_dt = iso_to_dt(it['submission_time_iso'])
-          if sub_dt < start_dt:
-            stop_pagination = True
-            break
-          if sub_dt > end_dt:
+          if sub_dt < start_dt or sub_dt > end_dt or it['submission_id'] in seen:
             continue
           pid = it['problem_id']
           if pid in problem_id_map:
-            relevant.append({
+            seen.add(it['submission_id'])
+            found.append({
               'submission_id': it['submission_id'],
               'submission_time': it['submission_time_iso'],
               'contest_problem_id': problem_id_map[pid]['contest_problem_id']
             })
         except Exception as e:
-          sys.stdout.write(json.dumps({'error': f'Error processing submission row: {e}'}))
-          sys.exit(1)
-
-      time.sleep(0.5)
-
-    def worker(s):
-      det = fetch_submission_details(scraper, s['submission_id'])
-      return {
-        'virtualContestId': contest['userId'],
-        'contestProblemId': s['contest_problem_id'],
-        'time': s['submission_time'],
-        'score': det['total_score'],
-        'subtaskScores': det['subtask_scores']
-      }
-
-    submissions_out = []
-    if relevant:
-      with ThreadPoolExecutor(max_workers=5) as ex:
-        for item in ex.map(worker, relevant):
-          if item is not None:
-            submissions_out.append(item)
-
-    submissions_out.sort(key=lambda x: x['time'])
-    sys.stdout.write(json.dumps({'submissions': submissions_out}))
-    sys.exit(0)
+          raise Exception(f'Error processing submission row: {e}')
+      relevant.extend(found)
+      checkpoint.state['until'] = items[-1]['submission_time_iso']
+      await aio.off_loop(checkpoint.save)
+      for s in found:
+        yield s
+    checkpoint.state['until'] = None
+
+  cache = DetailCache('qoj.ac')
+
+  async def worker(s):
+    det = await cached_submission_details(cache, client, s['submission_id'], s['submission_time'])
+    return {
+      'virtualContestId': contest['userId'],
+      'contestProblemId': s['contest_problem_id'],
+      'time': s['submission_time'],
+      'score': det['total_score'],
+      'subtaskScores': det['subtask_scores']
+    }
 
-  except Exception as e:
-    sys.stdout.write(json.dumps({'error': str(e)}))
-    sys.exit(1)
+  # details are fetched while the listing is still being walked
+  async for s, item, err in pipelined(listing(), worker, 5, retries=aio.ITEM_RETRIES):
+    if err is not None:
+      out.fail(err, s and s['submission_id'])
+    elif item is not None:
+      out.add(item)
+
+  # keep the listing progress for a re-run only while something is missing
+  if out.errors:
+    await aio.off_loop(checkpoint.save)
+  else:
+    await aio.off_loop(checkpoint.clear)
+  return out.result(cache=cache.stats(), listing=locator.stats(), resumed=checkpoint.resumed)
+
+async def watch_async(data, emit, stop=None):
+  session = data['session']
+  username = data['username']
+  contest = data['contest']
+
+  start_dt, end_dt = contest_window(contest)
+  problem_id_map = contest_problem_map(contest)
+  client = aio.client(('qoj.ac', session), lambda: make_scraper(session))
+  cache = DetailCache('qoj.ac')
+
+  async def pages():
+    # the page count is only needed once a poll runs past the first page
+    page, max_page = 1, None
+    while max_page is None or page <= max_page:
+      rows = []
+      for it in await fetch_listing_page(client, username, page):
+        sub_dt = iso_to_dt(it['submission_time_iso'])
+        pid = it['problem_id']
+        rows.append({
+          'submission_id': it['submission_id'],
+          'submission_time': it['submission_time_iso'],
+          'contest_problem_id': problem_id_map.get(pid, {}).get('contest_problem_id'),
+          'relevant': pid in problem_id_map and sub_dt <= end_dt,
+          'before_start': sub_dt < start_dt,
+        })
+      yield rows
+      if max_page is None:
+        max_page = await discover_max_page(client, username)
+      page += 1
+
+  async def details(s):
+    det = await cached_submission_details(cache, client, s['submission_id'], s['submission_time'])
+    if not det['subtask_scores']:
+      return JUDGING
+    return {
+      'virtualContestId': contest['userId'],
+      'contestProblemId': s['contest_problem_id'],
+      'time': s['submission_time'],
+      'score': det['total_score'],
+      'subtaskScores': det['subtask_scores']
+    }
+
+  watcher = ContestWatch(pages, details, end_dt, emit, data.get('interval'), stop=stop)
+  await watcher.run()
+  return watcher.result(cache=cache.stats())
+
+@metrics.instrument
+def run(data, emit=None):
+  return aio.run(run_async(data, emit))
+
+@metrics.instrument
+def watch(data, emit):
+  return aio.run(watch_async(data, emit))
+
+def main():
+  cli_main(run, watch)
 
 if __name__ == '__main__':
   main()
\ No newline at end of file
@@ -1,38 +1,55 @@
 #!/usr/bin/env python3
+import os
 import sys
 import json
 import re
-import time
+import itertools
+import hashlib
 from datetime import datetime, timezone, timedelta
-from concurrent.futures import ThreadPoolExecutor
 import cloudscraper
-from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import aio, dom, extract, metrics, cookies, problem_index
+from common.aggregate import BestScores
+from common.cache import DetailCache
+from common.listing import fetch_pages
+from common.pipeline import pipelined
+from common.planner import SaturationPlanner
 
 BASE = "https://qoj.ac"
 
-def _iso_to_dt(iso_str: str) -> datetime:
-  return datetime.fromisoformat(iso_str.replace('Z', '+00:00')).astimezone(timezone.utc)
+SERVER_TIME_RE = re.compile(r"Server Time:\s*(\d{4}-\d{2}-\d{2})\s+(\d{2}:\d{2}:\d{2})")
+
+PENDING_RE = re.compile(r"\b(Waiting|Judging|Compiling|Pending)\b", re.I)
+
+ACCEPTED_RE = re.compile(r"^\s*(AC|Accepted)\s*$", re.I)
 
 def _dt_to_iso_utc(dt: datetime) -> str:
   return dt.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
 
+def _make_scraper(cookie: str):
+  s = cloudscraper.create_scraper()
+  s.cookies.set(name="UOJSESSID", value=cookie, domain="qoj.ac", path="/")
+  # the same User-Agent as the other qoj scripts, so they share a clearance
+  s.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"})
+  cookies.attach(s, "qoj.ac")
+  return s
+
 def _extract_problem_id_from_url(url: str) -> int | None:
   m = re.search(r'/problem/(\d+)', url)
   return int(m.group(1)) if m else None
 
-def _parse_server_time_offset(soup: BeautifulSoup) -> timedelta:
-  p_tag = soup.find("p", string=re.compile(r"Server Time:\s*\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}"))
-  if not p_tag:
-    return timedelta(0)
-  m = re.search(r"Server Time:\s*([0-9:\-\s]{19})", p_tag.get_text(" ", strip=True))
+def _parse_server_time_offset(html: str) -> timedelta:
+  # read straight off the raw page so the listing only needs its table parsed
+  m = SERVER_TIME_RE.search(html)
   if not m:
     return timedelta(0)
-  server_naive = datetime.strptime(m.group(1), "%Y-%m-%d %H:%M:%S")
+  server_naive = datetime.strptime(f"{m.group(1)} {m.group(2)}", "%Y-%m-%d %H:%M:%S")
   now_utc = datetime.utcnow()
   return server_naive - now_utc
 
 def _parse_submissions_rows_for_page(html: str, server_offset: timedelta):
-  soup = BeautifulSoup(html, "html.parser")
+  soup = dom.parse(html, "table")
   rows = soup.select("table tbody tr")
   results = []
   for row in rows:
@@ -50,79 +67,73 @@ def _parse_submissions_rows_for_page(html: str, server_offset: timedelta):
       if pid is None:
         continue
 
-      smalls = row.find_all("small")
+      smalls = row.select("small")
       if not smalls:
         continue
       tstr = smalls[0].get_text(strip=True)
       local_naive = datetime.strptime(tstr, "%Y-%m-%d %H:%M:%S")
       dt_utc = (local_naive - server_offset).replace(tzinfo=timezone.utc)
 
+      # the score badge carries the problem's maximum as data-max; an
+      # accepted badge without one still means full marks
+      score = maximum = None
+      full = False
+      badge = row.select_one("a.uoj-score[data-score]")
+      if badge:
+        try:
+          score = float(badge["data-score"])
+          if badge.get("data-max"):
+            maximum = float(badge["data-max"])
+        except ValueError:
+          pass
+        full = bool(ACCEPTED_RE.match(badge.get_text()))
+
       results.append({
         "submission_id": sub_id,
         "problem_id": pid,
         "submission_time_iso": _dt_to_iso_utc(dt_utc),
+        "score": score,
+        "max": maximum,
+        "full": full,
+        "pending": bool(PENDING_RE.search(row.get_text(" ", strip=True))),
       })
     except Exception:
       continue
   return results, soup
 
-def _fetch_submission_details(scraper, sub_id: str):
+@metrics.staged("details")
+async def _fetch_submission_details(client, sub_id: str):
   url = f"{BASE}/submission/{sub_id}"
-  r = scraper.get(url, timeout=20)
-  if r.status_code != 200:
+  r = await client.get(url, timeout=20)
+  # a deleted submission is skipped; anything else is worth another try
+  if r.status_code == 404:
     return None
-  soup = BeautifulSoup(r.text, "html.parser")
-
-  pid = None
-  a_prob = soup.select_one("a[href*='/problem/']")
-  if a_prob:
-    pid = _extract_problem_id_from_url(a_prob["href"])
-
-  subtask_scores = []
-  total_score = 0.0
-
-  for hdr in soup.select("div.card-header"):
-    title_el = hdr.select_one("h3.card-title")
-    if not title_el:
-      continue
-    title_txt = title_el.get_text(" ", strip=True)
-    if not re.search(r'^\s*Subtask\b', title_txt, flags=re.I):
-      continue
-
-    header_text = hdr.get_text(" ", strip=True)
-    m = re.search(r'(?i)score:\s*([0-9]+(?:\.[0-9]+)?)', header_text)
-    if m:
-      val = float(m.group(1))
-      subtask_scores.append(int(val) if val.is_integer() else round(val, 2))
-    else:
-      subtask_scores.append(0)
-
-  if subtask_scores:
-    total_val = sum(float(x) for x in subtask_scores)
-    total_score = int(total_val) if float(total_val).is_integer() else round(total_val, 2)
-  else:
-    score_badge = soup.select_one("a.uoj-score[data-score]")
-    if score_badge and score_badge.get("data-score"):
-      try:
-        sc = float(score_badge["data-score"])
-        total_score = int(sc) if sc.is_integer() else round(sc, 2)
-        subtask_scores = [total_score]
-      except Exception:
-        pass
-
-  return {
-    "submission_id": sub_id,
-    "problem_id": pid,
-    "subtask_scores": subtask_scores,
-    "total_score": total_score,
-  }
-
-def _discover_max_page(scraper, username: str) -> int:
+  if r.status_code != 200:
+    raise Exception(f"Failed to fetch submission {sub_id}: {r.status_code}")
+  return {"submission_id": sub_id, **extract.qoj_submission(r.text)}
+
+async def _cached_submission_details(cache: DetailCache, client, sub_id: str, submitted_at: str | None = None):
+  hit = await aio.off_loop(cache.get, sub_id)
+  if hit is not None:
+    return {
+      "submission_id": sub_id,
+      "problem_id": None if hit["problem"] is None else int(hit["problem"]),
+      "subtask_scores": hit["subtask_scores"],
+      "total_score": hit["total_score"],
+    }
+  det = await _fetch_submission_details(client, sub_id)
+  # subtask headers only show up once the submission is graded
+  if det and det["subtask_scores"]:
+    await aio.off_loop(cache.put, sub_id, det["subtask_scores"], det["total_score"], submitted_at, det["problem_id"])
+  return det
+
+@metrics.staged("discover")
+async def _discover_max_page(client, username: str) -> int:
   url = f"{BASE}/submissions?submitter={username}&page=10000000"
-  r = scraper.get(url, timeout=20)
+  r = await client.get(url, timeout=20)
   if r.status_code != 200:
     return 1
-  soup = BeautifulSoup(r.text, "html.parser")
+  soup = dom.parse(r.text)
 
   active = soup.select_one("li.page-item.active a.page-link")
   if active:
@@ -140,130 +151,153 @@ def _discover_max_page(scraper, username: str) -> int:
       continue
   return max_page
 
-def main():
-  try:
-    data = json.loads(sys.stdin.read())
-    cookie = data.get("cookie")
-    username = data.get("username")
-    problems = data.get("problems", [])
-
-    # map qoj problem IDs from provided problems
-    problem_map = {}
-    for p in problems:
-      link = None
-      for entry in p.get("problemLinks", []):
-        if entry.get("platform") == "qoj.ac":
-          link = entry.get("url")
+async def run_async(data):
+  cookie = data.get("cookie")
+  username = data.get("username")
+
+  # qoj problem id -> {"id", "link"}
+  problem_map = problem_index.resolve(data, "qoj.ac", _extract_problem_id_from_url).problems
+
+  if not problem_map:
+    return {"scores": []}
+
+  # high-water mark from the previous sync: every submission up to
+  # lastSubmissionId is already folded into the stored best vectors
+  # it is only valid for the same account and the same tracked problem set,
+  # otherwise older submissions on newly tracked problems would be skipped
+  problem_set = hashlib.sha1(",".join(map(str, sorted(problem_map))).encode()).hexdigest()
+  cursor = data.get("cursor") or {}
+  if cursor.get("username") != username or cursor.get("problemSet") != problem_set:
+    cursor = {}
+  since_id = int(cursor.get("lastSubmissionId") or 0)
+
+  client = aio.client(("qoj.ac", cookie), lambda: _make_scraper(cookie))
+
+  # listing is newest first, so with a cursor we just page until we reach it
+  max_page = None if since_id else await _discover_max_page(client, username)
+
+  cache = DetailCache("qoj.ac")
+  # the stored best vectors; new submissions are folded in as they arrive
+  best = BestScores()
+  best.load(cursor.get("problems"), int)
+  planner = SaturationPlanner("problem_id", best=best, maxima={int(k): v for k, v in (cursor.get("maxima") or {}).items()})
+  newest_id = since_id
+  oldest_pending = None
+  failed = []
+  prev_first = None
+
+  @metrics.staged("listing")
+  async def fetch_listing(page):
+    url = f"{BASE}/submissions?submitter={username}&page={page}"
+    r = await client.get(url, timeout=20)
+    # a page that can't be read must fail the sync: the cursor would
+    # otherwise move past every submission on it and the pages after it
+    if r.status_code != 200:
+      raise Exception(f"Failed to fetch submissions page: {r.status_code}")
+    server_offset = _parse_server_time_offset(r.text)
+    items, _ = _parse_submissions_rows_for_page(r.text, server_offset)
+    return items
+
+  # with a known page count the listing is fetched in parallel; a cursor
+  # walk stays sequential so that it can stop after the first page
+  if max_page is None:
+    listing = fetch_pages(fetch_listing, itertools.count(1), concurrency=1)
+  else:
+    listing = fetch_pages(fetch_listing, range(1, max_page + 1))
+
+  async def rows():
+    nonlocal newest_id, oldest_pending, prev_first
+    async for page, items in listing:
+      if not items:
+        if max_page is None:
           break
-      pid = _extract_problem_id_from_url(link or "")
-      if pid is not None:
-        problem_map[pid] = {"id": p.get("id"), "link": link}
+        continue
 
-    if not problem_map:
-      sys.stdout.write(json.dumps({"scores": []}))
-      sys.exit(0)
+      # qoj serves the last page again for out-of-range page numbers
+      if items[0]['submission_id'] == prev_first:
+        break
+      prev_first = items[0]['submission_id']
 
-    scraper = cloudscraper.create_scraper()
-    scraper.cookies.set(name="UOJSESSID", value=cookie, domain="qoj.ac", path="/")
-    scraper.headers.update({"User-Agent": "Mozilla/5.0"})
+      fresh = [it for it in items if int(it['submission_id']) > since_id]
+      for it in fresh:
+        sid = int(it['submission_id'])
+        newest_id = max(newest_id, sid)
+        if it['pending'] and (oldest_pending is None or sid < oldest_pending):
+          oldest_pending = sid
 
-    max_page = _discover_max_page(scraper, username)
+      # still-judging submissions are left for the next sync
+      relevant = [it for it in fresh if it.get('problem_id') in problem_map and not it['pending']]
 
-    detailed_submissions = []
-    for page in range(1, max_page + 1):
-      url = f"{BASE}/submissions?submitter={username}&page={page}"
-      r = scraper.get(url, timeout=20)
-      if r.status_code != 200:
+      # problems at full marks need no more details; the most promising
+      # submission of each problem goes first so that it can prune the rest
+      wave, rest = planner.split(relevant)
+      for it in wave + rest:
+        yield it
+
+      if len(fresh) < len(items):
         break
 
-      soup = BeautifulSoup(r.text, "html.parser")
-      server_offset = _parse_server_time_offset(soup)
+  async def _worker(sub_info):
+    # the problem may have reached full marks since this row was queued
+    if not planner.useful([sub_info]):
+      return None
+    det = await _cached_submission_details(cache, client, sub_info['submission_id'], sub_info['submission_time_iso'])
+    if not det:
+      return None
+    pid = det['problem_id'] if det['problem_id'] is not None else sub_info['problem_id']
+    return {
+      'submission_id': sub_info['submission_id'],
+      'submission_time': sub_info['submission_time_iso'],
+      'problem_id': pid,
+      'total_score': det.get('total_score', 0),
+      'subtask_scores': det.get('subtask_scores') or [],
+      'full': sub_info['full'],
+    }
+
+  # details are fetched while later listing pages are still loading
+  async for sub_info, res, err in pipelined(rows(), _worker, 6, retries=aio.ITEM_RETRIES):
+    if sub_info is None:
+      # the listing failed part way; no cursor is returned for it
+      raise err
+    if err is not None:
+      failed.append(int(sub_info['submission_id']))
+    elif res and res['problem_id'] in problem_map:
+      planner.observe(res['problem_id'], res['subtask_scores'], res['submission_time'], res['full'])
+  # cancels listing pages still in flight after an early stop
+  await listing.aclose()
+
+  results = [
+    {"problemId": problem_map[pid]["id"], "score": round(best.total(pid), 2)}
+    for pid in best if pid in problem_map
+  ]
+
+  # never move the mark past a submission that is still being judged, or
+  # whose details couldn't be fetched; the next sync picks those up again
+  for held in (oldest_pending, min(failed, default=None)):
+    if held is not None:
+      newest_id = max(since_id, min(newest_id, held - 1))
+
+  new_cursor = {
+    "username": username,
+    "problemSet": problem_set,
+    "lastSubmissionId": newest_id,
+    "problems": best.dump(),
+    "maxima": {str(pid): m for pid, m in planner.maxima.items()},
+  }
 
-      items, _ = _parse_submissions_rows_for_page(r.text, server_offset)
-      if not items:
-        continue
+  return {"scores": results, "cursor": new_cursor, "failed": sorted(failed), "cache": cache.stats(), "pruned": planner.pruned}
 
-      relevant = [it for it in items if it.get('problem_id') in problem_map]
-
-      if relevant:
-        def _worker(sub_info):
-          try:
-            det = _fetch_submission_details(scraper, sub_info['submission_id'])
-            if not det:
-              return None
-            pid = det['problem_id'] if det['problem_id'] is not None else sub_info['problem_id']
-            return {
-              'submission_id': sub_info['submission_id'],
-              'submission_time': sub_info['submission_time_iso'],
-              'problem_id': pid,
-              'total_score': det.get('total_score', 0),
-              'subtask_scores': det.get('subtask_scores') or [],
-            }
-          except Exception:
-            return None
-
-        with ThreadPoolExecutor(max_workers=6) as ex:
-          for res in ex.map(_worker, relevant):
-            if res:
-              detailed_submissions.append(res)
-            time.sleep(0.05)
-
-      time.sleep(0.2)
-
-    # aggregate exactly like the original
-    problem_best = {}
-    for sub in detailed_submissions:
-      pid = sub['problem_id']
-      if pid not in problem_map:
-        continue
-      if pid not in problem_best:
-        problem_best[pid] = {
-          'total_score': float(sum(sub['subtask_scores'])) if isinstance(sub['subtask_scores'], list) else float(sub['total_score'] or 0),
-          'subtask_scores': [float(x) for x in (sub['subtask_scores'] or [])],
-          'earliest_improvement_time': sub['submission_time'],
-        }
-      else:
-        cur = problem_best[pid]
-        a = cur['subtask_scores']
-        b = [float(x) for x in (sub['subtask_scores'] or [])]
-        max_len = max(len(a), len(b))
-        merged = []
-        improved_any = False
-        for i in range(max_len):
-          va = a[i] if i < len(a) else 0.0
-          vb = b[i] if i < len(b) else 0.0
-          if vb > va:
-            improved_any = True
-          merged.append(vb if vb > va else va)
-        new_total = float(sum(merged))
-        if new_total > cur['total_score']:
-          t_old = _iso_to_dt(cur['earliest_improvement_time'])
-          t_new = _iso_to_dt(sub['submission_time'])
-          earliest = _dt_to_iso_utc(min(t_old, t_new))
-          problem_best[pid] = {
-            'total_score': new_total,
-            'subtask_scores': merged,
-            'earliest_improvement_time': earliest,
-          }
-        else:
-          if improved_any:
-            t_old = _iso_to_dt(cur['earliest_improvement_time'])
-            t_new = _iso_to_dt(sub['submission_time'])
-            if t_new < t_old:
-              cur['earliest_improvement_time'] = _dt_to_iso_utc(t_new)
-            cur['subtask_scores'] = merged
-
-    results = []
-    for pid, best in problem_best.items():
-      prob = problem_map[pid]
-      results.append({"problemId": prob["id"], "score": round(best['total_score'], 2)})
-
-    sys.stdout.write(json.dumps({"scores": results}))
-    sys.exit(0)
+@metrics.instrument
+def run(data):
+  return aio.run(run_async(data))
 
+def main():
+  try:
+    out = run(json.loads(sys.stdin.read()))
   except Exception as e:
-    sys.stdout.write(json.dumps({"error": str(e)}))
-    sys.exit(1)
+    out = {"error": str(e)}
+  sys.stdout.write(json.dumps(out))
+  sys.exit(1 if "error" in out else 0)
 
 if __name__ == "__main__":
   main()
\ No newline at end of file
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
+import os
 import sys
 import json
 import re
 import cloudscraper
-from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import aio, dom, metrics, cookies
 
 BASE = "https://qoj.ac"
 
@@ -13,9 +16,10 @@ def make_scraper(session_id: str):
   s.headers.update({
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
   })
+  cookies.attach(s, "qoj.ac")
   return s
 
-def is_logged_in(soup: BeautifulSoup) -> bool:
+def is_logged_in(soup) -> bool:
   if soup.select_one('a.nav-link[href="//qoj.ac/login"]'):
     return False
   if soup.select_one('span.uoj-username'):
@@ -24,7 +28,7 @@ def is_logged_in(soup: BeautifulSoup) -> bool:
     return True
   return False
 
-def extract_username(soup: BeautifulSoup, html: str) -> str | None:
+def extract_username(soup, html: str) -> str | None:
   badge = soup.select_one('span.uoj-username')
   if badge:
     name = (badge.get('data-nickname') or badge.get_text(strip=True) or '').strip()
@@ -35,36 +39,37 @@ def extract_username(soup: BeautifulSoup, html: str) -> str | None:
     return m.group(1).strip()
   return None
 
-def main():
-  try:
-    data = json.loads(sys.stdin.read())
-    session = data.get("session")
-    if not session:
-      sys.stdout.write(json.dumps({"error": "Missing session"}))
-      sys.exit(1)
+async def run_async(data):
+  session = data.get("session")
+  if not session:
+    return {"error": "Missing session"}
 
-    scraper = make_scraper(session)
-    resp = scraper.get(BASE, timeout=10)
-    if resp.status_code != 200:
-      sys.stdout.write(json.dumps({"error": f"HTTP {resp.status_code}"}))
-      sys.exit(1)
+  client = aio.client(("qoj.ac", session), lambda: make_scraper(session))
+  resp = await client.get(BASE, timeout=10)
+  if resp.status_code != 200:
+    return {"error": f"HTTP {resp.status_code}"}
 
-    soup = BeautifulSoup(resp.text, "html.parser")
-    if not is_logged_in(soup):
-      sys.stdout.write(json.dumps({"error": "Invalid session"}))
-      sys.exit(1)
+  soup = dom.parse(resp.text)
+  if not is_logged_in(soup):
+    return {"error": "Invalid session"}
 
-    username = extract_username(soup, resp.text)
-    if not username:
-      sys.stdout.write(json.dumps({"error": "Could not extract username"}))
-      sys.exit(1)
+  username = extract_username(soup, resp.text)
+  if not username:
+    return {"error": "Could not extract username"}
 
-    sys.stdout.write(json.dumps({"username": username}))
-    sys.exit(0)
+  return {"username": username}
 
+@metrics.instrument
+def run(data):
+  return aio.run(run_async(data))
+
+def main():
+  try:
+    out = run(json.loads(sys.stdin.read()))
   except Exception as e:
-    sys.stdout.write(json.dumps({"error": str(e)}))
-    sys.exit(1)
+    out = {"error": str(e)}
+  sys.stdout.write(json.dumps(out))
+  sys.exit(1 if "error" in out else 0)
 
 if __name__ == "__main__":
   main()
\ No newline at end of file
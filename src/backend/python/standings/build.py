@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Compile data/contests into the standings index read by standings/index.py.
+
+For every contest YAML with a scores file next to it (scores_<year>.json,
+or scores_<year>.enc for private contests), the index stores the sorted
+totals, each problem's sorted scores, the average and the medal cutoffs,
+with how many contestants reached each.
+
+  python3 standings/build.py [--out PATH]
+
+Encrypted scores are included when the `cryptography` package is installed
+and ENCRYPTION_KEY is set (the same hex key the contest sync uses);
+otherwise they are skipped with a warning, as the sync does.
+"""
+import os
+import sys
+import json
+import array
+import base64
+import argparse
+import importlib.util
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from standings.index import ROOT, INDEX_PATH, MAGIC, VERSION, HEADER, DATA_START, contest_key
+
+CONTESTS_DIR = os.path.join(ROOT, "data", "contests")
+
+def decrypt(payload: str) -> str | None:
+  key = os.environ.get("ENCRYPTION_KEY")
+  if not key or importlib.util.find_spec("cryptography") is None:
+    return None
+  from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+  data = base64.b64decode(payload)
+  iv, tag, encrypted = data[:12], data[12:28], data[28:]
+  try:
+    return AESGCM(bytes.fromhex(key)).decrypt(iv, encrypted + tag, None).decode("utf-8")
+  except Exception:
+    return None
+
+def read_scores(dir_: str, stem: str):
+  """(per-problem score lists, private) for the contest file `stem`, or (None, False)."""
+  json_path = os.path.join(dir_, f"scores_{stem}.json")
+  enc_path = os.path.join(dir_, f"scores_{stem}.enc")
+  if os.path.exists(json_path):
+    if os.path.exists(enc_path):
+      raise Exception(f"unencrypted .json exists at {json_path}")
+    with open(json_path, encoding="utf-8") as f:
+      return json.load(f), False
+  if os.path.exists(enc_path):
+    with open(enc_path, encoding="utf-8") as f:
+      text = decrypt(f.read())
+    if text is None:
+      sys.stderr.write(f"[warn] skipping {enc_path}: no cryptography package or valid ENCRYPTION_KEY\n")
+      return None, False
+    return json.loads(text), True
+  return None, False
+
+def contest_files():
+  """(source, year, stage, directory, file stem) for every contest YAML."""
+  for source in sorted(os.listdir(CONTESTS_DIR)):
+    dir_ = os.path.join(CONTESTS_DIR, source)
+    if not os.path.isdir(dir_):
+      continue
+    for name in sorted(os.listdir(dir_)):
+      path = os.path.join(dir_, name)
+      if name.endswith(".yaml") and os.path.isfile(path):
+        yield source, int(name[:-5]), None, dir_, name[:-5]
+      elif os.path.isdir(path):
+        # source/year/stage.yaml
+        for stage in sorted(os.listdir(path)):
+          if stage.endswith(".yaml"):
+            yield source, int(name), stage[:-5], path, stage[:-5]
+
+def compile_contest(contest: dict, scores: dict) -> tuple:
+  """(totals, per-problem arrays, average, medals) for one contest."""
+  problems = [scores[k] for k in sorted(scores, key=int)]
+  # totals as the stats route adds them: one per entry of the first problem
+  n = len(problems[0]) if problems else 0
+  totals = [
+    sum((arr[i] if i < len(arr) and arr[i] is not None else 0) for arr in problems)
+    for i in range(n)
+  ]
+  medals = []
+  for name, cutoff in (contest.get("medalCutoffs") or {}).items():
+    cutoff = float(cutoff)
+    medals.append({"name": name, "cutoff": cutoff, "count": sum(t >= cutoff for t in totals)})
+  return (
+    sorted(totals),
+    [sorted(s for s in arr if s is not None) for arr in problems],
+    sum(totals) / n if n else 0.0,
+    medals,
+  )
+
+def build(out: str = INDEX_PATH) -> int:
+  """Write the index to `out`; returns the number of contests in it."""
+  directory = {}
+  blobs = []
+  offset = DATA_START
+
+  def place(values) -> int:
+    nonlocal offset
+    a = array.array("d", values)
+    if sys.byteorder != "little":
+      a.byteswap()
+    blobs.append(a.tobytes())
+    start = offset
+    offset += len(blobs[-1])
+    return start
+
+  for source, year, stage, dir_, stem in contest_files():
+    scores, private = read_scores(dir_, stem)
+    if not scores:
+      continue
+    with open(os.path.join(dir_, stem + ".yaml"), encoding="utf-8") as f:
+      contest = yaml.safe_load(f) or {}
+    totals, problems, average, medals = compile_contest(contest, scores)
+    directory[contest_key(source, year, stage)] = {
+      "name": contest.get("name"),
+      "source": source,
+      "year": year,
+      "stage": stage.replace("_", " ") if stage else None,
+      "private": private,
+      "participants": len(totals),
+      "average": average,
+      "medals": medals,
+      "totals": place(totals),
+      "problems": [[place(arr), len(arr)] for arr in problems],
+    }
+
+  dir_bytes = json.dumps({"contests": directory}, separators=(",", ":")).encode("utf-8")
+  os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+  # write aside and rename, so a reader never maps a half-written file
+  tmp = f"{out}.{os.getpid()}.tmp"
+  with open(tmp, "wb") as f:
+    f.write(HEADER.pack(MAGIC, VERSION, len(directory), offset, len(dir_bytes)).ljust(DATA_START, b"\0"))
+    for blob in blobs:
+      f.write(blob)
+    f.write(dir_bytes)
+  os.replace(tmp, out)
+  return len(directory)
+
+def main():
+  ap = argparse.ArgumentParser(description="Compile data/contests score distributions into the standings index.")
+  ap.add_argument("--out", default=INDEX_PATH, help=f"index file to write (default {INDEX_PATH})")
+  args = ap.parse_args()
+  n = build(args.out)
+  print(f"[ok] {n} contests -> {args.out}")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,146 @@
+"""
+Read side of the compiled contest standings (see standings/build.py).
+
+The index file is a small header, then every contest's sorted totals and
+per-problem scores as little-endian float64 arrays, then a JSON directory
+describing where each array lives. Opening it maps the file and parses only
+the directory; lookups bisect straight over the mapped arrays.
+
+  idx = load()
+  c = idx.get("ioi", 2023)
+  c.standing([100, 64, 37, 100, 12, 0])
+  # {"total": 313.0, "rank": 41, "ranks": [...], "percentile": ..., "medal": "gold", ...}
+
+Ranks follow the stats route: 1 + the number of contestants who scored
+strictly more. A medal is the first cutoff, in the contest YAML's order,
+that the total reaches.
+"""
+import os
+import sys
+import json
+import mmap
+import array
+import struct
+import bisect
+import threading
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", ".."))
+INDEX_PATH = os.environ.get("STANDINGS_INDEX") or os.path.join(ROOT, ".cache", "standings.idx")
+
+MAGIC = b"OISTAND\0"
+VERSION = 1
+# magic, version, contests, directory offset, directory length
+HEADER = struct.Struct("<8sIIQQ")
+DATA_START = 64
+
+def contest_key(source: str, year: int, stage: str | None = None) -> str:
+  key = f"{source}/{year}"
+  return f"{key}/{stage.replace(' ', '_')}" if stage else key
+
+class Contest:
+  """One contest's score distribution; arrays are views into the mapped file."""
+
+  def __init__(self, meta: dict, totals, problems: list):
+    self.meta = meta
+    self.totals = totals
+    self.problems = problems
+    self.participants = len(totals)
+
+  @property
+  def name(self) -> str:
+    return self.meta["name"]
+
+  def rank(self, total: float) -> int:
+    return self.participants - bisect.bisect_right(self.totals, total) + 1
+
+  def problem_rank(self, i: int, score: float) -> int:
+    arr = self.problems[i]
+    return len(arr) - bisect.bisect_right(arr, score) + 1
+
+  def percentile(self, total: float) -> float:
+    """Share of contestants the total ties or beats, 0-100, as shown on the contest page."""
+    if not self.participants:
+      return 0.0
+    return (self.participants - self.rank(total) + 1) / self.participants * 100
+
+  def medal(self, total: float) -> str | None:
+    for m in self.meta["medals"]:
+      if total >= m["cutoff"]:
+        return m["name"]
+    return None
+
+  def standing(self, scores: list) -> dict:
+    """Everything the contest page shows for a per-problem score vector."""
+    scores = [float(s or 0) for s in scores]
+    total = sum(scores)
+    return {
+      "total": total,
+      "rank": self.rank(total),
+      "ranks": [self.problem_rank(i, s) for i, s in enumerate(scores) if i < len(self.problems)],
+      "percentile": self.percentile(total),
+      "medal": self.medal(total),
+      "average": self.meta["average"],
+      "participants": self.participants,
+    }
+
+class Index:
+  def __init__(self, path: str = INDEX_PATH):
+    self.path = path
+    with open(path, "rb") as f:
+      self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, count, dir_offset, dir_length = HEADER.unpack_from(self._map, 0)
+    if magic != MAGIC or version != VERSION:
+      self._map.close()
+      raise Exception(f"{path} is not a version {VERSION} standings index; rebuild it with standings/build.py")
+    self._dir = json.loads(self._map[dir_offset:dir_offset + dir_length])
+    self._view = memoryview(self._map)
+    self._contests = {}
+
+  def _array(self, offset: int, length: int):
+    view = self._view[offset:offset + 8 * length].cast("d")
+    if sys.byteorder == "little":
+      return view
+    a = array.array("d", view)
+    a.byteswap()
+    return a
+
+  def get(self, source: str, year: int, stage: str | None = None) -> Contest | None:
+    key = contest_key(source, year, stage)
+    c = self._contests.get(key)
+    if c is None:
+      meta = self._dir["contests"].get(key)
+      if meta is None:
+        return None
+      c = self._contests[key] = Contest(
+        meta,
+        self._array(meta["totals"], meta["participants"]),
+        [self._array(offset, length) for offset, length in meta["problems"]],
+      )
+    return c
+
+  def keys(self) -> list:
+    return list(self._dir["contests"])
+
+  def __len__(self) -> int:
+    return len(self._dir["contests"])
+
+  def close(self):
+    """Unmap the file; Contests taken from this index can't be used afterwards."""
+    for c in self._contests.values():
+      for arr in [c.totals, *c.problems]:
+        if isinstance(arr, memoryview):
+          arr.release()
+    self._contests.clear()
+    self._view.release()
+    self._map.close()
+
+_index = None
+_lock = threading.Lock()
+
+def load(path: str | None = None) -> Index:
+  """The index at `path` (default INDEX_PATH), opened once per process."""
+  global _index
+  with _lock:
+    if _index is None or (path and _index.path != path):
+      _index = Index(path or INDEX_PATH)
+    return _index
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Long-lived sync worker.
+
+Reads one JSON job per line from stdin:
+  {"id": 1, "platform": "qoj", "job": "fetchProblemScores", "data": {...}}
+and writes one JSON line per finished job to stdout:
+  {"id": 1, "result": {...}}
+
+A job sent with "stream": true (contest fetchers only) additionally gets
+  {"id": 1, "event": {"submission": {...}}}
+lines as results become ready, and its final result is a {"summary": ...}.
+With "watch": true a contest fetcher instead follows a running contest,
+streaming the same events plus a {"poll": ...} after each poll, and only
+sends its summary once the contest is over. Watches run as tasks on the
+shared event loop rather than on the job threads, so a long contest doesn't
+hold one; {"id": 1, "cancel": true} stops watch 1 after its current poll,
+and its summary then carries "cancelled": true.
+A non-streaming job whose data carries "sink": {"userId": ...} has its
+result written straight into the app database (see common/sink.py).
+
+Jobs run concurrently on a thread pool and may finish out of order; their HTTP
+requests all run on one shared event loop (see common/aio.py). Modules are
+imported once and scraper sessions are pooled (see common/sessions.py), so
+cloudscraper sessions, cookies and keep-alive connections stay warm between jobs.
+"""
+import os
+import sys
+import json
+import asyncio
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import aio, sink
+
+JOBS = {
+  "ojuz": {"verify", "fetchProblemScores", "fetchContestScores"},
+  "qoj": {"verify", "fetchProblemScores", "fetchContestScores", "refresh"},
+  "codechef": {"verify", "fetchProblemScores", "fetchContestScores"},
+}
+
+MAX_WORKERS = int(os.environ.get("SYNC_WORKER_THREADS", "16"))
+
+_out_lock = threading.Lock()
+
+# job id -> stop event of a running watch; only touched from the main thread
+# and from the watch's done callback, under _watch_lock
+_watches = {}
+_watch_lock = threading.Lock()
+
+def emit(obj):
+  line = json.dumps(obj)
+  with _out_lock:
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+def load(platform: str, job: str):
+  if job not in JOBS.get(platform, ()):
+    raise Exception(f"Unknown job {platform}/{job}")
+  return importlib.import_module(f"{platform}.{job}")
+
+def handle(req):
+  job_id = req.get("id")
+  try:
+    module = load(req.get("platform"), req.get("job"))
+    if req.get("stream"):
+      result = module.run(req.get("data") or {}, emit=lambda event: emit({"id": job_id, "event": event}))
+    else:
+      data = req.get("data") or {}
+      result = module.run(data)
+      if data.get("sink"):
+        result = sink.write(req.get("job"), data["sink"], result)
+  except Exception as e:
+    result = {"error": str(e)}
+  emit({"id": job_id, "result": result})
+
+def start_watch(req):
+  job_id = req.get("id")
+  try:
+    module = load(req.get("platform"), req.get("job"))
+    if not hasattr(module, "watch_async"):
+      raise Exception(f"{req.get('platform')}/{req.get('job')} can't watch")
+  except Exception as e:
+    emit({"id": job_id, "result": {"error": str(e)}})
+    return
+
+  stop = asyncio.Event()
+
+  def done(future):
+    with _watch_lock:
+      _watches.pop(job_id, None)
+    try:
+      result = future.result()
+    except Exception as e:
+      result = {"error": str(e)}
+    emit({"id": job_id, "result": result})
+
+  with _watch_lock:
+    _watches[job_id] = stop
+  future = aio.spawn(module.watch_async(req.get("data") or {}, lambda event: emit({"id": job_id, "event": event}), stop))
+  future.add_done_callback(done)
+
+def cancel_watch(job_id):
+  with _watch_lock:
+    stop = _watches.get(job_id)
+  if stop is not None:
+    aio.call_soon(stop.set)
+
+def main():
+  # import everything up front so the first job doesn't pay for it
+  for platform, jobs in JOBS.items():
+    for job in jobs:
+      load(platform, job)
+
+  with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+    for line in sys.stdin:
+      line = line.strip()
+      if not line:
+        continue
+      try:
+        req = json.loads(line)
+      except Exception as e:
+        emit({"id": None, "result": {"error": f"Malformed request: {e}"}})
+        continue
+      if req.get("cancel"):
+        cancel_watch(req.get("id"))
+      elif req.get("watch"):
+        start_watch(req)
+      else:
+        ex.submit(handle, req)
+
+if __name__ == "__main__":
+  main()
@@ -1,5 +1,6 @@
 import createError from 'http-errors';
 import { db } from '@db';
+import { SqliteSink } from '@config';
 import { FastifyInstance } from 'fastify';
 import { codechef as codechefApi } from '@bridge';
 
@@ -52,10 +53,22 @@ export async function codechef(app: FastifyInstance) {
     if (!settings.platformUsernames || !settings.platformUsernames['codechef']) {
       throw new createError.BadRequest('codechef username not set');
     }
-    let results = await codechefApi.fetchProblemScores(cookie, settings.platformUsernames['codechef'], problems);
+    let cursor = await db.syncCursor.findUnique({ where: { userId_platform: { userId, platform: 'codechef' } } });
+    let results = await codechefApi.fetchProblemScores(cookie, settings.platformUsernames['codechef'], problems, cursor?.cursor, SqliteSink ? { userId } : undefined);
     if (results.error) {
       throw new createError.Forbidden(results.error);
     }
+    if (results.sunk) {
+      // the worker already wrote the scores (and cursor)
+      return { success: true };
+    }
+    if (results.cursor) {
+      await db.syncCursor.upsert({
+        where: { userId_platform: { userId, platform: 'codechef' } },
+        update: { cursor: results.cursor },
+        create: { userId, platform: 'codechef', cursor: results.cursor }
+      });
+    }
     const resultsMap = new Map(results.scores.map(i => [i.problemId, i]));
 
     // fetch old progress
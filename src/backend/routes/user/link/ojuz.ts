@@ -1,5 +1,6 @@
 import createError from 'http-errors';
 import { db } from '@db';
+import { SqliteSink } from '@config';
 import { FastifyInstance } from 'fastify';
 import { ojuz as ojuzApi } from '@bridge';
 
@@ -52,10 +53,22 @@ export async function ojuz(app: FastifyInstance) {
     if (!settings.platformUsernames || !settings.platformUsernames['oj.uz']) {
       throw new createError.BadRequest('oj.uz username not set');
     }
-    let results = await ojuzApi.fetchProblemScores(cookie, settings.platformUsernames['oj.uz'], problems);
+    let cursor = await db.syncCursor.findUnique({ where: { userId_platform: { userId, platform: 'oj.uz' } } });
+    let results = await ojuzApi.fetchProblemScores(cookie, settings.platformUsernames['oj.uz'], problems, cursor?.cursor, SqliteSink ? { userId } : undefined);
     if (results.error) {
       throw new createError.Forbidden(results.error);
     }
+    if (results.sunk) {
+      // the worker already wrote the scores (and cursor)
+      return { success: true };
+    }
+    if (results.cursor) {
+      await db.syncCursor.upsert({
+        where: { userId_platform: { userId, platform: 'oj.uz' } },
+        update: { cursor: results.cursor },
+        create: { userId, platform: 'oj.uz', cursor: results.cursor }
+      });
+    }
     const resultsMap = new Map(results.scores.map(i => [i.problemId, i]));
 
     // fetch old progress
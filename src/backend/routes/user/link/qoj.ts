@@ -1,5 +1,6 @@
 import createError from 'http-errors';
 import { db } from '@db';
+import { SqliteSink } from '@config';
 import { FastifyInstance } from 'fastify';
 import { qoj as qojApi } from '@bridge';
 
@@ -52,10 +53,22 @@ export async function qoj(app: FastifyInstance) {
     if (!settings.platformUsernames || !settings.platformUsernames['qoj.ac']) {
       throw new createError.BadRequest('qoj.ac username not set');
     }
-    let results = await qojApi.fetchProblemScores(cookie, settings.platformUsernames['qoj.ac'], problems);
+    let cursor = await db.syncCursor.findUnique({ where: { userId_platform: { userId, platform: 'qoj.ac' } } });
+    let results = await qojApi.fetchProblemScores(cookie, settings.platformUsernames['qoj.ac'], problems, cursor?.cursor, SqliteSink ? { userId } : undefined);
     if (results.error) {
       throw new createError.Forbidden(results.error);
     }
+    if (results.sunk) {
+      // the worker already wrote the scores (and cursor)
+      return { success: true };
+    }
+    if (results.cursor) {
+      await db.syncCursor.upsert({
+        where: { userId_platform: { userId, platform: 'qoj.ac' } },
+        update: { cursor: results.cursor },
+        create: { userId, platform: 'qoj.ac', cursor: results.cursor }
+      });
+    }
     const resultsMap = new Map(results.scores.map(i => [i.problemId, i]));
 
     // fetch old progress
@@ -1,14 +1,30 @@
 import { db } from '@db';
+import { SqliteSink } from '@config';
 import { FastifyInstance } from 'fastify';
 import createError from 'http-errors';
 import { addMinutes, min } from 'date-fns';
 import { ojuz, qoj, codechef } from '@bridge';
 import { VirtualSubmission } from '@prisma/client';
+import { stopWatch } from './live';
+
+type ContestFetch = { error?: string; submissions?: VirtualSubmission[]; sunk?: boolean; errors?: string[] };
+
+// a fetch that lost some submissions is run again; the fetcher resumes from
+// its checkpoint, so only what failed is fetched again
+const FETCH_ATTEMPTS = 3;
 
 function isFulfilled<T>(r: PromiseSettledResult<T>): r is PromiseFulfilledResult<T> {
   return r.status == 'fulfilled';
 }
 
+async function fetchComplete(fetch: () => Promise<ContestFetch>) {
+  let res = await fetch();
+  for (let attempt = 1; attempt < FETCH_ATTEMPTS && res.errors?.length; ++attempt) {
+    res = await fetch();
+  }
+  return res;
+}
+
 export async function end(app: FastifyInstance) {
   const schema = {
     body: {
@@ -46,16 +62,21 @@ export async function end(app: FastifyInstance) {
     if (!contest) {
       throw createError.NotFound('No active contest exists');
     }
-    // capped by actual duration
-    contest.endedAt = min([
-      new Date(),
-      addMinutes(contest.startedAt, contest.contest.duration),
-    ]);
-    // persist to db
-    await db.activeVirtualContest.update({
-      where: { userId },
-      data: { endedAt: contest.endedAt }
-    });
+    // capped by actual duration; a retried end after a partial sync keeps
+    // the original end time
+    if (!contest.endedAt) {
+      contest.endedAt = min([
+        new Date(),
+        addMinutes(contest.startedAt, contest.contest.duration),
+      ]);
+      // persist to db
+      await db.activeVirtualContest.update({
+        where: { userId },
+        data: { endedAt: contest.endedAt }
+      });
+    }
+    // the full fetch below supersedes the live one
+    stopWatch(userId);
 
     if (!contest.autosynced) {
       return { success: true };
@@ -66,24 +87,37 @@ export async function end(app: FastifyInstance) {
       where: { userId },
       select: { platformUsernames: true }
     })).platformUsernames as Record<string, string> | null;
-    const platforms: Promise<{ error?: string; submissions?: VirtualSubmission[] }>[] = [];
+    const platforms: Promise<ContestFetch>[] = [];
+    const sink = SqliteSink ? { userId } : undefined;
     if (usernames?.['oj.uz']) {
-      platforms.push(ojuz.fetchContestScores(usernames['oj.uz'], contest));
+      platforms.push(fetchComplete(() => ojuz.fetchContestScores(usernames['oj.uz'], contest, sink)));
     }
     if (usernames?.['qoj.ac']) {
-      platforms.push(qoj.fetchContestScores(usernames['qoj.ac'], contest));
+      platforms.push(fetchComplete(() => qoj.fetchContestScores(usernames['qoj.ac'], contest, sink)));
     }
     if (usernames?.['codechef']) {
-      platforms.push(codechef.fetchContestScores(usernames['codechef'], contest));
+      platforms.push(fetchComplete(() => codechef.fetchContestScores(usernames['codechef'], contest, sink)));
     }
-    const submissions = (await Promise.allSettled(platforms))
-      .filter(isFulfilled)
-      .filter(r => !r.value.error)
-      .flatMap(r => r.value.submissions);
+    const settled = (await Promise.allSettled(platforms)).filter(isFulfilled);
 
-    // persist to db
+    // submissions that still couldn't be fetched would be missing from the
+    // score; nothing is recorded, and ending again resumes the fetch
+    const errors = settled.flatMap(r => r.value.errors ?? []);
+    if (errors.length) {
+      return {
+        success: false,
+        partial: true,
+        submissions: settled.flatMap(r => r.value.submissions ?? []),
+        errors
+      };
+    }
+
+    const results = settled.filter(r => !r.value.error);
+    const submissions = results.flatMap(r => r.value.submissions);
+
+    // persist to db, unless the worker already did
     await Promise.all(
-      submissions.map(i => db.virtualSubmission.create({
+      results.filter(r => !r.value.sunk).flatMap(r => r.value.submissions).map(i => db.virtualSubmission.create({
         data: {
           activeVirtualContestUserId: userId,
           contestProblemId: i.contestProblemId,
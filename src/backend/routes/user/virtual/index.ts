@@ -4,6 +4,7 @@ import { end } from './end';
 import { confirm } from './confirm';
 import { submit } from './submit';
 import { context } from './context';
+import { live } from './live';
 
 export async function virtual(app: FastifyInstance) {
   app.register(start);
@@ -11,4 +12,5 @@ export async function virtual(app: FastifyInstance) {
   app.register(confirm);
   app.register(submit);
   app.register(context);
+  app.register(live);
 }
\ No newline at end of file
@@ -0,0 +1,153 @@
+import { db } from '@db';
+import { FastifyInstance } from 'fastify';
+import createError from 'http-errors';
+import { PassThrough } from 'stream';
+import { ojuz, qoj, codechef } from '@bridge';
+import { VirtualSubmission } from '@prisma/client';
+
+type Watch = {
+  startedAt: Date,
+  submissions: VirtualSubmission[],
+  streams: Set<PassThrough>,
+  abort: AbortController,
+  linger?: NodeJS.Timeout
+};
+
+// one watch per running contest, shared by every open live stream of its
+// user, so reloading the page doesn't start another one
+const watches = new Map<number, Watch>();
+
+// how long a watch outlives its last stream, so a page reload picks the same
+// watch up instead of starting over
+const LINGER_MS = 30_000;
+
+function line(stream: PassThrough, event: object) {
+  stream.write(JSON.stringify(event) + '\n');
+}
+
+// cancels the user's watch in the worker; called once nobody is streaming it
+// and when the contest is ended
+export function stopWatch(userId: number) {
+  const watch = watches.get(userId);
+  if (!watch) {
+    return;
+  }
+  watches.delete(userId);
+  clearTimeout(watch.linger);
+  watch.abort.abort();
+}
+
+function startWatch(userId: number, contest: Parameters<typeof ojuz.watchContestScores>[1]) {
+  const watch: Watch = {
+    startedAt: contest.startedAt,
+    submissions: [],
+    streams: new Set(),
+    abort: new AbortController()
+  };
+  watches.set(userId, watch);
+  const { signal } = watch.abort;
+  const onSubmission = (submission: VirtualSubmission) => {
+    watch.submissions.push(submission);
+    watch.streams.forEach(s => line(s, { submission }));
+  };
+  const run = async () => {
+    const usernames = (await db.settings.findUnique({
+      where: { userId },
+      select: { platformUsernames: true }
+    })).platformUsernames as Record<string, string> | null;
+    const platforms: Promise<{ error?: string, errors: string[] }>[] = [];
+    if (usernames?.['oj.uz']) {
+      platforms.push(ojuz.watchContestScores(usernames['oj.uz'], contest, onSubmission, signal));
+    }
+    if (usernames?.['qoj.ac']) {
+      platforms.push(qoj.watchContestScores(usernames['qoj.ac'], contest, onSubmission, signal));
+    }
+    if (usernames?.['codechef']) {
+      platforms.push(codechef.watchContestScores(usernames['codechef'], contest, onSubmission, signal));
+    }
+    return (await Promise.allSettled(platforms)).flatMap(r => r.status == 'fulfilled'
+      ? [...(r.value.error ? [r.value.error] : []), ...r.value.errors]
+      : [String(r.reason)]);
+  };
+  run().catch(e => [String(e)]).then(errors => {
+    if (watches.get(userId) === watch) {
+      watches.delete(userId);
+    }
+    clearTimeout(watch.linger);
+    watch.streams.forEach(s => {
+      line(s, { done: true, errors });
+      s.end();
+    });
+  });
+  return watch;
+}
+
+export async function live(app: FastifyInstance) {
+  const schema = {
+    body: {
+      type: 'object',
+      required: ['token'],
+      properties: {
+        token: { type: 'string' }
+      }
+    }
+  };
+  // streams the active contest's submissions as NDJSON while it runs: one
+  // {"submission": ...} line each as soon as the fetcher has it, then a
+  // final {"done": true, "errors": [...]} once the contest is over
+  app.post<{ Body: { token: string } }>('/live', { schema }, async (req, reply) => {
+    const { token } = req.body;
+    const session = await db.session.findUnique({ where: { id: token } });
+    if (!session) {
+      throw createError.Unauthorized('Invalid token');
+    }
+    const userId = session.userId;
+    const contest = await db.activeVirtualContest.findUnique({
+      where: { userId },
+      include: {
+        contest: {
+          include: {
+            problems: {
+              include: {
+                problem: {
+                  include: { problemLinks: true }
+                }
+              }
+            }
+          }
+        }
+      }
+    });
+    if (!contest) {
+      throw createError.NotFound('No active contest exists');
+    }
+    if (!contest.autosynced) {
+      throw createError.BadRequest('Contest is not autosynced');
+    }
+    if (contest.endedAt) {
+      throw createError.BadRequest('Contest already ended');
+    }
+
+    let watch = watches.get(userId);
+    if (watch && watch.startedAt.getTime() != contest.startedAt.getTime()) {
+      // left over from a contest that was replaced
+      stopWatch(userId);
+      watch = undefined;
+    }
+    watch ??= startWatch(userId, contest);
+    clearTimeout(watch.linger);
+
+    const stream = new PassThrough();
+    // catch up on what this watch already found
+    watch.submissions.forEach(submission => line(stream, { submission }));
+    watch.streams.add(stream);
+    req.raw.on('close', () => {
+      watch.streams.delete(stream);
+      if (!watch.streams.size && watches.get(userId) === watch) {
+        clearTimeout(watch.linger);
+        watch.linger = setTimeout(() => stopWatch(userId), LINGER_MS);
+      }
+    });
+    return reply.type('application/x-ndjson').send(stream);
+  });
+}
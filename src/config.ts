@@ -56,6 +56,8 @@ export const DiscordClientSecret = validateEnv('DISCORD_CLIENT_SECRET');
 export const QojUsername = validateEnv('QOJ_USER');
 export const QojPassword = validateEnv('QOJ_PASS');
 export const EncryptionKey = Buffer.from(validateEnv('ENCRYPTION_KEY', false), 'hex');
+// let the scrapers write sync results into the database themselves
+export const SqliteSink = validateEnv('SYNC_SQLITE_SINK', false) == '1';
 
 export const RootUrl = validateEnv('ROOT_URL');
 
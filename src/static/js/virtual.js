@@ -27,6 +27,7 @@ function convertData(newData) {
       date: contest.date ?? "",
       notes: contest.note ?? "",
       problems: (contest.problems || []).map((p) => ({
+        id: p.id,
         source: source,
         year: contest.year,
         problemId: p.problemId,
@@ -208,6 +209,7 @@ document.addEventListener('DOMContentLoaded', async () => {
 
   const completedContestKeys = new Set((data.completed_contests || []).map(String));
   let currentActiveContest = null; // Store active contest data
+  let liveAbort = null; // Cancels the live submission stream of an autosynced contest
 
   // Define functions first so they're available when needed
   function showMessage(text, type = 'error') {
@@ -688,6 +690,7 @@ document.addEventListener('DOMContentLoaded', async () => {
 
       // Start timer with remaining time and capped elapsed time (in seconds precision)
       startTimerWithSeconds(remainingSeconds, cappedElapsedSeconds);
+      watchLiveSubmissions();
     }
 
     // Don't return here - we still need to set up event listeners
@@ -1376,12 +1379,14 @@ document.addEventListener('DOMContentLoaded', async () => {
 
     // Start timer with actual contest duration (after currentActiveContest is set)
     startTimer(contest.duration_minutes);
+    watchLiveSubmissions();
   });
 
   // Handle end contest button
   document.getElementById('end-contest-btn').addEventListener('click', async () => {
     // Use autosynced flag for determining sync mode
     const isAutosynced = asBool(currentActiveContest?.autosynced);
+    stopLiveSubmissions();
 
     try {
       // Hide entire UI and show loading spinner if autosynced
@@ -1407,6 +1412,14 @@ document.addEventListener('DOMContentLoaded', async () => {
       if (response.ok) {
         const result = await response.json();
 
+        if (result.partial) {
+          // some submissions couldn't be fetched; the contest stays open to
+          // ending again, which picks up where this sync stopped
+          activeContest.style.display = 'block';
+          showMessage('Some submissions could not be fetched. Please try ending the contest again.', 'error');
+          return;
+        }
+
         if (isAutosynced && result.submissions) {
           // Show score entry with oj.uz data in read-only mode
           localStorage.setItem('contest_ongoing', 'false');
@@ -1740,6 +1753,83 @@ document.addEventListener('DOMContentLoaded', async () => {
     }
   });
 
+  // Best score per problem so far, from the submissions streamed while the contest runs
+  function renderLiveScores(submissions) {
+    const liveScores = document.getElementById('live-scores');
+    const problems = currentActiveContest.problems || [];
+    const best = problems.map(() => []);
+    for (const submission of submissions) {
+      const problem = problems.find(j => j.id == submission.contestProblemId);
+      if (!problem) continue;
+      // a contest started on this page keeps the converted problems (1-based index)
+      const idx = problem.problemIndex ?? problem.index - 1;
+      const cur = best[idx] ?? [];
+      submission.subtaskScores.forEach((score, i) => {
+        cur[i] = Math.max(cur[i] ?? 0, score);
+      });
+      best[idx] = cur;
+    }
+    const scores = best.map(a => a.reduce((x, y) => x + y, 0));
+    const total = scores.reduce((x, y) => x + y, 0);
+    liveScores.textContent = `${scores.map((score, i) => `P${i + 1}: ${score}`).join(' | ')} | Total: ${total}`;
+    liveScores.style.display = 'block';
+  }
+
+  // Reads the NDJSON stream of an autosynced contest: one {"submission"} line
+  // per submission as it is judged, then {"done"} once the contest is over
+  async function watchLiveSubmissions() {
+    if (!asBool(currentActiveContest?.autosynced)) return;
+    stopLiveSubmissions();
+    const controller = new AbortController();
+    liveAbort = controller;
+    const submissions = [];
+    renderLiveScores(submissions);
+    try {
+      const response = await fetch(`${apiUrl}/user/virtual/live`, {
+        method: 'POST',
+        credentials: 'include',
+        headers: {
+          'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ token: sessionToken }),
+        signal: controller.signal
+      });
+      if (!response.ok || !response.body) return;
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        for (const text of lines) {
+          if (!text.trim()) continue;
+          const event = JSON.parse(text);
+          if (event.submission) {
+            submissions.push(event.submission);
+            renderLiveScores(submissions);
+          }
+          if (event.done) return;
+        }
+      }
+    } catch (error) {
+      if (error.name !== 'AbortError') {
+        console.error('Live submissions stream failed:', error);
+      }
+    } finally {
+      if (liveAbort === controller) liveAbort = null;
+    }
+  }
+
+  function stopLiveSubmissions() {
+    if (liveAbort) {
+      liveAbort.abort();
+      liveAbort = null;
+    }
+  }
+
   function startTimerWithSeconds(remainingSeconds, alreadyElapsedSeconds = 0) {
     // Store the start timestamp for accurate time tracking
     const timerStartTime = Date.now();